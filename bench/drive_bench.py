@@ -0,0 +1,267 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+from bench.samples import KINDS, WORDS, make_sample
+
+POPULATE_BATCH = 1000
+
+def folder_tree(depth, fanout):
+    """[(folder, parent)] of a tree `depth` levels below My Drive with `fanout` subfolders each."""
+    folders, level = [], ["My Drive"]
+    for d in range(1, depth + 1):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                name = f"L{d}-{len(folders) + 1:05d}"
+                folders.append((name, parent))
+                next_level.append(name)
+        level = next_level
+    return folders
+
+def summarize_timings(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.5) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "ops_per_s": len(ordered) / total if total else None,
+    }
+
+class Bench:
+    def __init__(self, args, agent):
+        self.args = args
+        self.A = agent
+        self.rng = random.Random(args.seed)
+        self.results = {}
+        self.files = []
+        self.folders = []
+
+    def time(self, name, func, items):
+        """Call func(item) for every item, recording each call's duration under name."""
+        samples = []
+        for item in items:
+            start = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - start)
+        if samples:
+            self.results[name] = summarize_timings(samples)
+            print(f"  {name:32} p50 {self.results[name]['p50_ms']:9.2f} ms   p95 {self.results[name]['p95_ms']:9.2f} ms",
+                  file=sys.stderr)
+
+    def populate(self):
+        """Upload args.files files over the folder tree, reusing args.distinct generated samples."""
+        A, args = self.A, self.args
+        self.folders = folder_tree(args.depth, args.fanout)
+        kinds = [kind for kind, weight in KINDS for _ in range(weight)]
+        samples = {}
+        for i in range(args.distinct):
+            kind = kinds[i % len(kinds)]
+            samples.setdefault(kind, []).append(make_sample(kind, args.seed + i, args.scale))
+        for j, (kind, _) in enumerate(KINDS):
+            # Fewer samples than weighted kinds: every kind still gets one.
+            if kind not in samples:
+                samples[kind] = [make_sample(kind, args.seed + args.distinct + j, args.scale)]
+        start = time.perf_counter()
+        with A.metadata_batch():
+            for name, parent in self.folders:
+                A.create_folder(name, parent)
+        places = ["My Drive"] + [name for name, _ in self.folders]
+        for lo in range(0, args.files, POPULATE_BATCH):
+            uploads = []
+            for i in range(lo, min(args.files, lo + POPULATE_BATCH)):
+                kind = kinds[i % len(kinds)]
+                name = f"{self.rng.choice(WORDS)}-{i:06d}{kind}"
+                data = samples[kind][i % len(samples[kind])]
+                uploads.append((name, io.BytesIO(data), places[i % len(places)]))
+                self.files.append(name)
+            A.upload_batch(uploads)
+        populate = time.perf_counter() - start
+        # Samples are shared by content, so extraction runs once per distinct sample.
+        start = time.perf_counter()
+        failed = 0
+        store = A.get_metadata_store()
+        for name in {self.files[i] for i in range(min(len(self.files), args.distinct))}:
+            digest = store.get_file(name)["digest"]
+            A.get_extraction_service().wait(digest)
+            failed += (A.get_extraction_service().status(digest) or {}).get("status") != "done"
+        return {
+            "files": len(self.files),
+            "folders": len(self.folders) + 1,
+            "distinct_samples": sum(len(group) for group in samples.values()),
+            "bytes": sum(len(s) for group in samples.values() for s in group),
+            "populate_s": populate,
+            "populate_files_per_s": len(self.files) / populate if populate else None,
+            "extract_s": time.perf_counter() - start,
+            "extract_failed": failed,
+        }
+
+    def run(self):
+        A, args, rng = self.A, self.args, self.rng
+        n = args.repeat
+        store = A.get_metadata_store()
+        folders = ["My Drive"] + [name for name, _ in self.folders]
+        print("Timing operations:", file=sys.stderr)
+
+        def cold_load(_):
+            store.invalidate()
+            A.load_metadata()
+        self.time("load_metadata_cold", cold_load, range(n))
+        self.time("load_metadata_warm", lambda _: A.load_metadata(), range(n))
+        self.time("save_metadata", lambda _: A.save_metadata(A.load_metadata()), range(max(1, n // 10)))
+
+        self.time("list_folder_content", lambda f: store.list_children(f), [rng.choice(folders) for _ in range(n)])
+        self.time("list_folder_page", lambda f: store.list_page(f, "date", True, limit=50),
+                  [rng.choice(folders) for _ in range(n)])
+        self.time("folder_stats", lambda f: store.folder_stats(f), [rng.choice(folders) for _ in range(n)])
+
+        def build_index(_):
+            with A._index_lock:
+                A._search_index = None
+            A.get_search_index()
+        self.time("search_index_build", build_index, range(1))
+        self.time("_search_files", lambda word: A._search_files(word, A.load_metadata()),
+                  [rng.choice(WORDS) for _ in range(n)])
+
+        self.time("move_file_tool", lambda f: A.move_file_tool(f, rng.choice(folders)), rng.sample(self.files, min(n, len(self.files))))
+        moves = [("move", f, rng.choice(folders)) for f in rng.sample(self.files, min(args.batch, len(self.files)))]
+        self.time("apply_batch", lambda ops: A.apply_batch(ops), [moves])
+
+        pdfs = [f for f in self.files[:args.distinct] if f.endswith(".pdf")]
+        llm = A.get_llm_client()
+
+        def summarize_cold(name):
+            A.get_summary_cache().invalidate_digest(store.get_file(name)["digest"])
+            A.summarize_file_tool(name, llm=llm)
+        self.time("summarize_file_tool", summarize_cold, [rng.choice(pdfs) for _ in range(n)] if pdfs else [])
+        for name in pdfs:
+            A.summarize_file_tool(name, llm=llm)
+        self.time("summarize_file_tool_cached", lambda name: A.summarize_file_tool(name, llm=llm),
+                  [rng.choice(pdfs) for _ in range(n)] if pdfs else [])
+        docs = [f for f in self.files[:args.distinct] if f.endswith((".docx", ".pdf"))]
+
+        def summarize_whole(name):
+            A.get_summary_cache().invalidate_digest(store.get_file(name)["digest"])
+            A.summarize_file_tool(name, llm=llm, mode="map_reduce")
+        self.time("summarize_file_tool_map_reduce", summarize_whole, [rng.choice(docs) for _ in range(max(1, n // 10))] if docs else [])
+        agent = A.SuperAgent(llm=llm)
+        self.time("ask", lambda q: agent.ask(q), [f"What do we know about {rng.choice(WORDS)} {rng.choice(WORDS)}?" for _ in range(n)])
+
+        # Destructive, so last: delete whole leaf folders with their files.
+        leaves = [name for name, _ in self.folders if not store.list_children(name) or
+                  all(kind == "file" for kind, _, _ in store.list_children(name))]
+        self.time("delete_folder", lambda f: A.delete_folder_tree(f), rng.sample(leaves, min(n, len(leaves))))
+        return self.results
+
+def compare(results, baseline, metric, max_regression, min_ms=0.0):
+    """[(operation, baseline value, new value, ratio, failed)] for the operations both runs have.
+
+    Operations faster than min_ms in both runs are listed but never fail: at that scale
+    the ratio is mostly timer noise.
+    """
+    rows = []
+    for name, new in results["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get(metric) or new.get(metric) is None:
+            continue
+        ratio = new[metric] / old[metric]
+        significant = max(old[metric], new[metric]) >= min_ms
+        rows.append((name, old[metric], new[metric], ratio, significant and ratio > 1 + max_regression))
+    return rows
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Databricks Drive operations on a synthetic drive.")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--depth", type=int, default=3, help="folder levels below My Drive")
+    parser.add_argument("--fanout", type=int, default=4, help="subfolders per folder")
+    parser.add_argument("--distinct", type=int, default=40, help="distinct generated documents shared by the files")
+    parser.add_argument("--scale", type=int, default=1, help="content size multiplier of generated documents")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per operation")
+    parser.add_argument("--batch", type=int, default=1000, help="moves in the apply_batch operation")
+    parser.add_argument("--backend", default="json", choices=("json", "sqlite"), help="metadata backend")
+    parser.add_argument("--storage", help="drive directory (default: a fresh temporary directory)")
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="stub LLM seconds per request")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--metric", default="p50_ms", choices=("p50_ms", "p95_ms", "mean_ms"))
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="fail when an operation's --metric grew by more than this fraction of the baseline")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore regressions of operations faster than this")
+    args = parser.parse_args(argv)
+    if args.distinct < 1:
+        parser.error("--distinct must be at least 1")
+
+    from super_agent.stub_llm import StubLLMServer
+    stub = StubLLMServer(delay=args.llm_delay, first_token_delay=args.first_token_delay, seed=args.seed).start()
+    storage = args.storage or tempfile.mkdtemp(prefix="drive-bench-")
+    # The agent reads its configuration when first used, so the environment is set before importing it.
+    os.environ.update(DRIVE_STORAGE_PATH=storage, DRIVE_METADATA_BACKEND=args.backend,
+                      DATABRICKS_BASE_URL=stub.base_url, DATABRICKS_TOKEN="bench")
+    from super_agent import agent, metrics
+
+    bench = Bench(args, agent)
+    print(f"Populating {args.files} files in {len(folder_tree(args.depth, args.fanout)) + 1} folders ({storage})",
+          file=sys.stderr)
+    setup = bench.populate()
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        "setup": setup,
+        "results": bench.run(),
+        "stub_llm": {"requests": stub.requests, "errors": stub.errors},
+        "metrics": metrics.snapshot(),
+    }
+    stub.stop()
+    agent.get_extraction_service().shutdown()
+
+    failed = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            rows = compare(results, json.load(f), args.metric, args.max_regression, args.min_ms)
+        results["comparison"] = {"baseline": args.baseline, "metric": args.metric,
+                                 "max_regression": args.max_regression,
+                                 "operations": {name: {"baseline": old, "new": new, "ratio": ratio, "failed": bad}
+                                                for name, old, new, ratio, bad in rows}}
+        print(f"\n{'operation':32} {'baseline':>10} {'new':>10} {'ratio':>7}", file=sys.stderr)
+        for name, old, new, ratio, bad in rows:
+            print(f"{name:32} {old:10.2f} {new:10.2f} {ratio:7.2f}{'  REGRESSION' if bad else ''}", file=sys.stderr)
+        failed = [name for name, *_, bad in rows if bad]
+
+    output = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
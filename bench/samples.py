@@ -0,0 +1,115 @@
+import io
+import random
+import zipfile
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+# Field-engineering vocabulary, so keyword and semantic search have realistic hits.
+WORDS = (
+    "spark cluster delta lake lakehouse pipeline streaming batch notebook workspace unity catalog governance "
+    "lineage model serving endpoint feature store mlflow experiment latency throughput autoscaling photon "
+    "warehouse query dashboard migration customer renewal pricing forecast revenue quarter pilot proof "
+    "concept architecture security compliance access token schema table partition optimize vacuum zorder "
+    "ingestion connector kafka kinesis storage volume checkpoint retry incident outage escalation roadmap"
+).split()
+REGIONS = ("EMEA", "AMER", "APJ", "LATAM")
+PRODUCTS = ("Jobs", "SQL", "Serving", "Delta", "Unity", "Apps")
+
+def sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+def paragraphs(rng, count, sentences=5):
+    return [" ".join(sentence(rng, rng.randint(8, 16)) for _ in range(sentences)) for _ in range(count)]
+
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages):
+    """A minimal valid PDF with one Helvetica text page per item of pages (lists of lines)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 790 Td"] + [f"({_pdf_text(line)}) Tj T*" for line in lines] + ["ET"]
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        body = body if isinstance(body, bytes) else body.encode("latin-1")
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+_DOCX_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+def make_docx(texts):
+    """A minimal Word document with one paragraph per item of texts."""
+    body = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(t)}</w:t></w:r></w:p>" for t in texts)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _DOCX_TYPES)
+        z.writestr("_rels/.rels", _DOCX_RELS)
+        z.writestr("word/document.xml", document)
+    return out.getvalue()
+
+def make_csv(rng, rows):
+    """Sales-style CSV: id, date, region, product, account, quantity, revenue."""
+    start = date(2024, 1, 1)
+    lines = ["id,date,region,product,account,quantity,revenue"]
+    for i in range(rows):
+        quantity = rng.randint(1, 500)
+        lines.append(f"{i + 1},{start + timedelta(days=rng.randint(0, 364))},{rng.choice(REGIONS)},"
+                     f"{rng.choice(PRODUCTS)},{rng.choice(WORDS)}-{rng.randint(1, 999)},{quantity},"
+                     f"{quantity * rng.uniform(20, 400):.2f}")
+    return ("\n".join(lines) + "\n").encode()
+
+def make_text(rng, count):
+    return ("\n\n".join(paragraphs(rng, count)) + "\n").encode()
+
+# (extension, weight) of the generated file mix.
+KINDS = ((".pdf", 4), (".csv", 2), (".docx", 3), (".txt", 1))
+
+def make_sample(kind, seed, scale=1):
+    """Bytes of a realistic file of type kind ("pdf", ".csv", ...); scale grows the content."""
+    rng = random.Random(seed)
+    kind = kind.lstrip(".")
+    if kind == "pdf":
+        return make_pdf([[sentence(rng, 10) for _ in range(40)] for _ in range(2 * scale)])
+    if kind == "docx":
+        return make_docx(paragraphs(rng, 12 * scale))
+    if kind == "csv":
+        return make_csv(rng, 200 * scale)
+    if kind == "txt":
+        return make_text(rng, 20 * scale)
+    raise ValueError(f"Unknown sample kind: {kind}")
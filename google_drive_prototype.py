@@ -1,18 +1,21 @@
 from dotenv import load_dotenv
-import os, shutil
+import os, shutil, json
 import streamlit as st
 from pathlib import Path
 import tempfile
-import pandas as pd
 from functools import partial
-from datetime import datetime
 from collections import defaultdict
 
 from super_agent.agent import (
-    SuperAgent, search_files_tool, summarize_file_tool, move_file_tool,
-    load_metadata, save_metadata, create_folder, delete_file
+    SuperAgent, search_files_tool, summarize_file_tool, move_file_tool, move_folder_tool, folder_size,
+    create_folder, delete_file, get_metadata_store, delete_folder_tree, upload_batch,
+    get_search_index, extraction_status, summarize_folder, summarize_folder_tool, semantic_search_tool, file_preview,
+    get_table_profile, get_llm_client, apply_batch, batch_command_tool, file_exists, open_file
 )
-from openai import OpenAI
+from super_agent import metrics
+from super_agent.preview import PREVIEW_BYTES
+from super_agent.tables import table_shape
+from super_agent.search_index import matches_query
 
 # --- Static demo files/folders, always shown in UI, never deletable, never summarized ---
 ASSETS_DIR = Path(__file__).parent / "assets"
@@ -27,23 +30,31 @@ STATIC_DEMO_FILES = [
 STATIC_DEMO_SET = {item["name"] for item in STATIC_DEMO_FILES}
 STATIC_DEMO_FOLDER_SET = {item["name"] for item in STATIC_DEMO_FILES if item["type"] == "folder"}
 
+# Default for DRIVE_STORAGE_PATH (metadata, caches and, with the local backend, file bytes).
 STORAGE_PATH = Path(tempfile.gettempdir()) / "databricks_drive_files"
-STORAGE_PATH.mkdir(exist_ok=True)
-os.environ["DRIVE_STORAGE_PATH"] = str(STORAGE_PATH)
 
 # --- Agent/LLM setup ---
-load_dotenv()
-DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
-DATABRICKS_BASE_URL = "https://e2-demo-field-eng.cloud.databricks.com/serving-endpoints"
-db_client = OpenAI(api_key=DATABRICKS_TOKEN, base_url=DATABRICKS_BASE_URL)
-agent = SuperAgent()
-agent.set_llm(db_client)
-agent.register_tool("search_files", search_files_tool, "Search files")
-agent.register_tool("summarize_file", partial(summarize_file_tool, llm=agent.llm), "Summarize file with AI")
-agent.register_tool("move_file", move_file_tool, "Move file")
-
-st.set_page_config(page_title="Databricks Drive", page_icon="📁", layout="wide", initial_sidebar_state="collapsed")
-st.markdown("""
+# Streamlit re-executes this script on every interaction; the agent and its LLM transport
+# (and its HTTP connection pool) are built once per server process and shared by all sessions.
+@st.cache_resource(show_spinner=False)
+def get_agent():
+    load_dotenv()
+    Path(os.environ.setdefault("DRIVE_STORAGE_PATH", str(STORAGE_PATH))).mkdir(parents=True, exist_ok=True)
+    agent = SuperAgent(llm=get_llm_client())
+    agent.register_tool("search_files", search_files_tool, "Search files")
+    agent.register_tool("summarize_file", partial(summarize_file_tool, llm=agent.llm), "Summarize file with AI")
+    agent.register_tool("move_file", move_file_tool, "Move file")
+    agent.register_tool("move_folder", move_folder_tool, "Move folder with everything in it")
+    agent.register_tool("semantic_search", semantic_search_tool, "Find documents by meaning")
+    agent.register_tool("summarize_folder", partial(summarize_folder_tool, llm=agent.llm), "Summarize every file in a folder")
+    agent.register_tool("batch", batch_command_tool, "Bulk move/rename/delete")
+    return agent
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port, host):
+    return metrics.serve(port, host)
+
+PAGE_STYLE = """
 <style>
 .main-header { background: #1a73e8; color: white; padding: 0.5rem 1rem; border-radius: 8px; margin-bottom: 1rem; display: flex; align-items: center; justify-content: space-between; }
 .drive-logo { font-size: 1.5rem; font-weight: bold; display: flex; align-items: center; gap: 0.5rem; }
@@ -55,7 +66,7 @@ st.markdown("""
 .breadcrumb { background: #f8f9fa; padding: 0.5rem 1rem; border-radius: 4px; margin-bottom: 1rem; font-size: 0.9rem; }
 .stats-bar { background: #f8f9fa; padding: 0.5rem 1rem; border-radius: 4px; margin-top: 1rem; border: 1px solid #e0e0e0; }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 def file_icon(filename):
     ext = filename.lower()
@@ -77,104 +88,165 @@ def get_current_folder():
 def set_current_folder(folder):
     st.session_state["current_path"] = folder
 
-def list_folder_content():
-    meta = load_metadata()
-    children = meta["folders"].get(get_current_folder(), {}).get("children", [])
-    dynamic_files, dynamic_folders = [], []
-    for name in children:
-        if name in meta["files"]:
-            dynamic_files.append((name, meta["files"][name]))
-        elif name in meta["folders"]:
-            dynamic_folders.append((name, meta["folders"][name]))
-    used_names = set([f for f, _ in dynamic_files] + [f for f, _ in dynamic_folders])
-    result = []
-    for item in STATIC_DEMO_FILES:
-        if item["type"] == "folder" and item["name"] not in used_names:
-            result.append({"name": item["name"], "description": item["description"], "is_demo": True, "type": "folder"})
-    for f, meta in dynamic_folders:
-        result.append({"name": f, "description": "User folder", "is_demo": False, "type": "folder", "meta": meta})
-    for item in STATIC_DEMO_FILES:
-        if item["type"] == "file" and item["name"] not in used_names:
-            result.append({"name": item["name"], "description": item["description"], "is_demo": True, "type": "file"})
-    for f, meta in dynamic_files:
-        result.append({"name": f, "description": f"User file, {meta['size']//1024} KB", "is_demo": False, "type": "file", "meta": meta})
-    return result
+SORT_OPTIONS = {"Name": "name", "Size": "size", "Date": "date", "Type": "type"}
+PAGE_SIZES = [24, 48, 96]
+
+def _user_item(kind, name, meta):
+    if kind == "folder":
+        return {"name": name, "description": "User folder", "is_demo": False, "type": "folder", "meta": meta}
+    return {"name": name, "description": f"User file, {meta['size']//1024} KB", "is_demo": False, "type": "file", "meta": meta}
+
+@metrics.timed("list_page")
+def list_folder_page(offset, limit, sort="name", descending=False, search_term=None):
+    """Items of one page of the current folder and the folder's total item count.
+
+    User items are paged by the metadata store (or, when searching, by the search index);
+    demo items are few and fixed, so they lead the first page and are not counted.
+    """
+    store = get_metadata_store()
+    folder = get_current_folder()
+    if search_term:
+        folders, n_folders, _ = store.list_page(folder, sort, descending, query=search_term, kind="folder",
+                                                offset=offset, limit=limit)
+        hits = [name for name, _ in get_search_index().search(search_term, limit=None, folder=folder)]
+        start = max(0, offset - n_folders)
+        files = [(name, store.get_file(name)) for name in hits[start:start + limit - len(folders)]]
+        page = folders + [("file", name, record) for name, record in files if record]
+        total = n_folders + len(hits)
+    else:
+        page, total, _ = store.list_page(folder, sort, descending, offset=offset, limit=limit)
+    items = [_user_item(kind, name, record) for kind, name, record in page]
+    if offset == 0:
+        used = {item["name"] for item in items}
+        demo = [
+            {"name": item["name"], "description": item["description"], "is_demo": True, "type": item["type"]}
+            for item in STATIC_DEMO_FILES
+            if item["name"] not in used and (not search_term or matches_query(search_term, item["name"]))
+        ]
+        items = ([d for d in demo if d["type"] == "folder"] + [i for i in items if i["type"] == "folder"]
+                 + [d for d in demo if d["type"] == "file"] + [i for i in items if i["type"] == "file"])
+    return items, total
 
 def upload_files(files, parent):
-    meta = load_metadata()
+    uploads = []
     for file in files:
         if file.name in STATIC_DEMO_SET:
             st.warning(f"Cannot upload '{file.name}', protected demo file.")
             continue
-        path = STORAGE_PATH / file.name
-        with open(path, "wb") as f:
-            f.write(file.getbuffer())
-        size = path.stat().st_size
-        upload_time = datetime.now().isoformat()
-        meta["files"][file.name] = {
-            "path": str(path),
-            "size": size,
-            "created": upload_time,
-            "modified": upload_time,
-            "parent": parent,
-        }
-        if file.name not in meta["folders"][parent]["children"]:
-            meta["folders"][parent]["children"].append(file.name)
-    save_metadata(meta)
+        file.seek(0)
+        uploads.append((file.name, file, parent))
+    upload_batch(uploads)
     st.session_state.pop("summary_output", None)
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_preview(name, meta, converted=False):
+    """Bounded preview of a stored file, reused across reruns until the file record changes
+    or its columnar copy becomes available."""
+    try:
+        return file_preview(name, meta)
+    except Exception as e:
+        return {"kind": None, "error": str(e)}
+
 def get_all_files_in_folder(foldername):
-    meta = load_metadata()
-    result = set()
-    def _collect(fol):
-        for child in meta["folders"][fol]["children"]:
-            if child in meta["files"]:
-                result.add(child)
-            elif child in meta["folders"]:
-                _collect(child)
-    if foldername in meta["folders"]:
-        _collect(foldername)
-    return result
+    store = get_metadata_store()
+    if not store.get_folder(foldername):
+        return set()
+    return {name for name, _ in store.subtree(foldername)[1]}
 
 def delete_folder(foldername):
-    meta = load_metadata()
     if foldername in STATIC_DEMO_FOLDER_SET or foldername == "My Drive":
         return False, "Demo/root folders cannot be deleted."
-    if foldername not in meta["folders"]:
-        return False, "Folder not found."
-    folder = meta["folders"][foldername]
-    children = list(folder["children"])
-    for child in children:
-        if child in meta["files"]:
-            delete_file(child)
-        elif child in meta["folders"]:
-            delete_folder(child)
-    parent = folder.get("parent")
-    if parent and foldername in meta["folders"][parent]["children"]:
-        meta["folders"][parent]["children"].remove(foldername)
-    del meta["folders"][foldername]
-    save_metadata(meta)
-    return True, f"Folder '{foldername}' (and all its content) deleted."
-
-def merged_file_folder_count_stats(folder, static_files, user_files, user_folders):
-    FILETYPE_MAP = {
-        ".xlsx": "Excel", ".xls": "Excel",
-        ".docx": "Word", ".doc": "Word",
-        ".pdf": "PDF",
-        ".csv": "CSV",
-    }
-    files_all, folders_all = [], []
-    if folder == "My Drive":
-        files_all += [f for f in static_files if f["type"] == "file"]
-        folders_all += [f for f in static_files if f["type"] == "folder"]
-    files_all += [{"name": fname, "type": "file"} for fname, _ in user_files]
-    folders_all += [{"name": fname, "type": "folder"} for fname, _ in user_folders]
+    return delete_folder_tree(foldername)
+
+FILETYPE_MAP = {
+    ".xlsx": "Excel", ".xls": "Excel",
+    ".docx": "Word", ".doc": "Word",
+    ".pdf": "PDF",
+    ".csv": "CSV",
+}
+
+def file_type_label(ext):
+    return FILETYPE_MAP.get(ext, ext.replace(".", "").upper() if ext else "Other")
+
+def merged_folder_stats(folder, static_files):
+    """Recursive file/folder counts, type histogram and user bytes of folder, from the stored aggregates."""
+    stats = get_metadata_store().folder_stats(folder) or {"size": 0, "files": 0, "folders": 0, "types": {}}
+    num_files, num_folders = stats["files"], stats["folders"]
     ext_counts = defaultdict(int)
-    for f in files_all:
-        ext = Path(f["name"]).suffix.lower()
-        ftype = FILETYPE_MAP.get(ext, ext.replace(".", "").upper() if ext else "Other")
-        ext_counts[ftype] += 1
-    return len(files_all), dict(ext_counts), len(folders_all)
+    for ext, count in stats["types"].items():
+        ext_counts[file_type_label(ext)] += count
+    if folder == "My Drive":
+        for f in static_files:
+            if f["type"] == "file":
+                num_files += 1
+                ext_counts[file_type_label(Path(f["name"]).suffix.lower())] += 1
+            else:
+                num_folders += 1
+    return num_files, dict(ext_counts), num_folders, stats["size"]
+
+def bulk_actions(selected):
+    """Move/delete/rename bar for the selected items, applied as one atomic batch."""
+    st.caption(f"{len(selected)} selected: {', '.join(selected)}")
+    folders = [f for f, _ in get_metadata_store().items("folders") if f not in selected]
+    bc1, bc2, bc3, bc4 = st.columns([2, 1, 1, 2])
+    with bc1:
+        destination = st.selectbox("Destination folder", folders, key="bulk_destination")
+    operations = None
+    with bc2:
+        if st.button("📂 Move selected", key="bulk_move"):
+            operations = [("move", name, destination) for name in selected]
+    with bc3:
+        if st.button("🗑️ Delete selected", key="bulk_delete"):
+            operations = [("delete", name) for name in selected]
+    with bc4:
+        if len(selected) == 1:
+            new_name = st.text_input("New name", value=selected[0], key=f"bulk_rename_{selected[0]}")
+            if st.button("✏️ Rename", key="bulk_rename"):
+                if new_name in STATIC_DEMO_SET:
+                    st.error("This name is reserved for a demo item.")
+                else:
+                    operations = [("rename", selected[0], new_name.strip())]
+    if operations:
+        ok, msg = apply_batch(operations)
+        st.session_state["selection_epoch"] = st.session_state.get("selection_epoch", 0) + 1
+        st.session_state.pop("summary_output", None)
+        st.session_state.pop("selected_file", None)
+        flash("success" if ok else "error", msg)
+        st.rerun()
+
+def flash(kind, msg):
+    """Show msg with st.<kind> on the next run, so it survives the st.rerun() that follows a change."""
+    st.session_state["flash"] = (kind, msg)
+
+def show_flash():
+    pending = st.session_state.pop("flash", None)
+    if pending:
+        getattr(st, pending[0])(pending[1])
+
+def performance_panel():
+    """Latency per operation (p50/p95 over the most recent calls) of this server process."""
+    data = metrics.snapshot()
+    with st.sidebar.expander("⏱️ Performance"):
+        if not data["enabled"]:
+            st.caption("Metrics are disabled (DRIVE_METRICS=0).")
+            return
+        ms = lambda seconds: round(seconds * 1000, 1) if seconds is not None else None
+        st.dataframe([{
+            "Operation": t["name"] + "".join(f" {k}={v}" for k, v in t["labels"].items()),
+            "Count": t["count"], "p50 ms": ms(t["p50"]), "p95 ms": ms(t["p95"]), "Max ms": ms(t["max"]),
+        } for t in data["timings"]], use_container_width=True, hide_index=True)
+        if data["counters"]:
+            st.dataframe([{
+                "Counter": c["name"] + "".join(f" {k}={v}" for k, v in c["labels"].items()), "Value": c["value"],
+            } for c in data["counters"]], use_container_width=True, hide_index=True)
+        for source, values in data["gauges"].items():
+            st.caption(source)
+            st.json(values, expanded=False)
+        col_a, col_b, col_c = st.columns(3)
+        col_a.download_button("Prometheus", metrics.prometheus_text(), "metrics.prom")
+        col_b.download_button("JSON", json.dumps(data, indent=2), "metrics.json")
+        if col_c.button("Reset", key="metrics_reset"):
+            metrics.reset()
 
 def main():
     if "current_path" not in st.session_state:
@@ -191,6 +263,7 @@ def main():
         </div>
     </div>
     """, unsafe_allow_html=True)
+    show_flash()
 
     col1, col2, col3, col4 = st.columns([2, 1, 1, 2])
     with col1:
@@ -206,6 +279,7 @@ def main():
     with col3:
         view_mode = st.selectbox("View", ["Grid", "List"], key="view_selector")
         st.session_state["view_mode"] = view_mode.lower()
+        st.checkbox("📚 Summarize whole document", key="summary_whole_doc")
     with col4:
         st.text_input("🔍 Search files", placeholder="Search in Drive", key="search_term")
     st.markdown(
@@ -223,17 +297,48 @@ def main():
                 st.success(msg) if ok else st.error(msg)
                 st.session_state["show_new_folder"] = False
 
-    file_items = list_folder_content()
     search_term = st.session_state.get("search_term")
-    if search_term:
-        file_items = [item for item in file_items if search_term.lower() in item["name"].lower()]
+    pc1, pc2, pc3, pc4, pc5 = st.columns([1, 1, 1, 2, 1])
+    with pc1:
+        sort = SORT_OPTIONS[st.selectbox("Sort by", list(SORT_OPTIONS), key="sort_key")]
+    with pc2:
+        descending = st.selectbox("Order", ["Ascending", "Descending"], key="sort_order") == "Descending"
+    with pc3:
+        page_size = st.selectbox("Per page", PAGE_SIZES, key="page_size")
+    listing = (get_current_folder(), sort, descending, search_term, page_size)
+    if st.session_state.get("listing") != listing:
+        st.session_state["listing"] = listing
+        st.session_state["page"] = 0
+    page = st.session_state.get("page", 0)
+    page_items, total = list_folder_page(page * page_size, page_size, sort, descending, search_term)
+    pages = max(1, -(-total // page_size))
+    if page >= pages:
+        # Deletes or moves emptied the last page.
+        page = st.session_state["page"] = pages - 1
+        page_items, total = list_folder_page(page * page_size, page_size, sort, descending, search_term)
+    with pc4:
+        first = page * page_size + 1 if total else 0
+        st.caption(f"Items {first}–{min(total, (page + 1) * page_size)} of {total} • page {page + 1} of {pages}")
+    with pc5:
+        prev_col, next_col = st.columns(2)
+        if prev_col.button("◀", disabled=page == 0, key="page_prev"):
+            st.session_state["page"] = page - 1
+            st.rerun()
+        if next_col.button("▶", disabled=page + 1 >= pages, key="page_next"):
+            st.session_state["page"] = page + 1
+            st.rerun()
 
     st.divider()
+    folder_to_summarize = None
+    file_to_summarize = None
+    # Bumped after a bulk action so every selection widget starts out cleared.
+    epoch = st.session_state.get("selection_epoch", 0)
+    selected = []
     if st.session_state.get("view_mode", "grid") == "grid":
         cols_per_row = 4
-        for i in range(0, len(file_items), cols_per_row):
+        for i in range(0, len(page_items), cols_per_row):
             cols = st.columns(cols_per_row)
-            for j, item in enumerate(file_items[i:i+cols_per_row]):
+            for j, item in enumerate(page_items[i:i+cols_per_row]):
                 name, desc, is_demo, meta = item["name"], item["description"], item.get("is_demo", False), item.get("meta", None)
                 icon = file_icon(name)
                 with cols[j]:
@@ -245,6 +350,8 @@ def main():
                     </div>
                     """
                     st.markdown(card_html, unsafe_allow_html=True)
+                    if not is_demo and name != "My Drive" and st.checkbox("Select", key=f"select_{epoch}_{name}"):
+                        selected.append(name)
                     col_a, col_b, col_c = st.columns(3)
                     with col_a:
                         if st.button("Open", key=f"open_{i}_{j}"):
@@ -252,13 +359,23 @@ def main():
                             st.session_state["selected_file"] = name
                     with col_b:
                         if (not is_demo and item.get("type") == "file" and meta):
-                            path = meta.get("path")
                             ext = name.lower()
-                            if path and Path(path).exists() and ext.endswith(('.pdf', '.txt', '.csv', '.docx')):
+                            if ext.endswith(('.pdf', '.txt', '.csv', '.docx')) and file_exists(meta):
                                 if st.button("📑 Summarize with AI", key=f"summarize_{i}_{j}"):
-                                    with st.spinner("Summarizing..."):
-                                        summary = agent.tools["summarize_file"]["func"](name)
+                                    if st.session_state.get("summary_whole_doc"):
+                                        with st.spinner("Summarizing..."):
+                                            bar = st.progress(0.0)
+                                            summary = agent.tools["summarize_file"]["func"](
+                                                name, mode="map_reduce",
+                                                on_progress=lambda done, total, stage: bar.progress(done / total, text=f"{stage} {done}/{total}"),
+                                            )
+                                            bar.empty()
                                         st.session_state["summary_output"] = {"filename": name, "summary": summary}
+                                    else:
+                                        file_to_summarize = name
+                        if not is_demo and item.get("type") == "folder":
+                            if st.button("📑 Summarize all", key=f"summarize_folder_{i}_{j}"):
+                                folder_to_summarize = name
                     with col_c:
                         # Robust delete: pop all relevant state, rerun immediately, nothing after...
                         if not is_demo and item.get("type") == "file":
@@ -266,39 +383,51 @@ def main():
                                 delete_file(name)
                                 st.session_state.pop("summary_output", None)
                                 st.session_state.pop("selected_file", None)
-                                st.success(f"Deleted '{name}' from My Drive.")
-                                st.experimental_rerun()
+                                flash("success", f"Deleted '{name}' from My Drive.")
+                                st.rerun()
                                 return
                         if not is_demo and item.get("type") == "folder" and name != "My Drive":
                             if st.button("🗑️ Delete Folder", key=f"delete_folder_{i}_{j}"):
                                 ok, msg = delete_folder(name)
                                 st.session_state.pop("summary_output", None)
                                 st.session_state.pop("selected_file", None)
-                                if ok:
-                                    st.success(msg)
-                                else:
-                                    st.error(msg)
-                                st.experimental_rerun()
+                                flash("success" if ok else "error", msg)
+                                st.rerun()
                                 return
     else:
         rows = []
-        for item in file_items:
+        for item in page_items:
+            stats = folder_size(item["name"]) if item.get("type") == "folder" and not item.get("is_demo") else None
+            profile = get_table_profile(item["name"], item["meta"], convert=False) if item.get("meta") and item.get("type") == "file" else None
+            if stats:
+                size, items = stats["size"], f"{stats['files']} files, {stats['folders']} folders"
+            else:
+                size, items = (item.get("meta") or {}).get("size"), table_shape(profile) if profile else "-"
             rows.append({
                 "Type": "Folder" if item.get("type") == "folder" else "File",
                 "Name": item["name"],
-                "Size": f"{item['meta']['size']//1024} KB" if item.get("meta") and "size" in item["meta"] else "-",
+                "Size": f"{size//1024} KB" if size is not None else "-",
+                "Items": items,
                 "Date": item["meta"]["created"][:10] if item.get("meta") and "created" in item["meta"] else "-"
             })
-        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        event = st.dataframe(rows, use_container_width=True, hide_index=True,
+                             on_select="rerun", selection_mode="multi-row", key=f"list_selection_{epoch}")
+        selected = [page_items[r]["name"] for r in event.selection.rows
+                    if not page_items[r].get("is_demo") and page_items[r]["name"] != "My Drive"]
+
+    if selected:
+        bulk_actions(selected)
 
     st.divider()
     # --- File Preview ---
     if st.session_state.get("selected_file"):
         name = st.session_state["selected_file"]
         filemeta = None
-        for item in file_items:
-            if item["name"] == name:
-                filemeta = item
+        record = get_metadata_store().get_file(name)
+        if record:
+            filemeta = {"name": name, "is_demo": False, "meta": record}
+        elif name in STATIC_DEMO_SET:
+            filemeta = {"name": name, "is_demo": True}
         st.markdown(f"#### Preview: {name}")
         if filemeta:
             if filemeta.get("is_demo"):
@@ -306,43 +435,83 @@ def main():
                 st.write("This file is present for demo purposes only.")
             else:
                 meta = filemeta["meta"]
-                path = meta["path"]
                 ext = name.lower()
-                if not Path(path).exists():
+                status = extraction_status(name)
+                if status and status["status"] != "done":
+                    st.caption(f"Text extraction: {status['status']}" + (f" ({status['error']})" if status["error"] else ""))
+                if not file_exists(meta):
                     st.error("File is missing. Please re-upload.")
-                elif ext.endswith(('.txt', '.csv')):
-                    content = Path(path).read_text(encoding="utf-8", errors="replace")
-                    st.text_area("Contents", content[:2000], height=200)
                 elif ext.endswith('.pdf'):
-                    with open(path, "rb") as f:
+                    with open_file(meta) as f:
                         st.download_button("⬇ Download PDF", f, name, mime="application/pdf")
-                elif ext.endswith(('.png', '.jpg', '.jpeg')):
-                    st.image(path)
+                elif (preview := cached_preview(name, meta, get_table_profile(name, meta, convert=False) is not None))["kind"] == "text":
+                    st.text_area("Contents", preview["text"], height=200)
+                    if preview["truncated"]:
+                        st.caption(f"Showing the first {PREVIEW_BYTES // 1024} KB.")
+                elif preview["kind"] == "table":
+                    st.dataframe(preview["table"], use_container_width=True)
+                    st.caption(f"First {len(preview['table'])} rows" +
+                               (f" of sheet 1 of {len(preview['sheets'])}" if preview["sheets"] else "") + ".")
+                    if preview.get("profile"):
+                        with st.expander(f"Column profile • {table_shape(preview['profile'])}"):
+                            columns = preview["profile"]["sheets"][0]["columns"]
+                            st.dataframe([{
+                                "Column": c["name"], "Type": c["dtype"], "Nulls": c["nulls"], "Distinct": c["distinct"],
+                                "Min": "" if c["min"] is None else str(c["min"]),
+                                "Max": "" if c["max"] is None else str(c["max"]),
+                                "Top values": ", ".join(f"{v} ({n})" for v, n in c["top"]),
+                            } for c in columns], use_container_width=True, hide_index=True)
+                elif preview["kind"] == "image":
+                    st.image(preview["path"])
                 else:
+                    if preview.get("error"):
+                        st.caption(f"Preview failed: {preview['error']}")
                     st.write("Preview not supported. Download instead.")
-                    with open(path, "rb") as f:
+                    with open_file(meta) as f:
                         st.download_button("⬇ Download file", f, name)
 
     st.divider()
-    # --- Stats bar: always live, merged type/file/folder count
-    folders = [(i["name"], i.get("meta", {})) for i in file_items if i.get("type") == "folder"]
-    files = [(i["name"], i.get("meta", {})) for i in file_items if i.get("type") == "file"]
-    num_files, ext_counts, num_folders = merged_file_folder_count_stats(
-        get_current_folder(), STATIC_DEMO_FILES, files, folders
-    )
-    user_storage = sum(item.get("meta", {}).get("size", 0) for item in file_items if not item.get("is_demo", False) and item.get("type") == "file")
+    # --- Stats bar: recursive totals of the current folder, read from the folder aggregates
+    num_files, ext_counts, num_folders, user_storage = merged_folder_stats(get_current_folder(), STATIC_DEMO_FILES)
     ext_summary = ", ".join([f"{v} {k}" for k, v in ext_counts.items()])
     stats_html = f"""
     <div class="stats-bar">
         <span>📁 {num_folders} folders</span> • 
-        <span>📄 {num_files} files</span> • 
+        <span>📄 {num_files} files</span>{f" ({ext_summary})" if ext_summary else ""} • 
         <span>💾 User Storage: {user_storage/1024:.1f} KB</span>
     </div>
     """
     st.markdown(stats_html, unsafe_allow_html=True)
 
-    # --- Sidebar: AI summary
-    if "summary_output" in st.session_state:
+    # --- Sidebar: bulk folder summaries, streamed in as each file finishes
+    if folder_to_summarize:
+        mode = "map_reduce" if st.session_state.get("summary_whole_doc") else "head"
+        results = {}
+        with st.sidebar:
+            st.subheader(f"AI Summaries: {folder_to_summarize}")
+            progress = st.empty()
+            for fname, summary in summarize_folder(folder_to_summarize, agent.llm, mode=mode):
+                results[fname] = summary
+                progress.caption(f"{len(results)} file(s) summarized…")
+                st.info(summary)
+            progress.caption(f"{len(results)} file(s) summarized." if results else "No summarizable files.")
+        st.session_state["folder_summaries"] = {"folder": folder_to_summarize, "summaries": results}
+    elif "folder_summaries" in st.session_state:
+        fs = st.session_state["folder_summaries"]
+        with st.sidebar:
+            st.subheader(f"AI Summaries: {fs['folder']}")
+            for summary in fs["summaries"].values():
+                st.info(summary)
+            if st.button("Clear folder summaries"):
+                st.session_state.pop("folder_summaries", None)
+
+    # --- Sidebar: AI summary, streamed token by token on the run that requested it
+    if file_to_summarize:
+        with st.sidebar:
+            st.subheader(f"AI Summary: {file_to_summarize}")
+            summary = st.write_stream(agent.tools["summarize_file"]["func"](file_to_summarize, stream=True))
+        st.session_state["summary_output"] = {"filename": file_to_summarize, "summary": summary}
+    elif "summary_output" in st.session_state:
         so = st.session_state["summary_output"]
         with st.sidebar:
             st.subheader(f"AI Summary: {so['filename']}")
@@ -368,10 +537,9 @@ def main():
             folder_mention = "my drive" in lower or "root" in lower or "top" in lower or get_current_folder().lower() in lower
             answered = False
             if wants_count and folder_mention:
-                folders_ = [(i["name"], i.get("meta", {})) for i in file_items if i.get("type") == "folder"]
-                files_ = [(i["name"], i.get("meta", {})) for i in file_items if i.get("type") == "file"]
-                total_files, ext_counts, total_folders = merged_file_folder_count_stats(
-                    get_current_folder(), STATIC_DEMO_FILES, files_, folders_
+                root_mention = "my drive" in lower or "root" in lower or "top" in lower
+                total_files, ext_counts, total_folders, user_storage = merged_folder_stats(
+                    "My Drive" if root_mention else get_current_folder(), STATIC_DEMO_FILES
                 )
                 desc = ", ".join([f"{v} {k}" for k, v in ext_counts.items()])
                 st.success(f'📁 {total_folders} folders • 📄 {total_files} files'
@@ -379,8 +547,17 @@ def main():
                            f' • 💾 User Storage: {user_storage/1024:.1f} KB')
                 answered = True
             if not answered:
-                with st.spinner("Thinking..."):
-                    st.success(agent.ask(inp))
+                st.write_stream(agent.ask(inp, stream=True))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Extraction workers are spawned processes that re-run this script as __mp_main__;
+    # they only need its imports, not an agent or a page of their own.
+    agent = get_agent()
+    if os.environ.get("DRIVE_METRICS_PORT"):
+        start_metrics_server(int(os.environ["DRIVE_METRICS_PORT"]), os.environ.get("DRIVE_METRICS_HOST", "127.0.0.1"))
+    st.set_page_config(page_title="Databricks Drive", page_icon="📁", layout="wide", initial_sidebar_state="collapsed")
+    st.markdown(PAGE_STYLE, unsafe_allow_html=True)
+    with metrics.span("render"):
+        main()
+    if os.environ.get("DRIVE_ADMIN_PANEL") == "1":
+        performance_panel()
\ No newline at end of file
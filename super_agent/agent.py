@@ -1,27 +1,689 @@
 import os
-import json
+import re
+import copy
+import hashlib
 from pathlib import Path
 import mimetypes
-from openai import OpenAI
+import threading
+from functools import partial, wraps
+from datetime import datetime
+from contextlib import contextmanager
+from collections import OrderedDict, Counter
 
-METADATA_PATH = Path(os.environ.get("DRIVE_STORAGE_PATH", "/tmp/databricks_drive")) / "metadata.json"
+from super_agent import metrics
+from super_agent.blobstore import BlobStore
+from super_agent.extract import TextCache, ExtractionService, can_extract, extract_document, page_slice
+from super_agent.search_index import SearchIndex
+from super_agent.tables import TableCache, is_table, profile_markdown, profile_summary
+from super_agent.preview import ThumbnailCache, PREVIEW_ROWS, read_text_range, text_head, csv_head, xlsx_head
+from super_agent.context import SYSTEM_PROMPT, CANDIDATES, CONTEXT_TOKENS, build_context, rank_files
+from super_agent.summary_cache import SummaryCache, summary_key
+from super_agent.summarize import (
+    MapReduceSummarizer, TokenBucket, RateLimitedClient, summarize_many, stream_completion,
+    CHUNK_TOKENS, MAPREDUCE_PROMPT_VERSION
+)
+from super_agent.metadata_store import (
+    open_metadata_store, meta_add_folder, meta_put_file, meta_move_file, meta_remove_file, meta_list_children,
+    meta_subtree, meta_subtree_size, meta_remove_subtree, meta_move_folder, meta_blob_refs,
+    meta_recent_files, meta_ordered_children, page_of, SORT_KEYS, meta_folder_stats, meta_rebuild_stats,
+    meta_rename_file, meta_rename_folder, file_extension
+)
+
+LLM_MODEL = "drive_superagent"
+LLM_BASE_URL = "https://e2-demo-field-eng.cloud.databricks.com/serving-endpoints"
+# Bump whenever the summary prompt changes so cached summaries of the old prompt are not reused.
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_CONCURRENCY = int(os.environ.get("DRIVE_SUMMARY_CONCURRENCY", 4))
+BATCH_SUMMARY_CONCURRENCY = int(os.environ.get("DRIVE_BATCH_SUMMARY_CONCURRENCY", 8))
+LISTING_CACHE_SIZE = 64
+SEMANTIC_SEARCH = os.environ.get("DRIVE_SEMANTIC_SEARCH", "1") != "0"
+# Shared by every session in the process: the serving endpoint's QPS limit is global.
+LLM_RATE_LIMIT = TokenBucket(float(os.environ.get("DRIVE_LLM_QPS", 5)), burst=float(os.environ.get("DRIVE_LLM_BURST", 10)))
+
+class MetadataCache:
+    """Process-wide view of a MetadataStore shared by every Streamlit session.
+
+    load() hands out the cached dict (callers must save() what they mutate) and only
+    re-reads the store when its version (file mtime/size or SQLite counter) changes.
+    Writes change that dict in place, so code that iterates it uses items() instead.
+    Writers are serialized by their own lock and take the cache lock only to change the
+    dict, so readers never wait for a store write. Writes inside batch() go to a private
+    copy (whole-file stores) or the store's transaction, are coalesced into a single
+    flush/transaction and are published to the dict in one step when the batch commits.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._meta = None
+        self._version = None
+        # State of the open batch, owned by the thread holding _write_lock.
+        self._depth = 0
+        self._owner = None
+        self._staged = None
+        self._pending = []
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.flushes = 0
+        # Sorted listings of whole-file stores, valid while (writes, version, dict) is unchanged.
+        self._listings = OrderedDict()
+
+    def _is_fresh(self):
+        return self._meta is not None and self.store.version() == self._version
+
+    def _current(self):
+        if self._owner == threading.get_ident():
+            if self._staged is not None:
+                return self._staged
+            if self._pending:
+                # The batch's own writes are only visible through the store's open transaction.
+                return self.store.load()
+        if self._is_fresh():
+            self.hits += 1
+            return self._meta
+        self.misses += 1
+        with metrics.span("metadata_load"):
+            self._version = self.store.version()
+            self._meta = self.store.load()
+        return self._meta
+
+    def load(self):
+        with self._lock:
+            return self._current()
+
+    def items(self, kind):
+        """[(name, record)] of "files" or "folders", copied under the lock so writers cannot change it mid-iteration."""
+        with self._lock:
+            return list(self._current()[kind].items())
+
+    def _read(self, meta_op, *args):
+        with self._lock:
+            return meta_op(self._current(), *args)
+
+    def save(self, meta):
+        with self._write_lock:
+            self.writes += 1
+            if self._depth:
+                self._staged = meta
+                return
+            with metrics.span("metadata_save"):
+                self.store.save(meta)
+            with self._lock:
+                self._meta = meta
+                self._version = self.store.version()
+                self.flushes += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._meta = None
+            self._version = None
+
+    def _stage(self):
+        if self._staged is None:
+            with self._lock:
+                self._staged = copy.deepcopy(self._current())
+        return self._staged
+
+    def _publish(self, base):
+        with self._lock:
+            self.flushes += 1
+            if self._staged is not None:
+                self._meta = self._staged
+            elif self._meta is not None and self._version == base:
+                # Mirror the committed changes so the cached dict stays valid without a reload.
+                for meta_op, args in self._pending:
+                    meta_op(self._meta, *args)
+            else:
+                return
+            self._version = self.store.version()
+
+    @contextmanager
+    def batch(self):
+        with self._write_lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self
+                finally:
+                    self._depth -= 1
+                return
+            self._owner, self._staged, self._pending, self._depth = threading.get_ident(), None, [], 1
+            try:
+                with self.store.batch():
+                    base, writes = self.store.version(), self.writes
+                    yield self
+                    if self._staged is not None:
+                        with metrics.span("metadata_save"):
+                            self.store.save(self._staged)
+                if self.writes != writes:
+                    self._publish(base)
+            finally:
+                self._owner, self._staged, self._pending, self._depth = None, None, [], 0
+
+    def _mutate(self, name, meta_op, *args):
+        with self._write_lock:
+            if self._depth:
+                self.writes += 1
+                if self.store.whole_file or self._staged is not None:
+                    return meta_op(self._stage(), *args)
+                with metrics.span("metadata_write", op=name):
+                    result = getattr(self.store, name)(*args)
+                self._pending.append((meta_op, args))
+                return result
+            if not self.store.whole_file:
+                with self.batch():
+                    return self._mutate(name, meta_op, *args)
+            # A single change to a whole-file store is made to the dict in place, then written out.
+            try:
+                with self._lock:
+                    meta = self._current()
+                    result = meta_op(meta, *args)
+                    self.writes += 1
+                with metrics.span("metadata_save"):
+                    self.store.save(meta)
+            except BaseException:
+                self.invalidate()
+                raise
+            with self._lock:
+                self._version = self.store.version()
+                self.flushes += 1
+            return result
+
+    def get_file(self, name):
+        if self.store.whole_file:
+            return self.load()["files"].get(name)
+        return self.store.get_file(name)
+
+    def get_folder(self, name):
+        if self.store.whole_file:
+            return self.load()["folders"].get(name)
+        return self.store.get_folder(name)
+
+    def list_children(self, folder):
+        if self.store.whole_file:
+            return self._read(meta_list_children, folder)
+        return self.store.list_children(folder)
+
+    def find_file_by_path(self, path):
+        return self.store.find_file_by_path(path)
+
+    def subtree(self, folder):
+        if self.store.whole_file:
+            return self._read(meta_subtree, folder)
+        return self.store.subtree(folder)
+
+    def subtree_size(self, folder):
+        if self.store.whole_file:
+            return self._read(meta_subtree_size, folder)
+        return self.store.subtree_size(folder)
+
+    def blob_refs(self, digest):
+        if self.store.whole_file:
+            return self._read(meta_blob_refs, digest)
+        return self.store.blob_refs(digest)
+
+    def list_page(self, folder, sort="name", descending=False, query=None, kind=None, offset=0, limit=50, cursor=None):
+        if not self.store.whole_file:
+            return self.store.list_page(folder, sort, descending, query, kind, offset, limit, cursor)
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort}'")
+        with self._lock:
+            meta = self._current()
+            stamp = (self.writes, self._version, id(meta))
+            key = (folder, sort, descending, query or None, kind)
+            entry = self._listings.get(key)
+            if entry is None or entry[0] != stamp:
+                entry = self._listings[key] = (stamp, meta_ordered_children(meta, folder, sort, descending, query, kind))
+                while len(self._listings) > LISTING_CACHE_SIZE:
+                    self._listings.popitem(last=False)
+            self._listings.move_to_end(key)
+        return page_of(entry[1], offset, limit, cursor, descending)
+
+    def folder_stats(self, folder):
+        if self.store.whole_file:
+            return self._read(meta_folder_stats, folder)
+        return self.store.folder_stats(folder)
+
+    def recent_files(self, limit):
+        if self.store.whole_file:
+            return self._read(meta_recent_files, limit)
+        return self.store.recent_files(limit)
+
+    def add_folder(self, name, parent):
+        return self._mutate("add_folder", meta_add_folder, name, parent)
+
+    def put_file(self, name, record):
+        return self._mutate("put_file", meta_put_file, name, dict(record))
+
+    def move_file(self, name, folder):
+        return self._mutate("move_file", meta_move_file, name, folder)
+
+    def remove_file(self, name):
+        return self._mutate("remove_file", meta_remove_file, name)
+
+    def rename_file(self, name, new_name):
+        return self._mutate("rename_file", meta_rename_file, name, new_name)
+
+    def rename_folder(self, name, new_name):
+        return self._mutate("rename_folder", meta_rename_folder, name, new_name)
+
+    def remove_subtree(self, folder):
+        return self._mutate("remove_subtree", meta_remove_subtree, folder)
+
+    def move_folder(self, name, parent):
+        return self._mutate("move_folder", meta_move_folder, name, parent)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "flushes": self.flushes,
+        }
+
+_store = None
+_blobs = None
+_texts = None
+_thumbnails = None
+_llm = None
+_tables = None
+_extractor = None
+_summaries = None
+_search_index = None
+_folder_index = None
+_vector_index = None
+_store_lock = threading.Lock()
+_index_lock = threading.Lock()
+_vector_lock = threading.Lock()
+# Serializes "is this blob still referenced?" against uploads that may re-reference it.
+# Always taken before the metadata cache lock.
+_blob_lock = threading.RLock()
+
+def get_metadata_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataCache(open_metadata_store(_storage_root()))
+            metrics.register_collector("metadata_cache", _store.stats)
+        return _store
+
+def _storage_root():
+    return Path(os.environ.get("DRIVE_STORAGE_PATH", "/tmp/databricks_drive"))
+
+def _make_blob_store():
+    backend = os.environ.get("DRIVE_STORAGE_BACKEND", "local").lower()
+    if backend == "local":
+        return BlobStore(_storage_root() / "blobs")
+    if backend == "volumes":
+        from super_agent.volumes import VolumeBlobStore, LocalVolumeClient, DatabricksVolumeClient
+        stand_in = os.environ.get("DRIVE_VOLUME_LOCAL_ROOT")
+        if stand_in:
+            client = LocalVolumeClient(stand_in)
+        else:
+            client = DatabricksVolumeClient(os.environ["DATABRICKS_HOST"], os.environ.get("DATABRICKS_TOKEN"))
+        return VolumeBlobStore(
+            client,
+            os.environ.get("DRIVE_VOLUME_PATH", "/Volumes/main/default/drive"),
+            _storage_root() / "blob-cache",
+            part_size=int(os.environ.get("DRIVE_VOLUME_PART_MB", 8)) * 1024 * 1024,
+            workers=int(os.environ.get("DRIVE_VOLUME_WORKERS", 8)),
+            cache_bytes=int(os.environ.get("DRIVE_VOLUME_CACHE_MB", 1024)) * 1024 * 1024,
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def get_blob_store():
+    global _blobs
+    with _store_lock:
+        if _blobs is None:
+            _blobs = _make_blob_store()
+            if hasattr(_blobs, "stats"):
+                metrics.register_collector("blob_store", _blobs.stats)
+        return _blobs
+
+def file_exists(fdata):
+    if fdata.get("digest"):
+        return get_blob_store().exists(fdata["digest"])
+    return Path(fdata["path"]).exists()
+
+def open_file(fdata):
+    """Seekable binary file of a stored file's bytes, whatever the storage backend."""
+    if fdata.get("digest"):
+        return get_blob_store().open(fdata["digest"])
+    return open(fdata["path"], "rb")
+
+def local_file(fdata):
+    """Local path of a stored file's bytes, for parsers and worker processes that need one.
+
+    With a remote backend the blob is downloaded into the local read-through cache first.
+    """
+    if fdata.get("digest"):
+        return get_blob_store().local_path(fdata["digest"])
+    return Path(fdata["path"])
+
+def get_text_cache():
+    global _texts
+    with _store_lock:
+        if _texts is None:
+            _texts = TextCache(_storage_root() / "text")
+        return _texts
+
+def get_thumbnail_cache():
+    global _thumbnails
+    with _store_lock:
+        if _thumbnails is None:
+            _thumbnails = ThumbnailCache(_storage_root() / "thumbs", size=int(os.environ.get("DRIVE_THUMBNAIL_SIZE", 512)))
+        return _thumbnails
+
+def get_table_cache():
+    global _tables
+    with _store_lock:
+        if _tables is None:
+            _tables = TableCache(_storage_root() / "tables")
+        return _tables
+
+def _make_llm_client(token, base_url):
+    from super_agent.llm_transport import LLMTransport, CircuitBreaker
+    hedge_ms = float(os.environ.get("DRIVE_LLM_HEDGE_MS", 0))
+    return LLMTransport(
+        token, base_url,
+        deadline=float(os.environ.get("DRIVE_LLM_TIMEOUT", 60)),
+        max_retries=int(os.environ.get("DRIVE_LLM_RETRIES", 3)),
+        max_connections=int(os.environ.get("DRIVE_LLM_MAX_CONNECTIONS", 20)),
+        hedge_after=hedge_ms / 1000 if hedge_ms > 0 else None,
+        breaker=CircuitBreaker(int(os.environ.get("DRIVE_LLM_BREAKER_FAILURES", 5)),
+                               float(os.environ.get("DRIVE_LLM_BREAKER_RESET", 30))),
+    )
+
+def get_llm_client():
+    """Process-wide LLM transport to DATABRICKS_BASE_URL, shared by the assistant, summaries and embeddings."""
+    global _llm
+    with _store_lock:
+        if _llm is None:
+            _llm = _make_llm_client(os.environ.get("DATABRICKS_TOKEN"), os.environ.get("DATABRICKS_BASE_URL", LLM_BASE_URL))
+            metrics.register_collector("llm", _llm.stats)
+        return _llm
+
+def get_summary_cache():
+    global _summaries
+    with _store_lock:
+        if _summaries is None:
+            _summaries = SummaryCache(
+                _storage_root() / "summaries.db",
+                max_bytes=int(os.environ.get("DRIVE_SUMMARY_CACHE_BYTES", 64 * 1024 * 1024)),
+            )
+            metrics.register_collector("summary_cache", _summaries.stats)
+        return _summaries
+
+def get_extraction_service():
+    global _extractor
+    cache = get_text_cache()
+    tables = get_table_cache()
+    with _store_lock:
+        if _extractor is None:
+            workers = os.environ.get("DRIVE_EXTRACT_WORKERS")
+            _extractor = ExtractionService(
+                cache,
+                max_workers=int(workers) if workers else None,
+                timeout=float(os.environ.get("DRIVE_EXTRACT_TIMEOUT", 120)),
+                tables=tables,
+            )
+        return _extractor
+
+def extract_in_background(filename, fdata, on_done=None):
+    if fdata.get("digest") and can_extract(filename):
+        return get_extraction_service().submit(fdata["digest"], local_file(fdata), filename, on_done)
+    return None
+
+def extraction_status(filename):
+    fdata = get_metadata_store().get_file(filename)
+    if not fdata or not fdata.get("digest"):
+        return None
+    return get_extraction_service().status(fdata["digest"])
+
+def get_file_document(filename, fdata, extract=True):
+    """Pre-extracted {"text", "pages"} of a file and an error message (or None).
+
+    Waits for the background job when the file is still being extracted; files uploaded
+    before content addressing have no sidecar and are parsed inline.
+    """
+    digest = fdata.get("digest")
+    if digest:
+        doc = get_text_cache().get_document(digest)
+        if doc is not None or not extract or not can_extract(filename):
+            return doc, None
+        service = get_extraction_service()
+        service.submit(digest, local_file(fdata), filename)
+        with metrics.span("extract_wait"):
+            doc = service.wait(digest)
+        if doc is None:
+            status = service.status(digest) or {}
+            return None, status.get("error") or "text extraction did not finish"
+        return doc, None
+    if not extract or not can_extract(filename):
+        return None, None
+    try:
+        return extract_document(local_file(fdata), filename), None
+    except Exception as e:
+        return None, str(e)
+
+def get_file_text(filename, fdata, extract=True):
+    doc, _ = get_file_document(filename, fdata, extract)
+    return doc["text"] if doc else ""
+
+def _preview_key(fdata):
+    if fdata.get("digest"):
+        return fdata["digest"]
+    stat = Path(fdata["path"]).stat()
+    return hashlib.sha256(f"{fdata['path']}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+
+def get_table_profile(filename, fdata, convert=True):
+    """Column profile of a CSV/XLSX file from the columnar cache, or None.
+
+    Waits for the upload's background conversion; with convert=True, files converted
+    before the cache existed (or whose conversion failed) are converted inline.
+    """
+    if not is_table(filename):
+        return None
+    key = _preview_key(fdata)
+    cache = get_table_cache()
+    profile = cache.get_profile(key)
+    if profile is not None or not convert:
+        return profile
+    if fdata.get("digest"):
+        get_extraction_service().wait(fdata["digest"])
+        profile = cache.get_profile(key)
+        if profile is not None:
+            return profile
+    return cache.convert(key, local_file(fdata), filename)
+
+PREVIEW_EXTENSIONS = (".txt", ".csv", ".xlsx", ".xlsm", ".png", ".jpg", ".jpeg")
+
+@metrics.timed("preview")
+def file_preview(filename, fdata, rows=PREVIEW_ROWS):
+    """Preview of a stored file whose cost does not grow with the file size.
+
+    Tables come from the columnar cache once the upload is converted, with their "profile".
+    Returns {"kind": "text", "text", "truncated"}, {"kind": "table", "table", "sheets"},
+    {"kind": "image", "path"} or {"kind": None} when the type has no preview.
+    """
+    ext = Path(filename).suffix.lower()
+    profile = get_table_profile(filename, fdata, convert=False)
+    if profile is not None:
+        sheets = [sheet["name"] for sheet in profile["sheets"]]
+        return {"kind": "table", "table": get_table_cache().head(_preview_key(fdata), rows),
+                "sheets": sheets if ext != ".csv" else None, "profile": profile}
+    if ext not in PREVIEW_EXTENSIONS:
+        return {"kind": None}
+    # Opened once; with a remote storage backend only the ranges the preview reads are fetched.
+    with open_file(fdata) as f:
+        if ext == ".csv":
+            try:
+                return {"kind": "table", "table": csv_head(f, rows), "sheets": None}
+            except Exception:
+                f.seek(0)  # Malformed CSV: fall back to the raw text below.
+        if ext in (".txt", ".csv"):
+            text, truncated = read_text_range(f)
+            return {"kind": "text", "text": text, "truncated": truncated}
+        if ext in (".xlsx", ".xlsm"):
+            head = xlsx_head(f, rows)
+            return {"kind": "table", "table": head["table"], "sheets": head["sheets"]}
+        return {"kind": "image", "path": str(get_thumbnail_cache().get(_preview_key(fdata), f))}
+
+def _index_text(filename, fdata, extract=True):
+    return get_file_text(filename, fdata, extract) + "\n" + fdata.get("description", "")
+
+def get_search_index():
+    global _search_index
+    with _index_lock:
+        if _search_index is None:
+            # Built from names plus already-extracted text only; uploads extract as they arrive.
+            index = SearchIndex()
+            for name, fdata in get_metadata_store().items("files"):
+                index.add(name, _index_text(name, fdata, extract=False), fdata["parent"])
+            _search_index = index
+        return _search_index
+
+def _update_search_index(action, filename, *args):
+    with _index_lock:
+        index = _search_index
+    if index is not None:
+        getattr(index, action)(filename, *args)
+
+def _make_embedder():
+    # Imported on first use: numpy is slow to load and only semantic search needs it.
+    from super_agent.vector_index import HashingEmbedder, OpenAIEmbedder
+    model = os.environ.get("DRIVE_EMBEDDING_MODEL")
+    if model:
+        return OpenAIEmbedder(get_llm_client(), model)
+    return HashingEmbedder(int(os.environ.get("DRIVE_EMBEDDING_DIM", 256)))
+
+def get_vector_index():
+    global _vector_index
+    with _vector_lock:
+        if _vector_index is None:
+            from super_agent.vector_index import VectorIndex
+            index = VectorIndex(_storage_root() / "vectors", _make_embedder(),
+                                ivf=os.environ.get("DRIVE_VECTOR_IVF", "0") == "1")
+            # Catch up with uploads/deletes made while the index was not loaded, off the request path.
+            threading.Thread(target=_sync_vector_index, args=(index,), name="vector-index-sync", daemon=True).start()
+            _vector_index = index
+        return _vector_index
+
+def _sync_vector_index(index):
+    files = dict(get_metadata_store().items("files"))
+    for name in index.names():
+        if name not in files:
+            index.remove(name)
+    for name, fdata in files.items():
+        if fdata.get("digest") and index.digest_of(name) != fdata["digest"]:
+            text = get_file_text(name, fdata, extract=False)
+            if text.strip():
+                index.add(name, fdata["digest"], text)
+
+def _update_vector_index(action, filename, *args):
+    with _vector_lock:
+        index = _vector_index
+    if index is not None:
+        getattr(index, action)(filename, *args)
+
+def semantic_search(query, k=10):
+    """Files whose extracted text is semantically closest to query: [(name, record, passage, score)]."""
+    store = get_metadata_store()
+    results = []
+    for name, _, start, stop, score in get_vector_index().search_files(query, k):
+        record = store.get_file(name) if score > 0 else None
+        if record:
+            results.append((name, record, get_file_text(name, record, extract=False)[start:stop], score))
+    return results
+
+def semantic_search_tool(query):
+    results = semantic_search(query)
+    if not results:
+        return f"No documents found about: '{query}'"
+    return "\n".join(
+        f"- {name} (in: {record['parent']}): …{' '.join(passage.split())[:200]}…"
+        for name, record, passage, _ in results
+    )
+
+def get_folder_index():
+    global _folder_index
+    with _index_lock:
+        if _folder_index is None:
+            index = SearchIndex()
+            for name, folder in get_metadata_store().items("folders"):
+                index.add(name, "", folder["parent"])
+            _folder_index = index
+        return _folder_index
+
+def _reset_folder_index():
+    global _folder_index
+    with _index_lock:
+        _folder_index = None
+
+def workspace_context(query, budget_tokens=None):
+    """Query-specific workspace message for the LLM, bounded by budget_tokens (DRIVE_CONTEXT_TOKENS)."""
+    store = get_metadata_store()
+    index, folder_index = get_search_index(), get_folder_index()
+    file_hits = []
+    for name, score in index.search(query, limit=CANDIDATES, require_all=False):
+        record = store.get_file(name)
+        if record:
+            file_hits.append((name, record, score))
+    semantic_hits, passages = [], {}
+    if SEMANTIC_SEARCH:
+        for name, record, passage, score in semantic_search(query, CANDIDATES // 4):
+            semantic_hits.append((name, record, score))
+            passages[name] = passage
+    ranked = rank_files(file_hits, store.recent_files(CANDIDATES), semantic_hits=semantic_hits)
+    for _, name, record, matched in ranked:
+        # Spreadsheets are described by their schema rather than a slice of raw cells.
+        if matched and is_table(name) and record.get("digest"):
+            profile = get_table_cache().get_profile(record["digest"])
+            if profile:
+                passages[name] = profile_summary(profile)
+    folder_names = [name for name, _ in folder_index.search(query, limit=CANDIDATES // 2, require_all=False)]
+    for _, _, record, matched in ranked:
+        if matched and record.get("parent") not in folder_names:
+            folder_names.append(record.get("parent"))
+    folders = []
+    for name in folder_names[:CANDIDATES // 2]:
+        folder = store.get_folder(name)
+        if folder:
+            folders.append((name, folder["parent"], store.folder_stats(name)))
+    return build_context(
+        query, folders, ranked, (len(folder_index), len(index)),
+        lambda name, record: get_file_text(name, record, extract=False),
+        budget_tokens or CONTEXT_TOKENS, passages,
+    )
+
+@contextmanager
+def metadata_batch():
+    with _blob_lock, get_metadata_store().batch() as store:
+        yield store
 
 def load_metadata():
-    if METADATA_PATH.exists():
-        with open(METADATA_PATH, "r") as f:
-            return json.load(f)
-    return {"folders": {"My Drive": {"parent": None, "children": []}}, "files": {}}
+    return get_metadata_store().load()
 
 def save_metadata(meta):
-    METADATA_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(METADATA_PATH, "w") as f:
-        json.dump(meta, f, indent=2)
+    global _search_index, _folder_index, _vector_index
+    get_metadata_store().save(meta_rebuild_stats(meta))
+    with _index_lock:
+        _search_index = None
+        _folder_index = None
+    with _vector_lock:
+        if _vector_index is not None:
+            _vector_index.close()
+        _vector_index = None
 
-def _search_files(keyword, meta):
+def _search_files(keyword, meta, limit=50):
     return [
-        (fname, fdata)
-        for fname, fdata in meta["files"].items()
-        if keyword.lower() in fname.lower() or keyword.lower() in fdata.get("description", "")
+        (fname, meta["files"][fname])
+        for fname, _ in get_search_index().search(keyword, limit=limit)
+        if fname in meta["files"]
     ]
 
 def search_files_tool(keyword):
@@ -31,39 +693,76 @@ def search_files_tool(keyword):
         return f"No files found matching: '{keyword}'"
     return "\n".join(f"- {fname} (size: {fdata['size']} bytes, in: {fdata['parent']})" for fname, fdata in files)
 
-def summarize_file_tool(filename, llm=None, num_pages=2, max_chars=4000):
-    meta = load_metadata()
-    fdata = meta["files"].get(filename)
+def _summarize_whole_document(filename, fdata, llm, on_progress=None):
+    cache_key = None
+    if fdata.get("digest"):
+        cache_key = summary_key(fdata["digest"], model=LLM_MODEL, mode="map_reduce", chunk_tokens=CHUNK_TOKENS,
+                                prompt_version=MAPREDUCE_PROMPT_VERSION)
+        cached = get_summary_cache().get(cache_key)
+        if cached is not None:
+            return f"**{filename}**\n\n{cached}"
+    doc, error = get_file_document(filename, fdata)
+    if doc is None or not doc["text"].strip():
+        return f"**{filename}**\n\n(Could not extract text: {error or 'the file may be scanned or encrypted'})"
+    summarizer = MapReduceSummarizer(llm, LLM_MODEL, cache=get_summary_cache(), max_workers=SUMMARY_CONCURRENCY)
+    try:
+        content = summarizer.summarize(doc["text"], filename, owner=fdata.get("digest", ""), on_progress=on_progress)
+    except Exception as e:
+        return f"**{filename}**\n\n(LLM summarization failed: {e})"
+    if cache_key and content:
+        get_summary_cache().put(cache_key, fdata["digest"], content)
+    return f"**{filename}**\n\n{content}"
+
+def _stream_summary(filename, llm, prompt, cache_key, digest):
+    yield f"**{filename}**\n\n"
+    parts = []
+    try:
+        for delta in stream_completion(llm, LLM_MODEL, [{"role": "user", "content": prompt}], 600):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        yield f"\n\n(LLM summarization failed: {e})"
+        return
+    content = "".join(parts)
+    if cache_key and content:
+        get_summary_cache().put(cache_key, digest, content)
+
+def summarize_file_tool(filename, llm=None, num_pages=2, max_chars=4000, mode="head", on_progress=None, stream=False):
+    """Summary of one file as markdown; with stream=True, an iterator of markdown deltas instead."""
+    result = _summarize_file(filename, llm, num_pages, max_chars, mode, on_progress, stream)
+    if stream and isinstance(result, str):
+        return iter([result])
+    return result
+
+def _summarize_file(filename, llm, num_pages, max_chars, mode, on_progress, stream):
+    fdata = get_metadata_store().get_file(filename)
     if not fdata:
         return f"File '{filename}' not found."
-    path = Path(fdata["path"])
-    mime, _ = mimetypes.guess_type(str(path))
+    if mode == "map_reduce" and llm and can_extract(filename):
+        return _summarize_whole_document(filename, fdata, llm, on_progress)
+    mime, _ = mimetypes.guess_type(filename)
     try:
+        if is_table(filename):
+            profile = get_table_profile(filename, fdata)
+            return f"**{filename}**\n\n{profile_markdown(profile)}"
         if mime in ["text/plain", "text/csv"]:
-            text = path.read_text(encoding="utf-8", errors="replace")
-            head = "\n".join(text.splitlines()[:10])
+            with open_file(fdata) as f:
+                head = text_head(f, 10)
             return f"**{filename}**\n\n> Preview first 10 lines:\n{head}"
         elif mime and mime.startswith("image/"):
             return f"**{filename}**\n\n(Image preview available in UI)"
         elif mime == "application/pdf":
-            text = ""
-            try:
-                import pdfplumber
-                with pdfplumber.open(str(path)) as pdf:
-                    for i, page in enumerate(pdf.pages[:num_pages]):
-                        page_txt = page.extract_text() or ""
-                        text += page_txt + "\n"
-            except Exception:
-                try:
-                    import PyPDF2
-                    with open(str(path), "rb") as f:
-                        reader = PyPDF2.PdfReader(f)
-                        for i, page in enumerate(reader.pages[:num_pages]):
-                            page_txt = page.extract_text() or ""
-                            text += page_txt + "\n"
-                except Exception as e2:
-                    return f"**{filename}**\n\n(Could not extract text from PDF: {e2})"
-            trimmed = text[:max_chars].strip()
+            cache_key = None
+            if llm and fdata.get("digest"):
+                cache_key = summary_key(fdata["digest"], model=LLM_MODEL, num_pages=num_pages,
+                                        max_chars=max_chars, prompt_version=SUMMARY_PROMPT_VERSION)
+                cached = get_summary_cache().get(cache_key)
+                if cached is not None:
+                    return f"**{filename}**\n\n{cached}"
+            doc, error = get_file_document(filename, fdata)
+            if doc is None:
+                return f"**{filename}**\n\n(Could not extract text from PDF: {error})"
+            trimmed = page_slice(doc, num_pages)[:max_chars].strip()
             if not trimmed:
                 return f"**{filename}**\n\n(Could not extract text from PDF. It may be scanned or encrypted.)"
             if llm:
@@ -75,13 +774,17 @@ def summarize_file_tool(filename, llm=None, num_pages=2, max_chars=4000):
                     "Write a concise executive summary with key customers/projects, main topics, business outcomes, and actionable findings. "
                     "Use headings/bullets when suitable. Do not repeat raw text—synthesize for a product manager, architect, or field leader."
                 )
+                if stream:
+                    return _stream_summary(filename, llm, prompt, cache_key, fdata.get("digest"))
                 try:
                     response = llm.chat.completions.create(
-                        model="drive_superagent",
+                        model=LLM_MODEL,
                         messages=[{"role": "user", "content": prompt}],
                         max_tokens=600,
                     )
                     content = response.choices[0].message.content
+                    if cache_key and content:
+                        get_summary_cache().put(cache_key, fdata["digest"], content)
                     return f"**{filename}**\n\n{content}"
                 except Exception as e:
                     return f"**{filename}**\n\n(LLM summarization failed: {e})"
@@ -92,51 +795,381 @@ def summarize_file_tool(filename, llm=None, num_pages=2, max_chars=4000):
     except Exception as e:
         return f"**{filename}**\n\nError reading file: {e}"
 
+def summarizable_files(folder, recursive=True, mode="head"):
+    store = get_metadata_store()
+    if recursive:
+        files = store.subtree(folder)[1]
+    else:
+        files = [(name, record) for kind, name, record in store.list_children(folder) if kind == "file"]
+    if mode == "map_reduce":
+        return [name for name, _ in files if can_extract(name)]
+    return [name for name, _ in files if mimetypes.guess_type(name)[0] in ("application/pdf", "text/plain", "text/csv")]
+
+def summarize_folder(folder, llm=None, recursive=True, mode="head", max_workers=None):
+    """Summarize every eligible file under folder; yields (filename, summary) as each completes."""
+    if not get_metadata_store().get_folder(folder):
+        return iter([(folder, f"Folder '{folder}' not found.")])
+    limited = RateLimitedClient(llm, LLM_RATE_LIMIT) if llm else None
+    return summarize_many(
+        summarizable_files(folder, recursive, mode),
+        partial(summarize_file_tool, llm=limited, mode=mode),
+        max_workers or BATCH_SUMMARY_CONCURRENCY,
+    )
+
+def summarize_folder_tool(folder, llm=None):
+    results = [summary for _, summary in summarize_folder(folder, llm)]
+    return "\n\n---\n\n".join(results) if results else f"No summarizable files in '{folder}'."
+
 def move_file_tool(filename, folder):
-    meta = load_metadata()
-    if filename not in meta["files"]:
+    store = get_metadata_store()
+    fdata = store.get_file(filename)
+    if not fdata:
         return f"File '{filename}' not found."
-    if folder not in meta["folders"]:
+    if not store.get_folder(folder):
         return f"Destination folder '{folder}' doesn't exist."
-    cur_folder = meta["files"][filename]["parent"]
-    if cur_folder == folder:
+    if fdata["parent"] == folder:
         return f"File '{filename}' already in '{folder}'."
-    meta["folders"][cur_folder]["children"].remove(filename)
-    meta["folders"][folder]["children"].append(filename)
-    meta["files"][filename]["parent"] = folder
-    save_metadata(meta)
+    store.move_file(filename, folder)
+    _update_search_index("move", filename, folder)
     return f"Moved '{filename}' to '{folder}'."
 
 def create_folder(name, parent="My Drive"):
-    meta = load_metadata()
-    if name in meta["folders"]:
+    store = get_metadata_store()
+    if store.get_folder(name):
         return False, "Folder already exists"
-    meta["folders"][name] = {"parent": parent, "children": []}
-    meta["folders"][parent]["children"].append(name)
-    save_metadata(meta)
+    store.add_folder(name, parent)
+    with _index_lock:
+        index = _folder_index
+    if index is not None:
+        index.add(name, "", parent)
     return True, "Folder created"
 
+def move_folder_tool(foldername, parent):
+    store = get_metadata_store()
+    folder = store.get_folder(foldername)
+    if not folder:
+        return f"Folder '{foldername}' not found."
+    if folder["parent"] is None:
+        return "The root folder cannot be moved."
+    if not store.get_folder(parent):
+        return f"Destination folder '{parent}' doesn't exist."
+    if folder["parent"] == parent:
+        return f"Folder '{foldername}' already in '{parent}'."
+    try:
+        store.move_folder(foldername, parent)
+    except ValueError as e:
+        return f"{e}."
+    _reset_folder_index()
+    return f"Moved folder '{foldername}' to '{parent}'."
+
+def folder_size(foldername):
+    """{"size", "files", "folders"} of foldername's whole subtree, read from its maintained aggregate."""
+    return get_metadata_store().subtree_size(foldername)
+
+def _release_file_data(fdata):
+    digest = fdata.get("digest")
+    if digest:
+        if not get_metadata_store().blob_refs(digest):
+            get_blob_store().delete(digest)
+            get_text_cache().delete(digest)
+            get_thumbnail_cache().delete(digest)
+            get_table_cache().delete(digest)
+            get_extraction_service().forget(digest)
+            get_summary_cache().invalidate_digest(digest)
+        return
+    try:
+        get_thumbnail_cache().delete(_preview_key(fdata))
+        get_table_cache().delete(_preview_key(fdata))
+        Path(fdata["path"]).unlink()
+    except FileNotFoundError:
+        pass
+
+def _put_upload(stream):
+    # The bytes are stored before any lock or metadata transaction is taken.
+    start = stream.tell() if stream.seekable() else None
+    digest, size, path, _ = get_blob_store().put(stream)
+    metrics.inc("io_bytes", size, op="upload")
+    return start, digest, size, path
+
+def _commit_upload(filename, stream, blob, parent):
+    """Point filename's record at a stored blob; under _blob_lock. Returns (record, changed)."""
+    start, digest, size, path = blob
+    if not get_blob_store().exists(digest):
+        # An already stored blob was deduplicated, then dropped by a concurrent delete.
+        if start is None:
+            raise FileNotFoundError(f"The stored content of '{filename}' was deleted during the upload.")
+        stream.seek(start)
+        digest, size, path, _ = get_blob_store().put(stream)
+    current = get_metadata_store().get_file(filename)
+    if current and current.get("digest") == digest and current["parent"] == parent:
+        return current, False
+    upload_time = datetime.now().isoformat()
+    record = {
+        "path": str(path),
+        "size": size,
+        "digest": digest,
+        "created": upload_time,
+        "modified": upload_time,
+        "parent": parent,
+    }
+    old = get_metadata_store().put_file(filename, record)
+    if old and old.get("digest") != digest:
+        _release_file_data(old)
+        _update_vector_index("remove", filename)
+    return record, True
+
+def _index_upload(filename, record):
+    _update_search_index("add", filename, _index_text(filename, record, extract=False), record["parent"])
+    extract_in_background(filename, record, partial(_reindex_extracted, filename))
+
+@metrics.timed("upload")
+def upload_file(filename, stream, parent="My Drive"):
+    blob = _put_upload(stream)
+    with _blob_lock:
+        record, changed = _commit_upload(filename, stream, blob, parent)
+    if changed:
+        _index_upload(filename, record)
+    return record
+
+def upload_batch(uploads):
+    """Upload [(filename, stream, parent)]: every file's bytes are stored first, then all the
+    records are committed in one metadata batch. Returns the records."""
+    blobs = [(filename, stream, _put_upload(stream), parent) for filename, stream, parent in uploads]
+    with metadata_batch():
+        committed = [(filename, *_commit_upload(filename, stream, blob, parent))
+                     for filename, stream, blob, parent in blobs]
+    for filename, record, changed in committed:
+        if changed:
+            _index_upload(filename, record)
+    return [record for _, record, _ in committed]
+
+def _reindex_extracted(filename, digest, job):
+    fdata = get_metadata_store().get_file(filename)
+    if job["status"] == "done" and fdata and fdata.get("digest") == digest:
+        _update_search_index("add", filename, _index_text(filename, fdata, extract=False), fdata["parent"])
+        _update_vector_index("add", filename, digest, get_file_text(filename, fdata, extract=False))
+
 def delete_file(filename):
-    meta = load_metadata()
-    if filename in meta["files"]:
-        folder = meta["files"][filename]["parent"]
-        meta["folders"][folder]["children"].remove(filename)
-        path = meta["files"][filename]["path"]
+    store = get_metadata_store()
+    with _blob_lock:
+        if store.get_file(filename):
+            _release_file_data(store.remove_file(filename))
+            _update_search_index("remove", filename)
+            _update_vector_index("remove", filename)
+
+def delete_folder_tree(foldername):
+    store = get_metadata_store()
+    folder = store.get_folder(foldername)
+    if not folder:
+        return False, "Folder not found."
+    if folder["parent"] is None:
+        return False, "The root folder cannot be deleted."
+    with _blob_lock:
+        for filename, fdata in store.remove_subtree(foldername):
+            _release_file_data(fdata)
+            _update_search_index("remove", filename)
+            _update_vector_index("remove", filename)
+    _reset_folder_index()
+    return True, f"Folder '{foldername}' (and all its content) deleted."
+
+BATCH_LABELS = {"create_folder": "folder(s) created", "move": "moved", "rename": "renamed", "delete": "deleted"}
+
+class BatchError(ValueError):
+    """An operation of apply_batch that cannot be applied; the whole batch is rolled back."""
+
+def _apply_op(store, op, name, arg, effects):
+    if op == "create_folder":
+        if not name:
+            raise BatchError("a folder name is required")
+        if store.get_folder(name):
+            raise BatchError("folder already exists")
+        if not store.get_folder(arg):
+            raise BatchError(f"parent folder '{arg}' doesn't exist")
+        store.add_folder(name, arg)
+        effects.append(("folders",))
+        return
+    if op not in BATCH_LABELS:
+        raise BatchError("unknown operation")
+    fdata = store.get_file(name)
+    folder = None if fdata else store.get_folder(name)
+    if not fdata and not folder:
+        raise BatchError("not found")
+    if folder and folder["parent"] is None:
+        raise BatchError("the root folder cannot be changed")
+    if op == "move":
+        if not store.get_folder(arg):
+            raise BatchError(f"destination folder '{arg}' doesn't exist")
+        if fdata and fdata["parent"] != arg:
+            store.move_file(name, arg)
+            effects.append(("move", name, arg))
+        elif folder and folder["parent"] != arg:
+            store.move_folder(name, arg)
+            effects.append(("folders",))
+    elif op == "rename":
+        if not arg or arg == name:
+            raise BatchError("a different new name is required")
+        if store.get_file(arg) or store.get_folder(arg):
+            raise BatchError(f"'{arg}' already exists")
+        if fdata:
+            store.rename_file(name, arg)
+            effects.append(("rename", name, arg))
+        else:
+            files = [child for kind, child, _ in store.list_children(name) if kind == "file"]
+            store.rename_folder(name, arg)
+            effects.extend(("move", child, arg) for child in files)
+            effects.append(("folders",))
+    elif fdata:
+        effects.append(("delete", name, store.remove_file(name)))
+    else:
+        effects.extend(("delete", filename, record) for filename, record in store.remove_subtree(name))
+        effects.append(("folders",))
+
+def _rename_vector_entry(name, new_name):
+    with _vector_lock:
+        index = _vector_index
+    if index is not None and index.digest_of(name):
+        # The new name picks up the old one's vectors (same digest): nothing is re-embedded.
+        index.add(new_name, index.digest_of(name), "")
+        index.remove(name)
+
+def apply_batch(operations):
+    """Validate and apply [(op, name, arg)] in one metadata commit; returns (ok, message).
+
+    op is "create_folder" (arg: parent), "move" (arg: destination folder), "rename"
+    (arg: new name) or "delete" (no arg); name may be a file or a folder. Each operation
+    sees the effect of the ones before it. If any of them is invalid, nothing is changed.
+    Must not be called inside metadata_batch(), whose commit would keep a partial batch.
+    """
+    operations = [(op[0], op[1], op[2] if len(op) > 2 else None) for op in operations]
+    if not operations:
+        return False, "Nothing to do."
+    store = get_metadata_store()
+    effects = []
+    with _blob_lock:
         try:
-            Path(path).unlink()
-        except FileNotFoundError:
-            pass
-        del meta["files"][filename]
-        save_metadata(meta)
+            with store.batch():
+                for i, (op, name, arg) in enumerate(operations, 1):
+                    try:
+                        _apply_op(store, op, name, arg, effects)
+                    except (KeyError, ValueError) as e:
+                        message = str(e).rstrip(".") if isinstance(e, ValueError) else f"{e} not found"
+                        raise BatchError(f"operation {i} ({op} '{name}'): {message}") from None
+        except BatchError as e:
+            return False, f"Nothing was changed: {e}."
+        for effect in effects:
+            if effect[0] == "delete":
+                _release_file_data(effect[2])
+    for effect in effects:
+        if effect[0] == "delete":
+            _update_search_index("remove", effect[1])
+            _update_vector_index("remove", effect[1])
+        elif effect[0] == "move":
+            _update_search_index("move", effect[1], effect[2])
+        elif effect[0] == "rename":
+            _update_search_index("rename", effect[1], effect[2])
+            _rename_vector_entry(effect[1], effect[2])
+    if ("folders",) in effects:
+        _reset_folder_index()
+    counts = Counter(op for op, _, _ in operations)
+    return True, "Done: " + ", ".join(f"{n} {BATCH_LABELS[op]}" for op, n in counts.items()) + "."
+
+FILE_KINDS = {
+    "file": None, "item": None,
+    "pdf": (".pdf",), "csv": (".csv",), "text": (".txt",),
+    "excel": (".xlsx", ".xls"), "spreadsheet": (".xlsx", ".xls", ".csv"),
+    "word": (".docx", ".doc"), "document": (".docx", ".doc", ".pdf", ".txt"),
+    "image": (".png", ".jpg", ".jpeg"), "picture": (".png", ".jpg", ".jpeg"),
+}
+_BULK_COMMAND = re.compile(r"(move|delete)\s+all\s+(?:the\s+)?(\w+?)s?(?:\s+files?)?\s+(?:in|from)\s+(.+?)(?:\s+to\s+(.+))?",
+                           re.IGNORECASE)
+
+def select_files(folder, kind="file"):
+    """Names of the files directly in folder of a FILE_KINDS kind (or an extension such as "pptx")."""
+    kind = kind.lower()
+    extensions = FILE_KINDS[kind] if kind in FILE_KINDS else ("." + kind.lstrip("."),)
+    return [name for k, name, _ in get_metadata_store().list_children(folder)
+            if k == "file" and (extensions is None or file_extension(name) in extensions)]
+
+def _item_names(text):
+    """Split "a, b and c" into existing names; a single name if any piece does not exist."""
+    store = get_metadata_store()
+    names = [n.strip() for n in re.split(r",\s*|\s+and\s+", text) if n.strip()]
+    if len(names) > 1 and all(store.get_file(n) or store.get_folder(n) for n in names):
+        return names
+    return [text.strip()]
+
+def _split_target(text, accept):
+    """Split "<names> to <target>" at the first " to " that accept(left, right) likes, else the last one."""
+    positions = [m.start() for m in re.finditer(r"\s+to\s+", text, re.IGNORECASE)]
+    for pos in positions:
+        left, right = text[:pos], re.sub(r"^\s+to\s+", "", text[pos:], flags=re.IGNORECASE)
+        if accept(left.strip(), right.strip()):
+            return left.strip(), right.strip()
+    if not positions:
+        return None
+    pos = positions[-1]
+    return text[:pos].strip(), re.sub(r"^\s+to\s+", "", text[pos:], flags=re.IGNORECASE).strip()
+
+def batch_command_tool(command):
+    """Run a bulk command as one atomic batch.
+
+    "move all <kind>s in <folder> to <folder>", "delete all <kind>s in <folder>",
+    "move <a>, <b> and <c> to <folder>", "delete <a>, <b>" and "rename <name> to <new name>".
+    """
+    store = get_metadata_store()
+    command = command.strip()
+    match = _BULK_COMMAND.fullmatch(command)
+    if match:
+        action, kind, folder, dest = match.groups()
+        action = action.lower()
+        if not store.get_folder(folder):
+            return f"Folder '{folder}' not found."
+        if action == "move" and not dest:
+            return "Please specify: move all <kind> in <folder> to <folder>"
+        names = select_files(folder, kind)
+        if not names:
+            return f"No {kind} files in '{folder}'."
+        operations = [("move", name, dest) if action == "move" else ("delete", name) for name in names]
+    else:
+        action, _, rest = command.partition(" ")
+        action = action.lower()
+        if action == "delete":
+            operations = [("delete", name) for name in _item_names(rest)]
+        elif action in ("move", "rename"):
+            exists = lambda name: store.get_file(name) or store.get_folder(name)
+            if action == "move":
+                split = _split_target(rest, lambda left, right: store.get_folder(right) and all(
+                    exists(n) for n in _item_names(left)))
+            else:
+                split = _split_target(rest, lambda left, right: exists(left))
+            if not split:
+                return f"Please specify: {action} <name> to <{'folder' if action == 'move' else 'new name'}>"
+            names, target = split
+            names = _item_names(names) if action == "move" else [names]
+            operations = [(action, name, target) for name in names]
+        else:
+            return "Unknown bulk command."
+    return apply_batch(operations)[1]
+
+BATCH_PREFIXES = ("move ", "delete ", "rename ")
+
+def _instrumented_tool(name, func):
+    """func timed as tool name, with the LLM calls it makes attributed to it; streamed results are timed to the end."""
+    @wraps(func)
+    def call(*args, **kwargs):
+        return metrics.tool_call(name, func, *args, **kwargs)
+    return call
 
 class SuperAgent:
-    def __init__(self, databricks_token=None, base_url=None):
+    def __init__(self, databricks_token=None, base_url=None, llm=None):
         self.tools = {}
-        self.llm = None
+        self.llm = llm
+        if llm is not None:
+            return
         token = databricks_token or os.environ.get('DATABRICKS_TOKEN')
         endpoint = base_url or "https://e2-demo-field-eng.cloud.databricks.com/serving-endpoints/drive_superagent/invocations"
         if token:
-            self.llm = OpenAI(api_key=token, base_url=endpoint)
+            self.llm = _make_llm_client(token, endpoint)
         else:
             print("Warning: No Databricks token found; LLM won't be initialized.")
 
@@ -144,36 +1177,66 @@ class SuperAgent:
         self.llm = llm_client
 
     def register_tool(self, name, func, description=""):
-        self.tools[name] = {"func": func, "description": description}
+        self.tools[name] = {"func": _instrumented_tool(name, func), "description": description}
+
+    def _workspace_messages(self, query):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": workspace_context(query)},
+            {"role": "user", "content": query}
+        ]
+
+    def _ask_stream(self, query):
+        query_lower = query.lower()
+        if query_lower.startswith("summarize ") and not query_lower.startswith("summarize folder ") \
+                and "summarize_file" in self.tools:
+            result = self.tools["summarize_file"]["func"](query[10:], stream=True)
+            yield from [result] if isinstance(result, str) else result
+            return
+        if any(query_lower.startswith(p) for p in BATCH_PREFIXES + ("search ", "summarize ", "find ")) or not self.llm:
+            yield self.ask(query)
+            return
+        try:
+            yield from metrics.tool_stream("chat", stream_completion(self.llm, LLM_MODEL, self._workspace_messages(query), 500))
+        except Exception as e:
+            yield f"LLM call failed: {str(e)}"
 
-    def ask(self, query):
+    def ask(self, query, stream=False):
+        """Answer query; with stream=True, returns an iterator of text deltas instead of a string."""
+        if stream:
+            return self._ask_stream(query)
         query_lower = query.lower()
         if query_lower.startswith("search "):
             keyword = query[7:]
             return self.tools.get("search_files", {}).get("func", lambda k: "Tool not registered")(keyword)
+        elif query_lower.startswith("summarize folder "):
+            folder = query[17:]
+            return self.tools.get("summarize_folder", {}).get("func", lambda f: "Tool not registered")(folder)
         elif query_lower.startswith("summarize "):
             filename = query[10:]
             return self.tools.get("summarize_file", {}).get("func", lambda f: "Tool not registered")(filename)
+        elif query_lower.startswith("find "):
+            return self.tools.get("semantic_search", {}).get("func", lambda q: "Tool not registered")(query[5:])
+        elif query_lower.startswith(("move all ", "delete ", "rename ")) or (query_lower.startswith("move ") and "," in query):
+            return self.tools.get("batch", {}).get("func", lambda c: "Tool not registered")(query)
         elif query_lower.startswith("move "):
             parts = query.split()
             if len(parts) >= 4 and parts[-2] == "to":
                 filename = " ".join(parts[1:-2])
                 folder = parts[-1]
+                if "move_folder" in self.tools and get_metadata_store().get_folder(filename):
+                    return self.tools["move_folder"]["func"](filename, folder)
                 return self.tools.get("move_file", {}).get("func", lambda f, fol: "Tool not registered")(filename, folder)
             else:
                 return "Please specify: move <filename> to <folder>"
         if self.llm:
             try:
-                meta = load_metadata()
-                ws = f"[FOLDERS]: {list(meta['folders'].keys())}\n[FILES]: {list(meta['files'].keys())}"
-                response = self.llm.chat.completions.create(
-                    model="drive_superagent",
-                    messages=[
-                        {"role": "system", "content": "Workspace structure:\n" + ws},
-                        {"role": "user", "content": query}
-                    ],
-                    max_tokens=500
-                )
+                with metrics.tool("chat"):
+                    response = self.llm.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=self._workspace_messages(query),
+                        max_tokens=500
+                    )
                 return response.choices[0].message.content
             except Exception as e:
                 return f"LLM call failed: {str(e)}"
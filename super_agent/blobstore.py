@@ -0,0 +1,99 @@
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=32)
+
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+class BlobStore:
+    """Content-addressed file bytes: one blob per BLAKE2b digest, fanned out as <root>/ab/cdef...
+
+    This is the local-disk storage backend; volumes.VolumeBlobStore implements the same
+    calls (put, exists, open, read_range, local_path, delete) over a Databricks Volume.
+    """
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest):
+        return self.root / digest[:2] / digest[2:]
+
+    def exists(self, digest):
+        return self.path_for(digest).exists()
+
+    def _hash_stream(self, stream):
+        hasher, size = new_hasher(), 0
+        for chunk in iter_chunks(stream, self.chunk_size):
+            hasher.update(chunk)
+            size += len(chunk)
+        return hasher.hexdigest(), size
+
+    def _write_stream(self, stream):
+        hasher, size = new_hasher(), 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter_chunks(stream, self.chunk_size):
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return hasher.hexdigest(), size, tmp
+
+    def _commit(self, tmp, digest):
+        path = self.path_for(digest)
+        if path.exists():
+            os.unlink(tmp)
+            return path, False
+        path.parent.mkdir(exist_ok=True)
+        os.replace(tmp, path)
+        return path, True
+
+    def put(self, stream):
+        """Store a binary stream; returns (digest, size, path, written)."""
+        if stream.seekable():
+            # Hash first so an already-stored blob costs no disk write at all.
+            start = stream.tell()
+            digest, size = self._hash_stream(stream)
+            path = self.path_for(digest)
+            if path.exists():
+                return digest, size, path, False
+            stream.seek(start)
+        digest, size, tmp = self._write_stream(stream)
+        path, written = self._commit(tmp, digest)
+        return digest, size, path, written
+
+    def open(self, digest):
+        return open(self.path_for(digest), "rb")
+
+    def read_range(self, digest, offset, length):
+        with self.open(digest) as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def local_path(self, digest):
+        """A local file with the blob's bytes (for parsers that need a path)."""
+        path = self.path_for(digest)
+        if not path.exists():
+            raise FileNotFoundError(digest)
+        return path
+
+    def delete(self, digest):
+        try:
+            self.path_for(digest).unlink()
+        except FileNotFoundError:
+            pass
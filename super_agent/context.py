@@ -0,0 +1,114 @@
+import os
+import math
+from datetime import datetime
+
+from super_agent.search_index import tokenize
+from super_agent.summarize import estimate_tokens
+
+CONTEXT_TOKENS = int(os.environ.get("DRIVE_CONTEXT_TOKENS", 1500))
+CANDIDATES = 40
+SNIPPETS = 5
+SNIPPET_CHARS = 400
+SEMANTIC_WEIGHT = 1.0
+RECENCY_WEIGHT = 0.3
+RECENCY_HALF_LIFE_DAYS = 14
+
+# Identical for every question so the serving endpoint can cache the prompt prefix;
+# everything query-dependent goes in the workspace message after it.
+SYSTEM_PROMPT = (
+    "You are SuperAgent, the assistant of a Databricks Drive workspace used by field engineers.\n"
+    "The next message lists the folders and files most relevant to the question, with their folder, size, "
+    "modification date and, for some files, a snippet of their extracted text. It is a selection, not a full listing: "
+    "totals are given in its first line. Answer from this context; if it does not contain the answer, say so and "
+    "suggest a search, summarize or move command."
+)
+
+def recency(modified, now):
+    try:
+        age = (now - datetime.fromisoformat(modified)).total_seconds() / 86400
+    except (TypeError, ValueError):
+        return 0.0
+    return math.pow(0.5, max(age, 0.0) / RECENCY_HALF_LIFE_DAYS)
+
+def rank_files(file_hits, recent, now=None, semantic_hits=()):
+    """Merge keyword hits [(name, record, score)], semantic hits [(name, record, similarity)]
+    and recently modified files [(name, record)].
+
+    Keyword relevance is normalized to the best hit and recency decays with
+    RECENCY_HALF_LIFE_DAYS, so a relevant file always outranks one that is merely recent.
+    """
+    now = now or datetime.now()
+    best = max((score for _, _, score in file_hits), default=0.0) or 1.0
+    scores, records = {}, {}
+    for name, record, score in file_hits:
+        scores[name] = score / best
+        records[name] = record
+    for name, record, similarity in semantic_hits:
+        if similarity > 0:
+            scores[name] = scores.get(name, 0.0) + SEMANTIC_WEIGHT * similarity
+            records[name] = record
+    matched = set(scores)
+    for name, record in recent:
+        if name not in records:
+            scores[name] = 0.0
+            records[name] = record
+    ranked = [
+        (score + RECENCY_WEIGHT * recency(records[name].get("modified"), now), name, records[name], name in matched)
+        for name, score in scores.items()
+    ]
+    return sorted(ranked, key=lambda item: (-item[0], item[1]))
+
+def snippet(text, query, chars=SNIPPET_CHARS):
+    """A window of text around the first query term it contains (the start if none)."""
+    lower = text.lower()
+    positions = [lower.find(term) for term in tokenize(query)]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - chars // 4) if positions else 0
+    return " ".join(text[start:start + chars].split())
+
+def _format_size(size):
+    return f"{size / 1024:.1f} KB" if size and size >= 1024 else f"{size or 0} B"
+
+def build_context(query, folders, ranked_files, totals, get_text, budget_tokens=CONTEXT_TOKENS, passages=None):
+    """Workspace message for query, filled in rank order until budget_tokens is reached.
+
+    folders: [(name, parent, stats)] in rank order; ranked_files: output of rank_files;
+    totals: (num_folders, num_files); get_text(name, record) returns extracted text or "";
+    passages: {name: text} of semantically matching chunks, used instead of keyword snippets.
+    """
+    passages = passages or {}
+    lines = [f"[WORKSPACE] {totals[0]} folders, {totals[1]} files in total."]
+    used = estimate_tokens(lines[0])
+
+    def fits(line):
+        nonlocal used
+        cost = estimate_tokens(line)
+        if used + cost > budget_tokens:
+            return False
+        lines.append(line)
+        used += cost
+        return True
+
+    if folders and fits("[RELEVANT FOLDERS]"):
+        for name, parent, stats in folders:
+            line = f"- {name}" + (f" (in {parent})" if parent else "")
+            if stats:
+                line += f": {stats['files']} files, {stats['folders']} subfolders, {_format_size(stats['size'])} in total"
+            if not fits(line):
+                break
+    if ranked_files and fits("[RELEVANT FILES]"):
+        snippets = 0
+        for _, name, record, matched in ranked_files:
+            line = (f"- {name} (in {record.get('parent')}, {_format_size(record.get('size'))}, "
+                    f"modified {(record.get('modified') or '-')[:10]})")
+            if not fits(line):
+                break
+            if matched and snippets < SNIPPETS:
+                if name in passages:
+                    text = " ".join(passages[name].split())[:SNIPPET_CHARS]
+                else:
+                    text = snippet(get_text(name, record), query)
+                if text.strip():
+                    snippets += 1
+                    fits(f"  > {text}")
+    return "\n".join(lines)
@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import mimetypes
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from super_agent import metrics
+from super_agent.tables import is_table, convert_table
+
+TEXT_EXTENSIONS = (".txt", ".csv")
+EXTRACTABLE_EXTENSIONS = (".pdf", ".docx", ".xlsx", ".txt", ".csv")
+
+def can_extract(filename):
+    return filename.lower().endswith(EXTRACTABLE_EXTENSIONS)
+
+def _pdf_pages(path, max_pages=None):
+    pages = []
+    try:
+        import pdfplumber
+        with pdfplumber.open(str(path)) as pdf:
+            for page in pdf.pages[:max_pages]:
+                pages.append(page.extract_text() or "")
+    except Exception:
+        import PyPDF2
+        pages = []
+        with open(str(path), "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            for page in reader.pages[:max_pages]:
+                pages.append(page.extract_text() or "")
+    return pages
+
+def _docx_text(path):
+    import docx
+    return "\n".join(p.text for p in docx.Document(str(path)).paragraphs)
+
+def _xlsx_sheets(path, max_rows=None):
+    import openpyxl
+    wb = openpyxl.load_workbook(str(path), read_only=True, data_only=True)
+    sheets = []
+    try:
+        for ws in wb.worksheets:
+            lines = [f"# {ws.title}"]
+            for row in ws.iter_rows(max_row=max_rows, values_only=True):
+                cells = ["" if v is None else str(v) for v in row]
+                if any(cells):
+                    lines.append("\t".join(cells))
+            sheets.append("\n".join(lines))
+    finally:
+        wb.close()
+    return sheets
+
+def _join_pages(pages):
+    offsets, pos = [], 0
+    for page in pages:
+        offsets.append(pos)
+        pos += len(page) + 1
+    return {"text": "\n".join(pages), "pages": offsets}
+
+def extract_document(path, filename=None):
+    """Text of a PDF/DOCX/XLSX/TXT/CSV file plus the start offset of each page (sheet for XLSX).
+
+    The type comes from filename, since content-addressed blobs have no extension.
+    """
+    name = (filename or str(path)).lower()
+    mime, _ = mimetypes.guess_type(name)
+    if name.endswith(TEXT_EXTENSIONS) or (mime and mime.startswith("text/")):
+        return _join_pages([Path(path).read_text(encoding="utf-8", errors="replace")])
+    if name.endswith(".pdf"):
+        return _join_pages(_pdf_pages(path))
+    if name.endswith(".docx"):
+        return _join_pages([_docx_text(path)])
+    if name.endswith(".xlsx"):
+        return _join_pages(_xlsx_sheets(path))
+    return {"text": "", "pages": []}
+
+def extract_job(path, filename, table_dir=None):
+    """extract_document, plus the columnar copy of a tabular file when table_dir is given."""
+    doc = extract_document(path, filename)
+    if table_dir:
+        try:
+            convert_table(path, filename, table_dir)
+        except Exception:
+            pass  # Converted again on demand, which reports the error.
+    return doc
+
+def page_slice(doc, num_pages):
+    """Text of the first num_pages pages of an extracted document."""
+    pages = doc.get("pages") or []
+    if num_pages is None or len(pages) <= num_pages:
+        return doc["text"]
+    return doc["text"][:pages[num_pages]]
+
+class TextCache:
+    """Extracted text sidecars ({"text", "pages"} JSON) stored next to the blobs, keyed by content digest."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest):
+        return self.root / f"{digest}.json"
+
+    def get_document(self, digest):
+        try:
+            with open(self.path_for(digest), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get(self, digest):
+        doc = self.get_document(digest)
+        return doc["text"] if doc is not None else None
+
+    def put(self, digest, text, pages=None):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".text-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "pages": pages if pages is not None else [0]}, f)
+        os.replace(tmp, self.path_for(digest))
+
+    def delete(self, digest):
+        try:
+            self.path_for(digest).unlink()
+        except FileNotFoundError:
+            pass
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class ExtractionService:
+    """Runs extract_document in a process pool and writes the result to a TextCache sidecar.
+
+    With a TableCache, CSV/XLSX uploads are also converted to Parquet by the same job.
+
+    Jobs are keyed by content digest. A job that runs longer than `timeout` seconds is
+    marked failed and its worker pool is recycled so the stuck process is killed; other
+    jobs caught in the recycled pool are resubmitted once.
+    """
+
+    def __init__(self, cache, max_workers=None, timeout=120, poll_interval=0.5, tables=None):
+        self.cache = cache
+        self.tables = tables
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        # Re-entrant: a future that is already done runs its callback inside submit().
+        self._lock = threading.RLock()
+        self._pool = None
+        self._jobs = {}
+        self._active = {}
+        self._watchdog = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn, not fork: the Streamlit server process is multi-threaded. Spawned workers
+            # re-run the main script as __mp_main__, so its initialization sits under __main__.
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._watch, name="extraction-watchdog", daemon=True)
+            self._watchdog.start()
+        return self._pool
+
+    def submit(self, digest, path, filename, on_done=None):
+        with self._lock:
+            job = self._jobs.get(digest)
+            if job and job["status"] in (QUEUED, RUNNING):
+                if on_done:
+                    job["callbacks"].append(on_done)
+                return job
+            job = {
+                "status": QUEUED, "error": None, "path": str(path), "filename": filename, "attempts": 0,
+                "submitted": time.time(), "started": None, "finished": None,
+                "callbacks": [on_done] if on_done else [], "done": threading.Event(),
+            }
+            self._jobs[digest] = job
+            if self.cache.path_for(digest).exists():
+                job["status"] = DONE
+                self._complete(digest, job)
+            else:
+                self._active[digest] = job
+                self._start(digest, job)
+            return job
+
+    def _start(self, digest, job):
+        job["attempts"] += 1
+        job["started"] = None
+        table_dir = None
+        if self.tables is not None and is_table(job["filename"]) and not self.tables.exists(digest):
+            table_dir = str(self.tables.dir_for(digest))
+        try:
+            future = self._get_pool().submit(extract_job, job["path"], job["filename"], table_dir)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start over with a fresh pool.
+            self._pool = None
+            future = self._get_pool().submit(extract_job, job["path"], job["filename"], table_dir)
+        job["pool"] = self._pool
+        job["future"] = future
+        future.add_done_callback(lambda f: self._finish(digest, job, f))
+
+    def _finish(self, digest, job, future):
+        with self._lock:
+            if job["status"] == FAILED or job.get("future") is not future:
+                return
+            try:
+                doc = future.result()
+            except BrokenProcessPool:
+                if job["attempts"] < 2:
+                    self._start(digest, job)
+                    return
+                job.update(status=FAILED, error="worker pool was recycled")
+            except Exception as e:
+                job.update(status=FAILED, error=str(e) or type(e).__name__)
+            else:
+                try:
+                    self.cache.put(digest, doc["text"], doc["pages"])
+                    job["status"] = DONE
+                except OSError as e:
+                    job.update(status=FAILED, error=str(e))
+            self._complete(digest, job)
+
+    def _complete(self, digest, job):
+        self._active.pop(digest, None)
+        job["finished"] = time.time()
+        if job["attempts"]:
+            metrics.observe("extract_job", job["finished"] - job["submitted"], status=job["status"])
+        job["done"].set()
+        callbacks, job["callbacks"] = job["callbacks"], []
+        for callback in callbacks:
+            threading.Thread(target=callback, args=(digest, job), daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            stale = set()
+            with self._lock:
+                now = time.time()
+                for digest, job in list(self._active.items()):
+                    if job["future"].running() and job["started"] is None:
+                        job.update(status=RUNNING, started=now)
+                    if job["started"] is not None and now - job["started"] > self.timeout:
+                        job.update(status=FAILED, error=f"timed out after {self.timeout}s")
+                        self._complete(digest, job)
+                        stale.add(job["pool"])
+                if self._pool in stale:
+                    self._pool = None
+            for pool in stale:
+                for proc in list((getattr(pool, "_processes", None) or {}).values()):
+                    proc.terminate()
+                pool.shutdown(wait=False, cancel_futures=False)
+
+    def status(self, digest):
+        with self._lock:
+            job = self._jobs.get(digest)
+            if job:
+                return {k: job.get(k) for k in ("status", "error", "submitted", "started", "finished")}
+        if self.cache.path_for(digest).exists():
+            return {"status": DONE, "error": None, "submitted": None, "started": None, "finished": None}
+        return None
+
+    def wait(self, digest, timeout=None):
+        with self._lock:
+            job = self._jobs.get(digest)
+        if job is not None:
+            job["done"].wait(self.timeout + 5 if timeout is None else timeout)
+        return self.cache.get_document(digest)
+
+    def forget(self, digest):
+        with self._lock:
+            job = self._jobs.get(digest)
+            if job and job["status"] not in (QUEUED, RUNNING):
+                del self._jobs[digest]
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
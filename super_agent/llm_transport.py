@@ -0,0 +1,249 @@
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import httpx
+import openai
+from openai import OpenAI
+
+from super_agent import metrics
+
+DEADLINE = 60.0
+CONNECT_TIMEOUT = 5.0
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+MAX_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 60.0
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitOpenError(openai.OpenAIError):
+    """Raised without calling the endpoint while the circuit breaker is open."""
+
+class DeadlineExceededError(openai.OpenAIError):
+    """Raised when a call's deadline passes before any attempt succeeded."""
+
+def is_retryable(error):
+    """Rate limits, server errors, timeouts and connection failures are worth another attempt."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)):
+        return False
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError))
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _discard(future):
+    """Close the losing response of a hedged pair so its connection goes back to the pool."""
+    if future.exception() is None and hasattr(future.result(), "close"):
+        future.result().close()
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive endpoint failures and fails fast for `reset_timeout` seconds.
+
+    After that a single probe call is let through (half-open): its success closes the
+    circuit, its failure opens it again.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                wait_for = self._opened_at + self.reset_timeout - time.monotonic()
+                if wait_for > 0:
+                    raise CircuitOpenError(f"LLM endpoint is failing; not retrying for another {wait_for:.1f}s")
+                self.state = HALF_OPEN
+            elif self.state == HALF_OPEN and self._probing:
+                raise CircuitOpenError("LLM endpoint is failing; a probe request is in flight")
+            if self.state == HALF_OPEN:
+                self._probing = True
+
+    def success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self.state == HALF_OPEN or self.consecutive >= self.failures:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class LLMTransport:
+    """OpenAI-compatible client (chat.completions.create, embeddings.create) shared by every session.
+
+    Calls go over a keep-alive connection pool and are bounded by a deadline (`timeout`
+    keyword per call, `deadline` by default) covering all attempts. 429/5xx responses,
+    timeouts and connection errors are retried with full-jitter exponential backoff,
+    honouring Retry-After; a circuit breaker fails fast while the endpoint keeps failing.
+    With `hedge_after`, a call that has not answered after that many seconds is sent a
+    second time and the first answer wins. Identical non-streaming calls that are in flight
+    at the same time share one request.
+    """
+
+    def __init__(self, api_key=None, base_url=None, deadline=DEADLINE, connect_timeout=CONNECT_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP,
+                 max_connections=MAX_CONNECTIONS, hedge_after=None, breaker=None, client=None):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY),
+                timeout=httpx.Timeout(deadline, connect=connect_timeout),
+            )
+            # Retries and timeouts are handled here, across attempts, not by the SDK.
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=http_client)
+        self.client = client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: self._request("chat", self.client.chat.completions.create, kwargs)))
+        self.embeddings = SimpleNamespace(
+            create=lambda **kwargs: self._request("embeddings", self.client.embeddings.create, kwargs))
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "coalesced": 0, "failures": 0}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "breaker": self.breaker.state, "breaker_opened": self.breaker.opened}
+
+    def _request(self, endpoint, create, kwargs):
+        tool = metrics.current_tool() or "-"
+        with metrics.span("llm_request", endpoint=endpoint, tool=tool):
+            result = self._coalesced(endpoint, create, kwargs)
+        usage = getattr(result, "usage", None)
+        if usage is not None:
+            metrics.inc("llm_tokens", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt", tool=tool)
+            metrics.inc("llm_tokens", getattr(usage, "completion_tokens", 0) or 0, kind="completion", tool=tool)
+        return result
+
+    def _coalesced(self, endpoint, create, kwargs):
+        self._count("calls")
+        deadline = kwargs.pop("timeout", None) or self.deadline
+        if kwargs.get("stream"):
+            # Timed up to the response headers; the tokens arrive while the caller iterates.
+            return self._call(create, kwargs, deadline)
+        key = (endpoint, json.dumps(kwargs, sort_keys=True, default=str))
+        with self._lock:
+            shared = self._inflight.get(key)
+            if shared is None:
+                shared = self._inflight[key] = Future()
+                leader = True
+            else:
+                self.counters["coalesced"] += 1
+                leader = False
+        if not leader:
+            try:
+                return shared.result(timeout=deadline)
+            except TimeoutError:
+                raise DeadlineExceededError(f"no LLM response within {deadline:.0f}s") from None
+        try:
+            result = self._call(create, kwargs, deadline)
+        except BaseException as e:
+            shared.set_exception(e)
+            raise
+        else:
+            shared.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _call(self, create, kwargs, deadline):
+        end = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"no LLM response within {deadline:.0f}s")
+            self.breaker.before_call()
+            self._count("attempts")
+            try:
+                result = self._attempt(create, kwargs, remaining)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Not an outage (e.g. a 400): the endpoint is up, the request is wrong.
+                    self.breaker.success()
+                    raise
+                self._count("failures")
+                self.breaker.failure()
+                attempt += 1
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+                delay = max(delay, _retry_after(e) or 0.0)
+                if attempt > self.max_retries or time.monotonic() + delay >= end:
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            self.breaker.success()
+            return result
+
+    def _attempt(self, create, kwargs, timeout):
+        if not self.hedge_after or timeout <= self.hedge_after:
+            return create(**kwargs, timeout=timeout)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(thread_name_prefix="llm-hedge")
+            pool = self._pool
+        started = time.monotonic()
+        first = pool.submit(create, **kwargs, timeout=timeout)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        self._count("hedges")
+        second = pool.submit(create, **kwargs, timeout=timeout - (time.monotonic() - started))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.add_done_callback(_discard)
+                    for other in done - {future}:
+                        _discard(other)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+        self.client.close()
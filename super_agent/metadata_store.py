@@ -0,0 +1,975 @@
+import os
+import json
+import heapq
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from contextlib import contextmanager
+
+from super_agent import metrics
+
+ROOT_FOLDER = "My Drive"
+FILE_COLUMNS = ("path", "size", "created", "modified")
+
+def empty_metadata():
+    return {"folders": {ROOT_FOLDER: {"parent": None, "children": [], "stats": empty_stats()}}, "files": {}}
+
+def empty_stats():
+    return {"size": 0, "files": 0, "folders": 0, "types": {}}
+
+# --- Dict-level operations on the classic metadata.json layout ---
+
+def _remove_child(meta, folder, name):
+    children = meta["folders"].get(folder, {}).get("children", [])
+    if name in children:
+        children.remove(name)
+
+def _ref_blob(meta, record, delta):
+    digest = record.get("digest")
+    if not digest:
+        return
+    blobs = meta.setdefault("blobs", {})
+    entry = blobs.setdefault(digest, {"size": record.get("size"), "refs": 0})
+    entry["refs"] += delta
+    if entry["refs"] <= 0:
+        del blobs[digest]
+
+# Folder aggregates: every folder record carries "stats" for its whole subtree (recursive byte
+# size, file and folder counts, files per extension); each change is applied to every ancestor.
+
+def _file_delta(name, record):
+    return {"size": record.get("size") or 0, "files": 1, "folders": 0, "types": {file_extension(name): 1}}
+
+def _folder_delta(stats):
+    return {"size": stats["size"], "files": stats["files"], "folders": stats["folders"] + 1,
+            "types": dict(stats["types"])}
+
+def _ancestors(meta, folder):
+    seen = set()
+    while folder is not None and folder in meta["folders"] and folder not in seen:
+        seen.add(folder)
+        yield folder
+        folder = meta["folders"][folder]["parent"]
+
+def _bump_stats(meta, folder, delta, sign=1):
+    for name in _ancestors(meta, folder):
+        stats = meta["folders"][name]["stats"]
+        for key in ("size", "files", "folders"):
+            stats[key] += sign * delta[key]
+        types = stats["types"]
+        for ext, count in delta["types"].items():
+            types[ext] = types.get(ext, 0) + sign * count
+            if types[ext] <= 0:
+                del types[ext]
+
+def meta_rebuild_stats(meta):
+    for folder in meta["folders"].values():
+        folder["stats"] = empty_stats()
+    for name, folder in meta["folders"].items():
+        _bump_stats(meta, folder["parent"], {"size": 0, "files": 0, "folders": 1, "types": {}})
+    for name, record in meta["files"].items():
+        _bump_stats(meta, record.get("parent"), _file_delta(name, record))
+    return meta
+
+def meta_folder_stats(meta, folder):
+    record = meta["folders"].get(folder)
+    if record is None:
+        return None
+    stats = record["stats"]
+    return dict(stats, types=dict(stats["types"]))
+
+def meta_blob_refs(meta, digest):
+    return meta.get("blobs", {}).get(digest, {}).get("refs", 0)
+
+def meta_add_folder(meta, name, parent):
+    siblings = meta["folders"][parent]["children"]
+    meta["folders"][name] = {"parent": parent, "children": [], "stats": empty_stats()}
+    siblings.append(name)
+    _bump_stats(meta, parent, {"size": 0, "files": 0, "folders": 1, "types": {}})
+
+def meta_put_file(meta, name, record):
+    siblings = meta["folders"][record["parent"]]["children"]
+    old = meta["files"].get(name)
+    if old and old["parent"] != record["parent"]:
+        _remove_child(meta, old["parent"], name)
+    meta["files"][name] = record
+    if not old or old["parent"] != record["parent"]:
+        siblings.append(name)
+    _ref_blob(meta, record, 1)
+    _bump_stats(meta, record["parent"], _file_delta(name, record))
+    if old:
+        _ref_blob(meta, old, -1)
+        _bump_stats(meta, old["parent"], _file_delta(name, old), -1)
+    return old
+
+def meta_move_file(meta, name, folder):
+    record = meta["files"][name]
+    siblings = meta["folders"][folder]["children"]
+    _remove_child(meta, record["parent"], name)
+    siblings.append(name)
+    _bump_stats(meta, record["parent"], _file_delta(name, record), -1)
+    _bump_stats(meta, folder, _file_delta(name, record))
+    record["parent"] = folder
+
+def meta_rename_file(meta, name, new_name):
+    record = meta["files"].pop(name)
+    meta["files"][new_name] = record
+    siblings = meta["folders"][record["parent"]]["children"]
+    siblings[siblings.index(name)] = new_name
+    if file_extension(name) != file_extension(new_name):
+        _bump_stats(meta, record["parent"], _file_delta(name, record), -1)
+        _bump_stats(meta, record["parent"], _file_delta(new_name, record))
+
+def meta_rename_folder(meta, name, new_name):
+    folder = meta["folders"].pop(name)
+    meta["folders"][new_name] = folder
+    if folder["parent"] is not None:
+        siblings = meta["folders"][folder["parent"]]["children"]
+        siblings[siblings.index(name)] = new_name
+    for child in folder["children"]:
+        for kind in ("files", "folders"):
+            record = meta[kind].get(child)
+            if record is not None and record["parent"] == name:
+                record["parent"] = new_name
+
+def meta_remove_file(meta, name):
+    record = meta["files"].pop(name)
+    _remove_child(meta, record["parent"], name)
+    _ref_blob(meta, record, -1)
+    _bump_stats(meta, record["parent"], _file_delta(name, record), -1)
+    return record
+
+def meta_subtree(meta, folder):
+    if folder not in meta["folders"]:
+        raise KeyError(folder)
+    folders, files = [folder], []
+    for name in folders:
+        for child in meta["folders"][name]["children"]:
+            if child in meta["files"] and meta["files"][child]["parent"] == name:
+                files.append((child, meta["files"][child]))
+            elif child in meta["folders"] and child != folder:
+                folders.append(child)
+    return folders, files
+
+def meta_subtree_size(meta, folder):
+    stats = meta["folders"][folder]["stats"]
+    return {"size": stats["size"], "files": stats["files"], "folders": stats["folders"]}
+
+def meta_remove_subtree(meta, folder):
+    folders, files = meta_subtree(meta, folder)
+    parent = meta["folders"][folder]["parent"]
+    _remove_child(meta, parent, folder)
+    _bump_stats(meta, parent, _folder_delta(meta["folders"][folder]["stats"]), -1)
+    for name, record in files:
+        del meta["files"][name]
+        _ref_blob(meta, record, -1)
+    for name in folders:
+        del meta["folders"][name]
+    return files
+
+def meta_move_folder(meta, name, parent):
+    if name not in meta["folders"]:
+        raise KeyError(name)
+    ancestor = parent
+    while ancestor is not None:
+        if ancestor == name:
+            raise ValueError(f"Cannot move '{name}' into its own subtree")
+        ancestor = meta["folders"][ancestor]["parent"]
+    old_parent = meta["folders"][name]["parent"]
+    delta = _folder_delta(meta["folders"][name]["stats"])
+    _remove_child(meta, old_parent, name)
+    meta["folders"][parent]["children"].append(name)
+    _bump_stats(meta, old_parent, delta, -1)
+    _bump_stats(meta, parent, delta)
+    meta["folders"][name]["parent"] = parent
+
+def meta_list_children(meta, folder):
+    result = []
+    for name in meta["folders"].get(folder, {}).get("children", []):
+        if name in meta["files"]:
+            result.append(("file", name, meta["files"][name]))
+        elif name in meta["folders"]:
+            result.append(("folder", name, meta["folders"][name]))
+    return result
+
+def meta_recent_files(meta, limit):
+    return heapq.nlargest(limit, meta["files"].items(), key=lambda item: item[1].get("modified") or "")
+
+SORT_KEYS = ("name", "size", "date", "type")
+_SORT_FIELDS = {"size": "size", "date": "modified"}
+_KIND_ORDER = {"folder": 0, "file": 1}
+
+def file_extension(name):
+    return "." + name.rsplit(".", 1)[1].lower() if "." in name else ""
+
+def name_matches(name, query):
+    """Server-side listing filter: every whitespace-separated term is a substring of the name."""
+    lower = name.lower()
+    return all(term in lower for term in (query or "").lower().split())
+
+def _sort_value(kind, name, record, sort):
+    # Folders are always ordered by name; files by the sort key, then name.
+    if kind == "folder" or sort == "name":
+        return None
+    if sort == "type":
+        return file_extension(name)
+    return record.get(_SORT_FIELDS[sort])
+
+def _order_key(kind, value, name):
+    return (value is not None, value if value is not None else 0, name)
+
+def meta_ordered_children(meta, folder, sort="name", descending=False, query=None, kind=None):
+    """Children of folder in listing order, folders first: [(kind, name, record, sort_value)]."""
+    groups = {"folder": [], "file": []}
+    for k, name, record in meta_list_children(meta, folder):
+        if (kind is None or k == kind) and name_matches(name, query):
+            groups[k].append((k, name, record, _sort_value(k, name, record, sort)))
+    ordered = []
+    for k in ("folder", "file"):
+        ordered += sorted(groups[k], key=lambda item: _order_key(item[0], item[3], item[1]), reverse=descending)
+    return ordered
+
+def page_of(ordered, offset=0, limit=50, cursor=None, descending=False):
+    """Slice an ordered listing by offset, or by cursor (the next_cursor of the previous page)."""
+    start = offset
+    if cursor is not None:
+        rank, key = _KIND_ORDER[cursor[0]], _order_key(*cursor)
+        start = len(ordered)
+        for i, (k, name, _, value) in enumerate(ordered):
+            item_key = _order_key(k, value, name)
+            if _KIND_ORDER[k] > rank or (_KIND_ORDER[k] == rank and (item_key < key if descending else item_key > key)):
+                start = i
+                break
+    items = ordered[start:start + limit]
+    next_cursor = None
+    if items and start + len(items) < len(ordered):
+        k, name, _, value = items[-1]
+        next_cursor = (k, value, name)
+    return [(k, name, record) for k, name, record, _ in items], len(ordered), next_cursor
+
+def meta_list_page(meta, folder, sort="name", descending=False, query=None, kind=None, offset=0, limit=50, cursor=None):
+    ordered = meta_ordered_children(meta, folder, sort, descending, query, kind)
+    return page_of(ordered, offset, limit, cursor, descending)
+
+class MetadataStore(ABC):
+    """Backend interface for drive metadata; every mutating call is one transaction."""
+
+    # Whole-file stores rewrite everything on each save, so callers should mutate a
+    # loaded copy and save once rather than calling the per-item operations.
+    whole_file = False
+
+    @abstractmethod
+    def load(self):
+        ...
+
+    @abstractmethod
+    def save(self, meta):
+        ...
+
+    @abstractmethod
+    def version(self):
+        ...
+
+    @abstractmethod
+    def get_file(self, name):
+        ...
+
+    @abstractmethod
+    def get_folder(self, name):
+        ...
+
+    @abstractmethod
+    def list_children(self, folder):
+        ...
+
+    @abstractmethod
+    def find_file_by_path(self, path):
+        ...
+
+    @abstractmethod
+    def add_folder(self, name, parent):
+        ...
+
+    @abstractmethod
+    def put_file(self, name, record):
+        ...
+
+    @abstractmethod
+    def move_file(self, name, folder):
+        ...
+
+    @abstractmethod
+    def remove_file(self, name):
+        ...
+
+    @abstractmethod
+    def rename_file(self, name, new_name):
+        ...
+
+    @abstractmethod
+    def rename_folder(self, name, new_name):
+        """Rename a folder in place; its contents and aggregates follow."""
+
+    @abstractmethod
+    def subtree(self, folder):
+        ...
+
+    @abstractmethod
+    def subtree_size(self, folder):
+        ...
+
+    @abstractmethod
+    def remove_subtree(self, folder):
+        ...
+
+    @abstractmethod
+    def move_folder(self, name, parent):
+        ...
+
+    @abstractmethod
+    def blob_refs(self, digest):
+        ...
+
+    @abstractmethod
+    def recent_files(self, limit):
+        ...
+
+    @abstractmethod
+    def folder_stats(self, folder):
+        """Aggregates of folder's whole subtree: {"size", "files", "folders", "types"}, or None."""
+
+    @abstractmethod
+    def list_page(self, folder, sort="name", descending=False, query=None, kind=None, offset=0, limit=50, cursor=None):
+        """One page of folder's children, folders first, as (items [(kind, name, record)], total, next_cursor).
+
+        sort is one of SORT_KEYS; query keeps names containing every term; a cursor
+        (the previous page's next_cursor) takes precedence over offset.
+        """
+
+    @contextmanager
+    def batch(self):
+        yield self
+
+    def close(self):
+        pass
+
+class JsonMetadataStore(MetadataStore):
+    """The original whole-file metadata.json layout; each operation rewrites the file."""
+
+    whole_file = True
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+
+    def load(self):
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                meta = json.load(f)
+                metrics.inc("io_bytes", f.tell(), op="metadata_load")
+            if any("stats" not in folder for folder in meta["folders"].values()):
+                # Written before folder aggregates existed.
+                meta_rebuild_stats(meta)
+            return meta
+        return empty_metadata()
+
+    def save(self, meta):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+            metrics.inc("io_bytes", f.tell(), op="metadata_save")
+        os.replace(tmp, self.path)
+
+    def version(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    @contextmanager
+    def _edit(self):
+        with self._lock:
+            meta = self.load()
+            yield meta
+            self.save(meta)
+
+    def get_file(self, name):
+        return self.load()["files"].get(name)
+
+    def get_folder(self, name):
+        return self.load()["folders"].get(name)
+
+    def list_children(self, folder):
+        return meta_list_children(self.load(), folder)
+
+    def find_file_by_path(self, path):
+        for name, record in self.load()["files"].items():
+            if record.get("path") == str(path):
+                return name, record
+        return None
+
+    def add_folder(self, name, parent):
+        with self._edit() as meta:
+            meta_add_folder(meta, name, parent)
+
+    def put_file(self, name, record):
+        with self._edit() as meta:
+            return meta_put_file(meta, name, dict(record))
+
+    def move_file(self, name, folder):
+        with self._edit() as meta:
+            meta_move_file(meta, name, folder)
+
+    def remove_file(self, name):
+        with self._edit() as meta:
+            return meta_remove_file(meta, name)
+
+    def rename_file(self, name, new_name):
+        with self._edit() as meta:
+            meta_rename_file(meta, name, new_name)
+
+    def rename_folder(self, name, new_name):
+        with self._edit() as meta:
+            meta_rename_folder(meta, name, new_name)
+
+    def subtree(self, folder):
+        return meta_subtree(self.load(), folder)
+
+    def subtree_size(self, folder):
+        return meta_subtree_size(self.load(), folder)
+
+    def remove_subtree(self, folder):
+        with self._edit() as meta:
+            return meta_remove_subtree(meta, folder)
+
+    def move_folder(self, name, parent):
+        with self._edit() as meta:
+            meta_move_folder(meta, name, parent)
+
+    def blob_refs(self, digest):
+        return meta_blob_refs(self.load(), digest)
+
+    def recent_files(self, limit):
+        return meta_recent_files(self.load(), limit)
+
+    def folder_stats(self, folder):
+        return meta_folder_stats(self.load(), folder)
+
+    def list_page(self, folder, sort="name", descending=False, query=None, kind=None, offset=0, limit=50, cursor=None):
+        return meta_list_page(self.load(), folder, sort, descending, query, kind, offset, limit, cursor)
+
+# Sort expressions for list_page; "type" is the lower-cased extension, as file_extension().
+_SORT_SQL = {
+    "size": "size",
+    "date": "modified",
+    "type": "CASE WHEN instr(name, '.') = 0 THEN '' "
+            "ELSE lower(substr(name, length(rtrim(name, replace(name, '.', ''))))) END",
+}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS nodes (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    parent TEXT,
+    seq INTEGER NOT NULL,
+    path TEXT,
+    size INTEGER,
+    created TEXT,
+    modified TEXT,
+    extra TEXT,
+    apath TEXT,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS nodes_by_parent ON nodes(parent, seq);
+CREATE INDEX IF NOT EXISTS nodes_by_path ON nodes(path);
+CREATE INDEX IF NOT EXISTS nodes_by_modified ON nodes(kind, modified);
+CREATE INDEX IF NOT EXISTS nodes_by_parent_name ON nodes(parent, kind, name);
+CREATE INDEX IF NOT EXISTS nodes_by_parent_size ON nodes(parent, kind, size, name);
+CREATE INDEX IF NOT EXISTS nodes_by_parent_modified ON nodes(parent, kind, modified, name);
+CREATE INDEX IF NOT EXISTS nodes_by_parent_type ON nodes(parent, kind, {_SORT_SQL["type"]}, name);
+CREATE TABLE IF NOT EXISTS counters (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters VALUES (0, 0, 0);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER,
+    refs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS folder_stats (
+    folder TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    folders INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS folder_types (
+    folder TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (folder, ext)
+);
+"""
+
+# Materialized ancestor path: a folder's apath is its parent's apath + name + _SEP, a file's
+# apath is its folder's apath, so a whole subtree is one index range scan.
+_SEP = "\x1f"
+_NODE_COLUMNS = "kind, name, parent, seq, path, size, created, modified, extra, apath"
+_INSERT_NODE = f"INSERT OR REPLACE INTO nodes ({_NODE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+def _like_term(term):
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _subtree_range(apath):
+    return apath, apath[:-1] + chr(ord(_SEP) + 1)
+
+def _folder_row(name, parent, seq, apath):
+    return ("folder", name, parent, seq, None, None, None, None, None, apath)
+
+def _file_row(name, record, seq, apath):
+    extra = {k: v for k, v in record.items() if k not in FILE_COLUMNS and k != "parent"}
+    return (
+        "file", name, record["parent"], seq,
+        record.get("path"), record.get("size"), record.get("created"), record.get("modified"),
+        json.dumps(extra) if extra else None, apath,
+    )
+
+def _ref_blob_row(db, record, delta):
+    digest = record.get("digest")
+    if not digest:
+        return
+    db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, 0)", (digest, record.get("size")))
+    db.execute("UPDATE blobs SET refs = refs + ? WHERE digest = ?", (delta, digest))
+    db.execute("DELETE FROM blobs WHERE digest = ? AND refs <= 0", (digest,))
+
+def _ancestor_names(apath):
+    return apath.split(_SEP)[:-1] if apath else []
+
+def _bump_stats_rows(db, ancestors, delta, sign=1):
+    if not ancestors:
+        return
+    marks = ", ".join("?" * len(ancestors))
+    db.execute(f"UPDATE folder_stats SET size = size + ?, files = files + ?, folders = folders + ? WHERE folder IN ({marks})",
+               [sign * delta["size"], sign * delta["files"], sign * delta["folders"], *ancestors])
+    for ext, count in delta["types"].items():
+        db.executemany("INSERT INTO folder_types VALUES (?, ?, ?) "
+                       "ON CONFLICT (folder, ext) DO UPDATE SET count = count + excluded.count",
+                       [(folder, ext, sign * count) for folder in ancestors])
+    if sign < 0 and delta["types"]:
+        db.execute(f"DELETE FROM folder_types WHERE count <= 0 AND folder IN ({marks})", ancestors)
+
+def _file_record(row):
+    record = {"path": row["path"], "size": row["size"], "created": row["created"],
+              "modified": row["modified"], "parent": row["parent"]}
+    if row["extra"]:
+        record.update(json.loads(row["extra"]))
+    return record
+
+class SqliteMetadataStore(MetadataStore):
+    """SQLite (WAL) backend with indexed lookups by name, parent folder, storage path and subtree."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        db = self._db()
+        db.executescript(_SCHEMA)
+        if "apath" not in [row[1] for row in db.execute("PRAGMA table_info(nodes)")]:
+            db.execute("ALTER TABLE nodes ADD COLUMN apath TEXT")
+            self.save(self.load())
+        db.execute("CREATE INDEX IF NOT EXISTS nodes_by_apath ON nodes(apath)")
+        if not db.execute("SELECT 1 FROM nodes WHERE kind = 'folder' AND name = ?", (ROOT_FOLDER,)).fetchone():
+            with self._tx() as tx:
+                tx.execute(_INSERT_NODE, _folder_row(ROOT_FOLDER, None, self._next_seq(tx), ROOT_FOLDER + _SEP))
+                tx.execute("INSERT OR REPLACE INTO folder_stats VALUES (?, 0, 0, 0)", (ROOT_FOLDER,))
+        folders = db.execute("SELECT COUNT(*) FROM nodes WHERE kind = 'folder'").fetchone()[0]
+        if db.execute("SELECT COUNT(*) FROM folder_stats").fetchone()[0] != folders:
+            # Created before folder aggregates existed.
+            with self._tx() as tx:
+                self._rebuild_stats(tx)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), isolation_level=None, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _tx(self):
+        db = self._db()
+        if getattr(self._local, "depth", 0):
+            # Joined an open batch: the outermost transaction commits or rolls back.
+            self._local.depth += 1
+            try:
+                yield db
+            finally:
+                self._local.depth -= 1
+            return
+        db.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield db
+            db.execute("UPDATE counters SET version = version + 1 WHERE id = 0")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    @contextmanager
+    def batch(self):
+        with self._tx():
+            yield self
+
+    def _rebuild_stats(self, db):
+        meta = {"folders": {}, "files": {}}
+        for row in db.execute("SELECT kind, name, parent, size FROM nodes"):
+            if row["kind"] == "folder":
+                meta["folders"][row["name"]] = {"parent": row["parent"]}
+            else:
+                meta["files"][row["name"]] = {"parent": row["parent"], "size": row["size"]}
+        meta_rebuild_stats(meta)
+        db.execute("DELETE FROM folder_stats")
+        db.execute("DELETE FROM folder_types")
+        db.executemany("INSERT INTO folder_stats VALUES (?, ?, ?, ?)", [
+            (name, f["stats"]["size"], f["stats"]["files"], f["stats"]["folders"]) for name, f in meta["folders"].items()
+        ])
+        db.executemany("INSERT INTO folder_types VALUES (?, ?, ?)", [
+            (name, ext, count) for name, f in meta["folders"].items() for ext, count in f["stats"]["types"].items()
+        ])
+
+    def _stats(self, db, folder):
+        row = db.execute("SELECT size, files, folders FROM folder_stats WHERE folder = ?", (folder,)).fetchone()
+        if row is None:
+            return None
+        types = dict(db.execute("SELECT ext, count FROM folder_types WHERE folder = ?", (folder,)).fetchall())
+        return {"size": row["size"], "files": row["files"], "folders": row["folders"], "types": types}
+
+    def folder_stats(self, folder):
+        return self._stats(self._db(), folder)
+
+    def _next_seq(self, db):
+        db.execute("UPDATE counters SET seq = seq + 1 WHERE id = 0")
+        return db.execute("SELECT seq FROM counters WHERE id = 0").fetchone()[0]
+
+    def load(self):
+        meta = {"folders": {}, "files": {}, "blobs": {}}
+        db = self._db()
+        rows = db.execute("SELECT * FROM nodes ORDER BY seq").fetchall()
+        for row in db.execute("SELECT * FROM blobs"):
+            meta["blobs"][row["digest"]] = {"size": row["size"], "refs": row["refs"]}
+        stats = {row["folder"]: {"size": row["size"], "files": row["files"], "folders": row["folders"], "types": {}}
+                 for row in db.execute("SELECT * FROM folder_stats")}
+        for row in db.execute("SELECT * FROM folder_types"):
+            if row["folder"] in stats:
+                stats[row["folder"]]["types"][row["ext"]] = row["count"]
+        for row in rows:
+            if row["kind"] == "folder":
+                meta["folders"][row["name"]] = {"parent": row["parent"], "children": [],
+                                                "stats": stats.get(row["name"]) or empty_stats()}
+            else:
+                meta["files"][row["name"]] = _file_record(row)
+        for row in rows:
+            parent = meta["folders"].get(row["parent"])
+            if parent is not None:
+                parent["children"].append(row["name"])
+        return meta
+
+    def save(self, meta):
+        folders, files = meta["folders"], meta["files"]
+        rows, apaths = [], {}
+        # Children order is the seq order within a parent, so number nodes by walking
+        # each children list breadth-first from the roots.
+        queue = [name for name, folder in folders.items() if folder.get("parent") not in folders]
+        for name in queue:
+            apaths[name] = name + _SEP
+            rows.append(_folder_row(name, None, len(rows) + 1, apaths[name]))
+        placed = set()
+        for folder in queue:
+            for child in folders[folder].get("children", []):
+                if child in files and child not in placed:
+                    placed.add(child)
+                    rows.append(_file_row(child, dict(files[child], parent=folder), len(rows) + 1, apaths[folder]))
+                elif child in folders and child not in apaths:
+                    apaths[child] = apaths[folder] + child + _SEP
+                    rows.append(_folder_row(child, folder, len(rows) + 1, apaths[child]))
+                    queue.append(child)
+        for name, folder in folders.items():
+            if name not in apaths:
+                rows.append(_folder_row(name, folder.get("parent"), len(rows) + 1, None))
+        for name, record in files.items():
+            if name not in placed:
+                rows.append(_file_row(name, record, len(rows) + 1, apaths.get(record.get("parent"))))
+        # Reference counts are derived from the files themselves rather than trusted from the input.
+        derived = {"blobs": {}}
+        for record in files.values():
+            _ref_blob(derived, record, 1)
+        with self._tx() as db:
+            db.execute("DELETE FROM nodes")
+            db.executemany(_INSERT_NODE, rows)
+            db.execute("DELETE FROM blobs")
+            db.executemany("INSERT INTO blobs VALUES (?, ?, ?)",
+                           [(d, b["size"], b["refs"]) for d, b in derived["blobs"].items()])
+            db.execute("UPDATE counters SET seq = ? WHERE id = 0", (len(rows),))
+            self._rebuild_stats(db)
+
+    def version(self):
+        return self._db().execute("SELECT version FROM counters WHERE id = 0").fetchone()[0]
+
+    def get_file(self, name):
+        row = self._db().execute("SELECT * FROM nodes WHERE kind = 'file' AND name = ?", (name,)).fetchone()
+        return _file_record(row) if row else None
+
+    def get_folder(self, name):
+        db = self._db()
+        row = db.execute("SELECT parent FROM nodes WHERE kind = 'folder' AND name = ?", (name,)).fetchone()
+        if not row:
+            return None
+        children = [r[0] for r in db.execute("SELECT name FROM nodes WHERE parent = ? ORDER BY seq", (name,))]
+        return {"parent": row["parent"], "children": children}
+
+    def list_children(self, folder):
+        result = []
+        for row in self._db().execute("SELECT * FROM nodes WHERE parent = ? ORDER BY seq", (folder,)):
+            if row["kind"] == "file":
+                result.append(("file", row["name"], _file_record(row)))
+            else:
+                result.append(("folder", row["name"], {"parent": row["parent"]}))
+        return result
+
+    def find_file_by_path(self, path):
+        row = self._db().execute("SELECT * FROM nodes WHERE kind = 'file' AND path = ?", (str(path),)).fetchone()
+        return (row["name"], _file_record(row)) if row else None
+
+    def _folder_apath(self, db, name):
+        row = db.execute("SELECT apath FROM nodes WHERE kind = 'folder' AND name = ?", (name,)).fetchone()
+        if not row:
+            raise KeyError(name)
+        return row["apath"]
+
+    def add_folder(self, name, parent):
+        with self._tx() as db:
+            parent_apath = self._folder_apath(db, parent)
+            db.execute(_INSERT_NODE, _folder_row(name, parent, self._next_seq(db), parent_apath + name + _SEP))
+            db.execute("INSERT OR REPLACE INTO folder_stats VALUES (?, 0, 0, 0)", (name,))
+            _bump_stats_rows(db, _ancestor_names(parent_apath), {"size": 0, "files": 0, "folders": 1, "types": {}})
+
+    def put_file(self, name, record):
+        with self._tx() as db:
+            apath = self._folder_apath(db, record["parent"])
+            row = db.execute("SELECT * FROM nodes WHERE kind = 'file' AND name = ?", (name,)).fetchone()
+            old = _file_record(row) if row else None
+            seq = row["seq"] if old and old["parent"] == record["parent"] else self._next_seq(db)
+            db.execute(_INSERT_NODE, _file_row(name, record, seq, apath))
+            _ref_blob_row(db, record, 1)
+            _bump_stats_rows(db, _ancestor_names(apath), _file_delta(name, record))
+            if old:
+                _ref_blob_row(db, old, -1)
+                _bump_stats_rows(db, _ancestor_names(row["apath"]), _file_delta(name, old), -1)
+            return old
+
+    def move_file(self, name, folder):
+        with self._tx() as db:
+            apath = self._folder_apath(db, folder)
+            row = db.execute("SELECT * FROM nodes WHERE kind = 'file' AND name = ?", (name,)).fetchone()
+            if not row:
+                raise KeyError(name)
+            db.execute("UPDATE nodes SET parent = ?, seq = ?, apath = ? WHERE kind = 'file' AND name = ?",
+                       (folder, self._next_seq(db), apath, name))
+            delta = _file_delta(name, _file_record(row))
+            _bump_stats_rows(db, _ancestor_names(row["apath"]), delta, -1)
+            _bump_stats_rows(db, _ancestor_names(apath), delta)
+
+    def remove_file(self, name):
+        with self._tx() as db:
+            row = db.execute("SELECT * FROM nodes WHERE kind = 'file' AND name = ?", (name,)).fetchone()
+            if not row:
+                raise KeyError(name)
+            db.execute("DELETE FROM nodes WHERE kind = 'file' AND name = ?", (name,))
+            record = _file_record(row)
+            _ref_blob_row(db, record, -1)
+            _bump_stats_rows(db, _ancestor_names(row["apath"]), _file_delta(name, record), -1)
+            return record
+
+    def rename_file(self, name, new_name):
+        with self._tx() as db:
+            row = db.execute("SELECT * FROM nodes WHERE kind = 'file' AND name = ?", (name,)).fetchone()
+            if not row:
+                raise KeyError(name)
+            db.execute("UPDATE nodes SET name = ? WHERE kind = 'file' AND name = ?", (new_name, name))
+            if file_extension(name) != file_extension(new_name):
+                record, ancestors = _file_record(row), _ancestor_names(row["apath"])
+                _bump_stats_rows(db, ancestors, _file_delta(name, record), -1)
+                _bump_stats_rows(db, ancestors, _file_delta(new_name, record))
+
+    def rename_folder(self, name, new_name):
+        with self._tx() as db:
+            old = self._folder_apath(db, name)
+            new = old[:-len(name) - 1] + new_name + _SEP
+            lo, hi = _subtree_range(old)
+            db.execute("UPDATE nodes SET apath = ? || substr(apath, ?) WHERE apath >= ? AND apath < ?",
+                       (new, len(old) + 1, lo, hi))
+            db.execute("UPDATE nodes SET name = ? WHERE kind = 'folder' AND name = ?", (new_name, name))
+            db.execute("UPDATE nodes SET parent = ? WHERE parent = ?", (new_name, name))
+            for table in ("folder_stats", "folder_types"):
+                db.execute(f"UPDATE {table} SET folder = ? WHERE folder = ?", (new_name, name))
+
+    def _subtree_rows(self, db, folder):
+        lo, hi = _subtree_range(self._folder_apath(db, folder))
+        return db.execute("SELECT * FROM nodes WHERE apath >= ? AND apath < ?", (lo, hi)).fetchall()
+
+    def subtree(self, folder):
+        folders, files = [], []
+        for row in self._subtree_rows(self._db(), folder):
+            if row["kind"] == "folder":
+                folders.append(row["name"])
+            else:
+                files.append((row["name"], _file_record(row)))
+        return folders, files
+
+    def subtree_size(self, folder):
+        row = self._db().execute("SELECT size, files, folders FROM folder_stats WHERE folder = ?", (folder,)).fetchone()
+        if row is None:
+            raise KeyError(folder)
+        return {"size": row["size"], "files": row["files"], "folders": row["folders"]}
+
+    def remove_subtree(self, folder):
+        with self._tx() as db:
+            apath = self._folder_apath(db, folder)
+            lo, hi = _subtree_range(apath)
+            files = [(row["name"], _file_record(row)) for row in db.execute(
+                "SELECT * FROM nodes WHERE kind = 'file' AND apath >= ? AND apath < ?", (lo, hi))]
+            _bump_stats_rows(db, _ancestor_names(apath)[:-1], _folder_delta(self._stats(db, folder)), -1)
+            for table in ("folder_stats", "folder_types"):
+                db.execute(f"DELETE FROM {table} WHERE folder IN "
+                           "(SELECT name FROM nodes WHERE kind = 'folder' AND apath >= ? AND apath < ?)", (lo, hi))
+            db.execute("DELETE FROM nodes WHERE apath >= ? AND apath < ?", (lo, hi))
+            for _, record in files:
+                _ref_blob_row(db, record, -1)
+            return files
+
+    def move_folder(self, name, parent):
+        with self._tx() as db:
+            old = self._folder_apath(db, name)
+            dest = self._folder_apath(db, parent)
+            if dest.startswith(old):
+                raise ValueError(f"Cannot move '{name}' into its own subtree")
+            new = dest + name + _SEP
+            delta = _folder_delta(self._stats(db, name))
+            _bump_stats_rows(db, _ancestor_names(old)[:-1], delta, -1)
+            _bump_stats_rows(db, _ancestor_names(dest), delta)
+            lo, hi = _subtree_range(old)
+            db.execute("UPDATE nodes SET apath = ? || substr(apath, ?) WHERE apath >= ? AND apath < ?",
+                       (new, len(old) + 1, lo, hi))
+            db.execute("UPDATE nodes SET parent = ?, seq = ? WHERE kind = 'folder' AND name = ?",
+                       (parent, self._next_seq(db), name))
+
+    def blob_refs(self, digest):
+        row = self._db().execute("SELECT refs FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else 0
+
+    def list_page(self, folder, sort="name", descending=False, query=None, kind=None, offset=0, limit=50, cursor=None):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort}'")
+        db = self._db()
+        direction = "DESC" if descending else "ASC"
+        items, total, skip = [], 0, offset
+        for k in ("folder", "file"):
+            if kind is not None and k != kind:
+                continue
+            column = _SORT_SQL.get(sort) if k == "file" else None
+            where, params = ["parent = ?", "kind = ?"], [folder, k]
+            for term in (query or "").lower().split():
+                where.append("name LIKE ? ESCAPE '\\'")
+                params.append(_like_term(term))
+            count = db.execute(f"SELECT COUNT(*) FROM nodes WHERE {' AND '.join(where)}", params).fetchone()[0]
+            total += count
+            if len(items) > limit:
+                continue
+            if cursor is not None:
+                if _KIND_ORDER[k] < _KIND_ORDER[cursor[0]]:
+                    continue
+                if k == cursor[0]:
+                    # Keyset condition: rows strictly after (value, name) in this direction; NULL sorts lowest.
+                    cmp = "<" if descending else ">"
+                    name_after = f"name {cmp} ?"
+                    if column is None:
+                        where.append(name_after)
+                        params.append(cursor[2])
+                    else:
+                        null_after = "(? IS NOT NULL AND {c} IS NULL)" if descending else "(? IS NULL AND {c} IS NOT NULL)"
+                        where.append(f"({column} {cmp} ? OR ({column} IS ? AND {name_after}) OR {null_after.format(c=column)})")
+                        params += [cursor[1], cursor[1], cursor[2], cursor[1]]
+                skip = 0
+            elif skip >= count:
+                skip -= count
+                continue
+            order = f"{column} {direction}, name {direction}" if column else f"name {direction}"
+            select = f"*, {column} AS sort_value" if column else "*, NULL AS sort_value"
+            rows = db.execute(
+                f"SELECT {select} FROM nodes WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit + 1 - len(items), skip],
+            ).fetchall()
+            skip = 0
+            items += [(k, row) for row in rows]
+        # One row past the page was fetched to tell whether another page follows.
+        more, items = len(items) > limit, items[:limit]
+        page = [(k, row["name"], _file_record(row) if k == "file" else {"parent": row["parent"]}) for k, row in items]
+        next_cursor = None
+        if more:
+            k, row = items[-1]
+            next_cursor = (k, row["sort_value"], row["name"])
+        return page, total, next_cursor
+
+    def recent_files(self, limit):
+        rows = self._db().execute(
+            "SELECT * FROM nodes WHERE kind = 'file' ORDER BY modified DESC LIMIT ?", (limit,)
+        )
+        return [(row["name"], _file_record(row)) for row in rows]
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+def import_json_metadata(json_path, store):
+    with open(json_path, "r") as f:
+        meta = json.load(f)
+    meta.setdefault("folders", {}).setdefault(ROOT_FOLDER, {"parent": None, "children": []})
+    meta.setdefault("files", {})
+    store.save(meta)
+    return len(meta["folders"]), len(meta["files"])
+
+def open_metadata_store(root, backend=None):
+    root = Path(root)
+    backend = (backend or os.environ.get("DRIVE_METADATA_BACKEND", "json")).lower()
+    if backend == "json":
+        return JsonMetadataStore(root / "metadata.json")
+    if backend == "sqlite":
+        db_path = root / "metadata.db"
+        fresh = not db_path.exists()
+        store = SqliteMetadataStore(db_path)
+        legacy = root / "metadata.json"
+        if fresh and legacy.exists():
+            import_json_metadata(legacy, store)
+        return store
+    raise ValueError(f"Unknown metadata backend: {backend}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a metadata.json into a SQLite metadata store.")
+    parser.add_argument("json_path")
+    parser.add_argument("db_path")
+    args = parser.parse_args()
+    n_folders, n_files = import_json_metadata(args.json_path, SqliteMetadataStore(args.db_path))
+    print(f"Imported {n_folders} folders and {n_files} files into {args.db_path}")
@@ -0,0 +1,248 @@
+import os
+import json
+import math
+import time
+import threading
+import functools
+import contextvars
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+# Recent durations kept per series; quantiles are computed over this window.
+SAMPLES = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "drive_"
+
+_enabled = os.environ.get("DRIVE_METRICS", "1") != "0"
+_lock = threading.Lock()
+_timings = {}
+_counters = {}
+_collectors = {}
+_tool = contextvars.ContextVar("drive_tool", default="")
+
+def enabled():
+    return _enabled
+
+def set_enabled(on):
+    global _enabled
+    _enabled = bool(on)
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name, seconds, **labels):
+    """Record one duration of operation name."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        series = _timings.get(key)
+        if series is None:
+            series = _timings[key] = {"count": 0, "sum": 0.0, "max": 0.0, "samples": deque(maxlen=SAMPLES)}
+        series["count"] += 1
+        series["sum"] += seconds
+        series["max"] = max(series["max"], seconds)
+        series["samples"].append(seconds)
+
+def inc(name, value=1, **labels):
+    """Add value to counter name (bytes read, cache hits, tokens...)."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            inc("errors", op=self.name)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+_NO_SPAN = _NoSpan()
+
+def span(name, **labels):
+    """Context manager timing its block as one observation of name; free when metrics are disabled."""
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, labels)
+
+def timed(name, **labels):
+    """Decorator timing every call of the function as a span of name."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def current_tool():
+    """Name of the agent tool the calling code runs under ("" outside any tool)."""
+    return _tool.get()
+
+@contextmanager
+def tool(name):
+    """Attribute the block (and the LLM calls it makes) to agent tool name."""
+    token = _tool.set(name)
+    try:
+        with span("tool", tool=name):
+            yield
+    finally:
+        _tool.reset(token)
+
+def tool_stream(name, iterator, start=None):
+    """Iterate a streamed tool result under tool name, timing it up to the last item (from start, or the first)."""
+    if start is None:
+        start = time.perf_counter()
+    try:
+        while True:
+            token = _tool.set(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _tool.reset(token)
+            yield item
+    finally:
+        observe("tool", time.perf_counter() - start, tool=name)
+
+def tool_call(name, func, *args, **kwargs):
+    """func(*args, **kwargs) as one call of agent tool name; a streamed (iterator) result is timed until exhausted."""
+    start = time.perf_counter()
+    token = _tool.set(name)
+    try:
+        result = func(*args, **kwargs)
+    except Exception:
+        observe("tool", time.perf_counter() - start, tool=name)
+        inc("errors", op="tool")
+        raise
+    finally:
+        _tool.reset(token)
+    if isinstance(result, Iterator):
+        return tool_stream(name, result, start)
+    observe("tool", time.perf_counter() - start, tool=name)
+    return result
+
+def bind(func):
+    """func bound to the caller's context (current tool), for work handed to a thread pool."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+def register_collector(name, stats):
+    """Include stats() (a dict of numbers, e.g. MetadataCache.stats) in every export as gauges."""
+    with _lock:
+        _collectors[name] = stats
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def snapshot():
+    """Everything recorded so far: {"enabled", "timings", "counters", "gauges"}, JSON-serializable."""
+    with _lock:
+        timings = [(key, dict(s, samples=sorted(s["samples"]))) for key, s in _timings.items()]
+        counters = list(_counters.items())
+        collectors = list(_collectors.items())
+    result = {"enabled": _enabled, "timings": [], "counters": [], "gauges": {}}
+    for (name, labels), series in sorted(timings):
+        entry = {"name": name, "labels": dict(labels), "count": series["count"], "sum": series["sum"],
+                 "max": series["max"]}
+        for q in QUANTILES:
+            entry[f"p{int(q * 100)}"] = _quantile(series["samples"], q) if series["samples"] else None
+        result["timings"].append(entry)
+    for (name, labels), value in sorted(counters):
+        result["counters"].append({"name": name, "labels": dict(labels), "value": value})
+    for name, stats in collectors:
+        try:
+            values = stats()
+        except Exception:
+            continue
+        result["gauges"][name] = {k: v for k, v in values.items() if isinstance(v, (int, float, bool))}
+    return result
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+def _typed(lines, declared, metric, kind):
+    if metric not in declared:
+        declared.add(metric)
+        lines.append(f"# TYPE {metric} {kind}")
+
+def prometheus_text(prefix=PREFIX):
+    """The snapshot in the Prometheus text exposition format (timings as summaries in seconds)."""
+    data = snapshot()
+    lines, declared = [], set()
+    for t in data["timings"]:
+        metric = f"{prefix}{t['name']}_seconds"
+        _typed(lines, declared, metric, "summary")
+        for q in QUANTILES:
+            value = t[f"p{int(q * 100)}"]
+            if value is not None:
+                lines.append(f"{metric}{_labels(t['labels'], quantile=q)} {value:.6g}")
+        lines.append(f"{metric}_sum{_labels(t['labels'])} {t['sum']:.6g}")
+        lines.append(f"{metric}_count{_labels(t['labels'])} {t['count']}")
+    for c in data["counters"]:
+        metric = f"{prefix}{c['name']}_total"
+        _typed(lines, declared, metric, "counter")
+        lines.append(f"{metric}{_labels(c['labels'])} {c['value']}")
+    for source, values in sorted(data["gauges"].items()):
+        for key, value in sorted(values.items()):
+            metric = f"{prefix}{source}_{key}"
+            _typed(lines, declared, metric, "gauge")
+            lines.append(f"{metric} {float(value):.6g}")
+    return "\n".join(lines) + "\n"
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = json.dumps(snapshot()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = prometheus_text().encode(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
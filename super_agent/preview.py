@@ -0,0 +1,118 @@
+import os
+import tempfile
+from pathlib import Path
+from contextlib import nullcontext
+
+PREVIEW_BYTES = 64 * 1024
+PREVIEW_ROWS = 50
+THUMBNAIL_SIZE = 512
+
+def _utf8_prefix(data):
+    """Length of the longest prefix of data that does not end inside a UTF-8 sequence."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue
+        if byte < 0x80:
+            need = 1
+        elif byte >> 5 == 0b110:
+            need = 2
+        elif byte >> 4 == 0b1110:
+            need = 3
+        elif byte >> 3 == 0b11110:
+            need = 4
+        else:
+            need = 1
+        return len(data) if need <= back else len(data) - back
+    return len(data)
+
+def _open(source):
+    """A path is opened; an already open binary file (e.g. a remote blob) is used as is."""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    return nullcontext(source)
+
+def read_text_range(source, offset=0, max_bytes=PREVIEW_BYTES):
+    """Decode at most max_bytes of source (a path or seekable binary file) from offset, cut at UTF-8 boundaries.
+
+    Returns (text, truncated); only the requested range is read, whatever the file size.
+    """
+    with _open(source) as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(offset)
+        data = f.read(max_bytes)
+    if offset:
+        # Skip the tail of a character that started before offset.
+        skip = 0
+        while skip < min(3, len(data)) and data[skip] & 0xC0 == 0x80:
+            skip += 1
+        data = data[skip:]
+    truncated = offset + max_bytes < size
+    if truncated:
+        data = data[:_utf8_prefix(data)]
+    return data.decode("utf-8", errors="replace"), truncated
+
+def text_head(source, lines=10, max_bytes=PREVIEW_BYTES):
+    """First `lines` lines of a text file, reading at most max_bytes."""
+    text, _ = read_text_range(source, 0, max_bytes)
+    return "\n".join(text.splitlines()[:lines])
+
+def csv_head(source, rows=PREVIEW_ROWS):
+    """DataFrame of the first `rows` rows; pandas parses one chunk and stops."""
+    import pandas as pd
+    with pd.read_csv(source, chunksize=rows, on_bad_lines="skip", encoding_errors="replace") as reader:
+        return next(iter(reader), pd.DataFrame())
+
+def xlsx_head(source, rows=PREVIEW_ROWS, sheet=None):
+    """First `rows` rows of a worksheet (the first one by default), streamed with openpyxl read-only mode.
+
+    Returns {"sheets", "sheet", "table"}; the first row is used as the table header.
+    """
+    import openpyxl
+    import pandas as pd
+    wb = openpyxl.load_workbook(str(source) if isinstance(source, os.PathLike) else source, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        values = [list(row) for row in ws.iter_rows(max_row=rows + 1, values_only=True)]
+        sheets, title = wb.sheetnames, ws.title
+    finally:
+        wb.close()
+    width = max((len(row) for row in values), default=0)
+    values = [row + [None] * (width - len(row)) for row in values]
+    header = [str(v) if v is not None else f"Column {i + 1}" for i, v in enumerate(values[0])] if values else []
+    return {"sheets": sheets, "sheet": title, "table": pd.DataFrame(values[1:], columns=header)}
+
+class ThumbnailCache:
+    """Downscaled JPEG thumbnails of images, keyed by content digest and size."""
+
+    def __init__(self, root, size=THUMBNAIL_SIZE):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.size = size
+
+    def path_for(self, key, size=None):
+        return self.root / f"{key}-{size or self.size}.jpg"
+
+    def get(self, key, source, size=None):
+        """Path of the thumbnail of image `source` (a path or binary file), creating it on first use."""
+        target = self.path_for(key, size)
+        if target.exists():
+            return target
+        from PIL import Image
+        size = size or self.size
+        with Image.open(source) as image:
+            # JPEG can decode straight at a reduced scale instead of full resolution.
+            image.draft("RGB", (size, size))
+            image.thumbnail((size, size))
+            fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".thumb-")
+            with os.fdopen(fd, "wb") as f:
+                image.convert("RGB").save(f, "JPEG", quality=85)
+        os.replace(tmp, target)
+        return target
+
+    def delete(self, key):
+        for path in self.root.glob(f"{key}-*.jpg"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
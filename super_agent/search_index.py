@@ -0,0 +1,196 @@
+import re
+import math
+import heapq
+import bisect
+import threading
+from collections import Counter, OrderedDict
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+NAME_WEIGHT = 3
+MAX_PREFIX_EXPANSIONS = 64
+BM25_K1 = 1.2
+BM25_B = 0.75
+RESULT_CACHE_SIZE = 256
+# In any-term mode, terms found in more than this fraction of documents are skipped as stopwords.
+COMMON_TERM_FRACTION = 0.5
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+def matches_query(query, text):
+    """Same multi-term prefix semantics as SearchIndex.search, for names that are not indexed."""
+    tokens = tokenize(text)
+    return all(any(tok.startswith(term) for tok in tokens) for term in tokenize(query))
+
+class SearchIndex:
+    """Incremental inverted index over file names and extracted contents, ranked with BM25.
+
+    Every query term must match (exactly or as a prefix of an indexed token); name tokens
+    count NAME_WEIGHT times so name hits outrank body hits.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = {}
+        self.docs = {}
+        self._vocab = []
+        self._pending = set()
+        self._total_length = 0
+        self._lengths = {}
+        self._by_folder = {}
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, name):
+        return name in self.docs
+
+    def add(self, name, text="", parent=None):
+        terms = Counter(tokenize(name))
+        for tok in terms:
+            terms[tok] *= NAME_WEIGHT
+        terms.update(tokenize(text))
+        self._insert(name, terms, parent)
+
+    def _insert(self, name, terms, parent):
+        with self._lock:
+            self.remove(name)
+            for tok, tf in terms.items():
+                posting = self.postings.get(tok)
+                if posting is None:
+                    posting = self.postings[tok] = {}
+                    self._pending.add(tok)
+                posting[name] = tf
+            length = sum(terms.values())
+            self.docs[name] = {"terms": list(terms), "length": length, "parent": parent}
+            self._by_folder.setdefault(parent, set()).add(name)
+            self._lengths[name] = length
+            self._total_length += length
+            self._results.clear()
+
+    def remove(self, name):
+        with self._lock:
+            doc = self.docs.pop(name, None)
+            if doc is None:
+                return
+            del self._lengths[name]
+            self._by_folder[doc["parent"]].discard(name)
+            self._total_length -= doc["length"]
+            self._results.clear()
+            for tok in doc["terms"]:
+                posting = self.postings[tok]
+                posting.pop(name, None)
+                if not posting:
+                    # The token stays in _vocab until the next compaction; lookups skip it.
+                    del self.postings[tok]
+                    self._pending.discard(tok)
+
+    def rename(self, name, new_name):
+        """Re-key a document under new_name; only the weight of its name tokens changes."""
+        with self._lock:
+            doc = self.docs.get(name)
+            if doc is None:
+                return
+            terms = Counter({tok: self.postings[tok][name] for tok in doc["terms"]})
+            terms.subtract({tok: NAME_WEIGHT * n for tok, n in Counter(tokenize(name)).items()})
+            terms.update({tok: NAME_WEIGHT * n for tok, n in Counter(tokenize(new_name)).items()})
+            self.remove(name)
+            self._insert(new_name, +terms, doc["parent"])
+
+    def move(self, name, parent):
+        with self._lock:
+            doc = self.docs.get(name)
+            if doc is not None:
+                self._by_folder[doc["parent"]].discard(name)
+                self._by_folder.setdefault(parent, set()).add(name)
+                doc["parent"] = parent
+                self._results.clear()
+
+    def _sorted_vocab(self):
+        if self._pending:
+            # Two sorted runs: Timsort merges them in linear time.
+            self._vocab.extend(sorted(self._pending))
+            self._vocab.sort()
+            self._pending.clear()
+        if len(self._vocab) > 2 * len(self.postings) + 1024:
+            self._vocab = sorted(self.postings)
+        return self._vocab
+
+    def _expand(self, term, prefix):
+        if not prefix:
+            return [term] if term in self.postings else []
+        vocab = self._sorted_vocab()
+        result = []
+        i = bisect.bisect_left(vocab, term)
+        while i < len(vocab) and vocab[i].startswith(term) and len(result) < MAX_PREFIX_EXPANSIONS:
+            if vocab[i] in self.postings:
+                result.append(vocab[i])
+            i += 1
+        return result
+
+    def _term_scores(self, term, prefix, candidates, n_docs, avg_length):
+        lengths = self._lengths
+        a = BM25_K1 * (1 - BM25_B)
+        c = BM25_K1 * BM25_B / avg_length
+        scores = {}
+        for tok in self._expand(term, prefix):
+            posting = self.postings[tok]
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5)) * (BM25_K1 + 1)
+            if candidates is not None and len(candidates) < len(posting):
+                pairs = ((name, posting[name]) for name in candidates if name in posting)
+            else:
+                pairs = posting.items()
+            tok_scores = {name: idf * tf / (tf + a + c * lengths[name]) for name, tf in pairs}
+            if not scores:
+                scores = tok_scores
+                continue
+            for name, score in tok_scores.items():
+                if score > scores.get(name, 0.0):
+                    scores[name] = score
+        return scores
+
+    def search(self, query, limit=50, prefix=True, folder=None, require_all=True):
+        """Top `limit` (name, score) pairs; with require_all=False any query term may match."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        key = (tuple(terms), limit, prefix, folder, require_all)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            n_docs = len(self.docs)
+            avg_length = self._total_length / n_docs if n_docs else 1.0
+            # Rarest terms first, so common terms only score the surviving candidates.
+            sizes = {term: sum(len(self.postings[tok]) for tok in self._expand(term, prefix)) for term in terms}
+            if require_all:
+                scores = None
+                if folder is not None:
+                    scores = dict.fromkeys(self._by_folder.get(folder, ()), 0.0)
+                for term in sorted(set(terms), key=sizes.get):
+                    if scores is not None and not scores:
+                        break
+                    term_scores = self._term_scores(term, prefix, scores, n_docs, avg_length)
+                    if scores is None:
+                        scores = term_scores
+                    else:
+                        scores = {name: s + term_scores[name] for name, s in scores.items() if name in term_scores}
+            else:
+                scores = {}
+                candidates = self._by_folder.get(folder, set()) if folder is not None else None
+                for term in set(terms):
+                    if sizes[term] > n_docs * COMMON_TERM_FRACTION:
+                        continue
+                    for name, score in self._term_scores(term, prefix, candidates, n_docs, avg_length).items():
+                        scores[name] = scores.get(name, 0.0) + score
+            rank_key = lambda item: (-item[1], item[0])
+            if limit:
+                result = heapq.nsmallest(limit, scores.items(), key=rank_key)
+            else:
+                result = sorted(scores.items(), key=rank_key)
+            self._results[key] = result
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return result
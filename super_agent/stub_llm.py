@@ -0,0 +1,180 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (closed transports, lost hedges) are routine.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+def default_reply(messages):
+    last = messages[-1]["content"] if messages else ""
+    return f"Stub summary of {len(last)} characters of input. " + " ".join(last.split()[:40])
+
+class StubLLMServer:
+    """Local OpenAI-compatible chat completions endpoint for development and benchmarks.
+
+    Answers POST .../chat/completions with reply(messages), either as one JSON body or,
+    with "stream": true, as server-sent events of `chunk_chars` characters each, sleeping
+    `first_token_delay` before the first chunk and `chunk_delay` between chunks.
+
+    Faults can be injected to exercise clients: every request waits `delay` seconds
+    (plus `slow_delay` for a `slow_fraction` of them), the first `fail_first` requests and
+    an `error_rate` fraction of the rest are answered with HTTP `error_status` (with a
+    Retry-After header when `retry_after` is set), and streams are cut off, without
+    finishing, after `drop_after` chunks. All of these can be changed while running.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, reply=default_reply, chunk_chars=8,
+                 first_token_delay=0.0, chunk_delay=0.0, delay=0.0, slow_fraction=0.0, slow_delay=0.0,
+                 error_rate=0.0, error_status=503, fail_first=0, retry_after=None, drop_after=None, seed=None):
+        self.reply = reply
+        self.chunk_chars = chunk_chars
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.delay = delay
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.drop_after = drop_after
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                with server._lock:
+                    server.requests += 1
+                    fail = server.requests <= server.fail_first or server._random.random() < server.error_rate
+                    slow = server._random.random() < server.slow_fraction
+                    if fail:
+                        server.errors += 1
+                time.sleep(server.delay + (server.slow_delay if slow else 0.0))
+                try:
+                    if fail:
+                        headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else None
+                        self._send_json(server.error_status, {"error": {"message": "injected fault", "type": "stub_error"}}, headers)
+                        return
+                    server.handle_completion(self, request)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # The client gave up (deadline or lost hedge).
+
+        return Handler
+
+    def handle_completion(self, handler, request):
+        text = self.reply(request.get("messages", []))
+        model = request.get("model", "stub")
+        created = int(time.time())
+        if not request.get("stream"):
+            # Words, not tokens: close enough for usage accounting in tests and benchmarks.
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+            handler._send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text.split()),
+                          "total_tokens": prompt_tokens + len(text.split())},
+            })
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        time.sleep(self.first_token_delay)
+        pieces = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        for i, piece in enumerate(pieces):
+            if self.drop_after is not None and i >= self.drop_after:
+                return
+            if i:
+                time.sleep(self.chunk_delay)
+            self._send_event(handler, {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+        self._send_event(handler, {
+            "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+    def _send_event(self, handler, payload):
+        handler.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+        handler.wfile.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub LLM endpoint.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="fraction of requests delayed by --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--drop-after", type=int, default=None, help="cut streams off after this many chunks")
+    args = parser.parse_args()
+    server = StubLLMServer(port=args.port, first_token_delay=args.first_token_delay, chunk_delay=args.chunk_delay,
+                           delay=args.delay, slow_fraction=args.slow_fraction, slow_delay=args.slow_delay,
+                           error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after,
+                           drop_after=args.drop_after)
+    print(f"Stub LLM listening on {server.base_url}")
+    server._httpd.serve_forever()
@@ -0,0 +1,214 @@
+import re
+import time
+import hashlib
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from super_agent import metrics
+from super_agent.summary_cache import summary_key
+
+# Rough size of a token for the serving endpoint's tokenizer; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = 2000
+REDUCE_FANIN = 6
+MAP_MAX_TOKENS = 300
+MAPREDUCE_PROMPT_VERSION = 1
+
+MAP_PROMPT = (
+    "You are summarizing part {index} of {total} of the document '{title}'.\n\n"
+    "{text}\n"
+    "---\n"
+    "Summarize this part in a few bullets: customers/projects, topics, figures, decisions and open items. "
+    "Only use information present in the text."
+)
+REDUCE_PROMPT = (
+    "Below are partial summaries of consecutive parts of the document '{title}'.\n\n"
+    "{text}\n"
+    "---\n"
+    "Merge them into one set of bullets without losing customers/projects, figures, decisions or open items."
+)
+FINAL_PROMPT = (
+    "You are an executive assistant for Databricks field engineers.\n"
+    "Given these notes covering the whole of '{title}':\n\n"
+    "{text}\n"
+    "---\n"
+    "Write a concise executive summary with key customers/projects, main topics, business outcomes, and actionable findings. "
+    "Use headings/bullets when suitable. Do not repeat raw text—synthesize for a product manager, architect, or field leader."
+)
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS):
+    """Split text into chunks of at most max_tokens, preferring paragraph, then line, then word breaks."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for piece in re.split(r"(\n\s*\n)", text):
+        while len(piece) > limit:
+            cut = max(piece.rfind("\n", 0, limit), piece.rfind(" ", 0, limit))
+            cut = cut if cut > limit // 2 else limit
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(piece[:cut])
+            piece = piece[cut:]
+        if len(current) + len(piece) > limit:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return [c.strip() for c in chunks if c.strip()]
+
+def _text_digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=32).hexdigest()
+
+class MapReduceSummarizer:
+    """Summarizes a whole document: chunk summaries run concurrently, then are merged level by level.
+
+    Every map and reduce call is cached by the hash of its input, so re-running on a
+    partially changed document only pays for the chunks that changed.
+    """
+
+    def __init__(self, llm, model, cache=None, max_workers=4, chunk_tokens=CHUNK_TOKENS,
+                 reduce_fanin=REDUCE_FANIN, max_tokens=600):
+        self.llm = llm
+        self.model = model
+        self.cache = cache
+        self.max_workers = max(1, max_workers)
+        self.chunk_tokens = chunk_tokens
+        self.reduce_fanin = max(2, reduce_fanin)
+        self.max_tokens = max_tokens
+
+    def _complete(self, prompt, max_tokens, owner):
+        key = None
+        if self.cache is not None:
+            key = summary_key(_text_digest(prompt), model=self.model, max_tokens=max_tokens,
+                              prompt_version=MAPREDUCE_PROMPT_VERSION)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        response = self.llm.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+        )
+        content = response.choices[0].message.content or ""
+        if key is not None and content:
+            self.cache.put(key, owner, content)
+        return content
+
+    def _run_level(self, pool, prompts, max_tokens, owner, stage, progress):
+        results = [None] * len(prompts)
+        complete = metrics.bind(self._complete)
+        futures = {pool.submit(complete, p, max_tokens, owner): i for i, p in enumerate(prompts)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            progress(stage)
+        return results
+
+    def _map_reduce(self, pool, chunks, title, owner, progress):
+        parts = self._run_level(pool, [
+            MAP_PROMPT.format(index=i + 1, total=len(chunks), title=title, text=chunk)
+            for i, chunk in enumerate(chunks)
+        ], MAP_MAX_TOKENS, owner, "map", progress)
+        while len(parts) > self.reduce_fanin:
+            groups = [parts[i:i + self.reduce_fanin] for i in range(0, len(parts), self.reduce_fanin)]
+            parts = self._run_level(pool, [
+                REDUCE_PROMPT.format(title=title, text="\n\n".join(group)) for group in groups
+            ], MAP_MAX_TOKENS * 2, owner, "reduce", progress)
+        return parts
+
+    def summarize(self, text, title, owner="", on_progress=None):
+        chunks = chunk_text(text, self.chunk_tokens)
+        if not chunks:
+            return ""
+        # Map calls + one call per reduce group on each level + the final call.
+        n = total = len(chunks) if len(chunks) > 1 else 0
+        while n > self.reduce_fanin:
+            n = -(-n // self.reduce_fanin)
+            total += n
+        total += 1
+        done = [0]
+
+        def progress(stage):
+            done[0] += 1
+            if on_progress:
+                on_progress(done[0], total, stage)
+
+        if len(chunks) == 1:
+            parts = chunks
+        else:
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                parts = self._map_reduce(pool, chunks, title, owner, progress)
+        summary = self._complete(FINAL_PROMPT.format(title=title, text="\n\n".join(parts)), self.max_tokens, owner)
+        progress("final")
+        return summary
+
+def stream_completion(llm, model, messages, max_tokens):
+    """Yield the content deltas of a streamed (stream=True) chat completion as they arrive."""
+    start, first, deltas, finished = time.perf_counter(), None, 0, False
+    for chunk in llm.chat.completions.create(model=model, messages=messages, max_tokens=max_tokens, stream=True):
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first is None:
+                first = time.perf_counter()
+                metrics.observe("llm_first_token", first - start, tool=metrics.current_tool() or "-")
+            deltas += 1
+            yield chunk.choices[0].delta.content
+        if chunk.choices and chunk.choices[0].finish_reason:
+            finished = True
+    if not finished:
+        # The connection closed mid-answer; the client library ends the stream quietly.
+        raise ConnectionError("the LLM stream ended before the completion finished")
+    metrics.observe("llm_stream", time.perf_counter() - start, tool=metrics.current_tool() or "-")
+    metrics.inc("llm_stream_deltas", deltas, tool=metrics.current_tool() or "-")
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class RateLimitedClient:
+    """Wraps an OpenAI-compatible client so every chat completion first takes a token from `bucket`."""
+
+    def __init__(self, llm, bucket):
+        self.llm = llm
+        self.bucket = bucket
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, *args, **kwargs):
+        self.bucket.acquire()
+        return self.llm.chat.completions.create(*args, **kwargs)
+
+def summarize_many(filenames, summarize, max_workers=8):
+    """Run summarize(filename) concurrently and yield (filename, summary) as each one finishes."""
+    filenames = list(filenames)
+    if not filenames:
+        return
+    with ThreadPoolExecutor(max(1, min(max_workers, len(filenames)))) as pool:
+        summarize = metrics.bind(summarize)
+        futures = {pool.submit(summarize, name): name for name in filenames}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                yield name, future.result()
+            except Exception as e:
+                yield name, f"**{name}**\n\n(Summarization failed: {e})"
@@ -0,0 +1,158 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from collections import OrderedDict
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_by_digest ON summaries(digest);
+CREATE INDEX IF NOT EXISTS summaries_by_last_used ON summaries(last_used);
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO usage SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM summaries WHERE NOT EXISTS (SELECT 1 FROM usage);
+"""
+# Hits only refresh last_used in memory; they are written out in one statement per
+# TOUCH_BATCH keys or TOUCH_INTERVAL seconds, and before every eviction.
+TOUCH_BATCH = 64
+TOUCH_INTERVAL = 30
+
+def summary_key(digest, **params):
+    """Cache key for a summary of content `digest` produced with the given model/prompt parameters."""
+    payload = json.dumps([digest, sorted(params.items())], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SummaryCache:
+    """Two-tier LLM summary cache: an in-memory LRU in front of a size-bounded SQLite table."""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, memory_entries=256):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._touched_at = time.monotonic()
+        self._db = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key, digest, summary):
+        self._memory[key] = (digest, summary)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    @contextmanager
+    def _tx(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def _touch(self, key):
+        self._touched[key] = time.time()
+        if len(self._touched) >= TOUCH_BATCH or time.monotonic() - self._touched_at >= TOUCH_INTERVAL:
+            self._flush_touched()
+
+    def _flush_touched(self):
+        if self._touched:
+            rows = [(used, key) for key, used in self._touched.items()]
+            if self._db.in_transaction:
+                self._db.executemany("UPDATE summaries SET last_used = ? WHERE key = ?", rows)
+            else:
+                with self._tx() as db:
+                    db.executemany("UPDATE summaries SET last_used = ? WHERE key = ?", rows)
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self._touch(key)
+                return self._memory[key][1]
+            row = self._db.execute("SELECT digest, summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            self._touch(key)
+            return row[1]
+
+    def put(self, key, digest, summary):
+        size = len(summary.encode("utf-8"))
+        with self._lock:
+            self._remember(key, digest, summary)
+            self._touched.pop(key, None)
+            with self._tx() as db:
+                old = db.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+                db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                           (key, digest, summary, size, time.time()))
+                db.execute("UPDATE usage SET entries = entries + ?, bytes = bytes + ? WHERE id = 0",
+                           (0 if old else 1, size - (old[0] if old else 0)))
+                self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT bytes FROM usage WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self._flush_touched()
+        while total > self.max_bytes:
+            victims = db.execute("SELECT key, size FROM summaries ORDER BY last_used LIMIT 64").fetchall()
+            if not victims:
+                break
+            for key, size in victims:
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                db.execute("UPDATE usage SET entries = entries - 1, bytes = bytes - ? WHERE id = 0", (size,))
+                self._memory.pop(key, None)
+                total -= size
+                self.evictions += 1
+
+    def invalidate_digest(self, digest):
+        with self._lock:
+            for key in [k for k, (d, _) in self._memory.items() if d == digest]:
+                del self._memory[key]
+            with self._tx() as db:
+                entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries WHERE digest = ?",
+                                           (digest,)).fetchone()
+                db.execute("DELETE FROM summaries WHERE digest = ?", (digest,))
+                db.execute("UPDATE usage SET entries = entries - ?, bytes = bytes - ? WHERE id = 0", (entries, size))
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT entries, bytes FROM usage WHERE id = 0").fetchone()
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
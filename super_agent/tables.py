@@ -0,0 +1,199 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+TABLE_EXTENSIONS = (".csv", ".xlsx")
+TOP_VALUES = 5
+PROFILE_CACHE_SIZE = 256
+# Small row groups let a preview decode the first rows without the rest of the sheet.
+ROW_GROUP_ROWS = 64 * 1024
+
+def is_table(filename):
+    return filename.lower().endswith(TABLE_EXTENSIONS)
+
+def _read_csv(path):
+    import pandas as pd
+    try:
+        # The pyarrow engine parses multi-threaded straight into columnar buffers.
+        return pd.read_csv(path, engine="pyarrow")
+    except Exception:
+        return pd.read_csv(path, on_bad_lines="skip", encoding_errors="replace")
+
+def load_sheets(path, filename):
+    """[(sheet name, DataFrame)] of a CSV (one unnamed sheet) or XLSX file."""
+    import pandas as pd
+    if filename.lower().endswith(".csv"):
+        return [("", _read_csv(path))]
+    return list(pd.read_excel(path, sheet_name=None, engine="openpyxl").items())
+
+def _arrow_safe(frame):
+    """Frame with string column names and mixed-type object columns cast to strings, as Parquet needs."""
+    frame = frame.copy(deep=False)
+    frame.columns = [str(c) for c in frame.columns]
+    for col in frame.columns[frame.dtypes == object]:
+        frame[col] = frame[col].astype("string")
+    return frame
+
+def _scalar(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value if isinstance(value, (int, float, bool)) else str(value)
+
+def profile_column(series, top=TOP_VALUES):
+    """dtype, null count, min/max (numeric, boolean and datetime columns), distinct count and top values."""
+    import pandas as pd
+    values = series.dropna()
+    profile = {
+        "name": str(series.name),
+        "dtype": str(series.dtype),
+        "nulls": int(len(series) - len(values)),
+        "distinct": int(values.nunique()),
+        "min": None,
+        "max": None,
+    }
+    if len(values) and (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)):
+        profile["min"], profile["max"] = _scalar(values.min()), _scalar(values.max())
+    counts = values.value_counts(sort=True).head(top)
+    profile["top"] = [[_scalar(value), int(count)] for value, count in counts.items()]
+    return profile
+
+def profile_frame(frame, name=""):
+    return {
+        "name": name,
+        "rows": int(len(frame)),
+        "columns": [profile_column(frame[col]) for col in frame.columns],
+    }
+
+def convert_table(path, filename, target):
+    """Parse a CSV/XLSX file once into Parquet sheets plus a profile.json under directory target.
+
+    The directory is built aside and renamed into place, so readers never see a partial table.
+    """
+    target = Path(target)
+    sheets = load_sheets(path, filename)
+    tmp = Path(tempfile.mkdtemp(dir=target.parent, prefix=".table-"))
+    try:
+        profiles = []
+        for i, (name, frame) in enumerate(sheets):
+            frame = _arrow_safe(frame)
+            frame.to_parquet(tmp / f"{i}.parquet", index=False, row_group_size=ROW_GROUP_ROWS)
+            profiles.append(profile_frame(frame, name))
+        with open(tmp / "profile.json", "w", encoding="utf-8") as f:
+            json.dump({"sheets": profiles}, f)
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # Converted concurrently by someone else; theirs is just as good.
+            if not (target / "profile.json").exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {"sheets": profiles}
+
+class TableCache:
+    """Columnar copies of tabular uploads: <key>/<sheet>.parquet plus <key>/profile.json.
+
+    Keys are content digests, so a cached profile never goes stale; the most recently
+    used profiles are also kept in memory.
+    """
+
+    def __init__(self, root, cache_size=PROFILE_CACHE_SIZE):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.cache_size = cache_size
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def dir_for(self, key):
+        return self.root / key
+
+    def exists(self, key):
+        return (self.dir_for(key) / "profile.json").exists()
+
+    def get_profile(self, key):
+        with self._lock:
+            if key in self._profiles:
+                self._profiles.move_to_end(key)
+                return self._profiles[key]
+        try:
+            with open(self.dir_for(key) / "profile.json", "r", encoding="utf-8") as f:
+                profile = json.load(f)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._profiles[key] = profile
+            while len(self._profiles) > self.cache_size:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def convert(self, key, path, filename):
+        convert_table(path, filename, self.dir_for(key))
+        return self.get_profile(key)
+
+    def head(self, key, rows, sheet=0, columns=None):
+        """First rows of a cached sheet; only the leading row group is decoded."""
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(self.dir_for(key) / f"{sheet}.parquet")
+        batch = next(parquet.iter_batches(batch_size=rows, columns=columns), None)
+        if batch is None:
+            return parquet.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas()
+
+    def read(self, key, sheet=0, columns=None):
+        """A whole cached sheet (optionally only some columns) as a DataFrame."""
+        import pandas as pd
+        return pd.read_parquet(self.dir_for(key) / f"{sheet}.parquet", columns=columns)
+
+    def delete(self, key):
+        with self._lock:
+            self._profiles.pop(key, None)
+        shutil.rmtree(self.dir_for(key), ignore_errors=True)
+
+def table_shape(profile):
+    """Shape such as "1,000 rows × 4 columns", summed over the sheets of a workbook."""
+    sheets = profile["sheets"]
+    rows = sum(sheet["rows"] for sheet in sheets)
+    columns = sum(len(sheet["columns"]) for sheet in sheets)
+    shape = f"{rows:,} rows × {columns} columns"
+    return shape + (f" in {len(sheets)} sheets" if len(sheets) > 1 else "")
+
+def _range(column):
+    if column["min"] is None:
+        return ""
+    return f", {column['min']} – {column['max']}"
+
+def profile_summary(profile):
+    """One line per sheet naming each column with its type and range, for the assistant's context."""
+    lines = []
+    for sheet in profile["sheets"]:
+        columns = "; ".join(f"{c['name']} ({c['dtype']}{_range(c)})" for c in sheet["columns"])
+        label = f"sheet {sheet['name']}: " if sheet["name"] else ""
+        lines.append(f"{label}{sheet['rows']:,} rows; columns: {columns}")
+    return " | ".join(lines)
+
+def profile_markdown(profile):
+    """Markdown tables of the column profile of every sheet."""
+    parts = []
+    for sheet in profile["sheets"]:
+        header = f"**Sheet {sheet['name']}** – " if sheet["name"] else ""
+        parts.append(f"{header}{sheet['rows']:,} rows × {len(sheet['columns'])} columns\n")
+        parts.append("| Column | Type | Nulls | Distinct | Min | Max | Top values |")
+        parts.append("|---|---|---|---|---|---|---|")
+        for c in sheet["columns"]:
+            top = ", ".join(f"{value} ({count})" for value, count in c["top"][:3])
+            parts.append(
+                f"| {c['name']} | {c['dtype']} | {c['nulls']:,} | {c['distinct']:,} | "
+                f"{'' if c['min'] is None else c['min']} | {'' if c['max'] is None else c['max']} | {top} |"
+            )
+        parts.append("")
+    return "\n".join(parts).strip()
@@ -0,0 +1,371 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from functools import lru_cache
+
+import numpy as np
+
+from super_agent.search_index import tokenize
+from super_agent.summarize import chunk_text
+
+CHUNK_TOKENS = 200
+INITIAL_ROWS = 1024
+# Below this many chunks a brute-force scan is faster than probing partitions.
+IVF_MIN_ROWS = 100_000
+IVF_PROBES = 8
+IVF_SAMPLE_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+ASSIGN_BLOCK = 65536
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    digest TEXT,
+    chunk INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    list INTEGER NOT NULL DEFAULT -1
+);
+CREATE INDEX IF NOT EXISTS chunks_by_name ON chunks(name);
+"""
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+class HashingEmbedder:
+    """Deterministic feature-hashing embedder (unigrams and bigrams); needs no model or network."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+                h = _feature_hash(feature)
+                vectors[i, h % self.dim] += 1.0 if h >> 63 else -1.0
+        return _normalize(vectors)
+
+class OpenAIEmbedder:
+    """Embeddings from an OpenAI-compatible endpoint, e.g. a Databricks embedding serving endpoint."""
+
+    def __init__(self, client, model, batch_size=64):
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f"openai-{model}"
+        self.dim = self.embed(["dimension probe"]).shape[1]
+
+    def embed(self, texts):
+        rows = []
+        for i in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(model=self.model, input=texts[i:i + self.batch_size])
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return _normalize(np.asarray(rows, dtype=np.float32).reshape(len(rows), -1))
+
+def chunk_spans(text, max_tokens=CHUNK_TOKENS):
+    """(start, stop) offsets of the chunks chunk_text produces for text."""
+    spans, pos = [], 0
+    for chunk in chunk_text(text, max_tokens):
+        start = text.find(chunk, pos)
+        start = pos if start < 0 else start
+        spans.append((start, start + len(chunk)))
+        pos = start + len(chunk)
+    return spans
+
+class VectorIndex:
+    """Embeddings of document chunks in a memory-mapped float32 matrix, one row per chunk.
+
+    Row metadata lives in SQLite next to the matrix and rows of removed documents are
+    reused. Queries are one matrix-vector product over the live rows; with ivf=True and
+    at least IVF_MIN_ROWS chunks, rows are partitioned by k-means centroids and a query
+    only scans the rows of its `probes` nearest partitions.
+    """
+
+    def __init__(self, root, embedder, ivf=False, probes=IVF_PROBES, chunk_tokens=CHUNK_TOKENS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.ivf = ivf
+        self.probes = probes
+        self.chunk_tokens = chunk_tokens
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.root / "chunks.db"), isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        info = dict(self._db.execute("SELECT key, value FROM info"))
+        if info.get("embedder") != embedder.name or info.get("dim") != str(self.dim):
+            # Vectors from another embedder are not comparable: start over.
+            self._db.execute("DELETE FROM chunks")
+            self._db.executemany("INSERT OR REPLACE INTO info VALUES (?, ?)",
+                                 [("embedder", embedder.name), ("dim", str(self.dim))])
+            for stale in ("vectors.f32", "centroids.npy"):
+                try:
+                    (self.root / stale).unlink()
+                except FileNotFoundError:
+                    pass
+        self._rows = {}
+        self._by_name = {}
+        self._by_digest = {}
+        records = self._db.execute("SELECT row, name, digest, chunk, start, stop, list FROM chunks ORDER BY row").fetchall()
+        for row, name, digest, chunk, start, stop, _ in records:
+            self._rows[row] = (name, chunk, start, stop)
+            self._by_name.setdefault(name, (digest, []))[1].append(row)
+            self._by_digest.setdefault(digest, set()).add(name)
+        self._size = records[-1][0] + 1 if records else 0
+        self._free = sorted(set(range(self._size)) - set(self._rows), reverse=True)
+        self._capacity = 0
+        self._valid = np.zeros(0, dtype=bool)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._grow(max(self._size, INITIAL_ROWS))
+        self._valid[list(self._rows)] = True
+        self._centroids = None
+        self._lists = []
+        self._pending = []
+        self._relabel = None
+        self._trained_rows = 0
+        self._training = False
+        centroids_path = self.root / "centroids.npy"
+        if centroids_path.exists():
+            self._assign[[r[0] for r in records]] = [r[6] for r in records]
+            self._install_centroids(np.load(centroids_path))
+            self._trained_rows = len(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def digest_of(self, name):
+        entry = self._by_name.get(name)
+        return entry[0] if entry else None
+
+    def names(self):
+        with self._lock:
+            return list(self._by_name)
+
+    def _grow(self, capacity):
+        path = self.root / "vectors.f32"
+        path.touch()
+        needed = capacity * self.dim * 4
+        if path.stat().st_size < needed:
+            os.truncate(path, needed)
+        old = self._capacity
+        self._capacity = path.stat().st_size // (self.dim * 4)
+        self._matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+        valid = np.zeros(self._capacity, dtype=bool)
+        valid[:old] = self._valid[:old]
+        assign = np.full(self._capacity, -1, dtype=np.int32)
+        assign[:old] = self._assign[:old]
+        self._valid, self._assign = valid, assign
+
+    def _allocate(self, count):
+        rows = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        extra = count - len(rows)
+        if extra:
+            if self._size + extra > self._capacity:
+                self._grow(max(self._capacity * 2, self._size + extra))
+            rows.extend(range(self._size, self._size + extra))
+            self._size += extra
+        return np.asarray(rows, dtype=np.int64)
+
+    def _remove(self, name):
+        entry = self._by_name.pop(name, None)
+        if entry is None:
+            return
+        digest, rows = entry
+        names = self._by_digest.get(digest)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self._by_digest[digest]
+        for row in rows:
+            del self._rows[row]
+        self._valid[rows] = False
+        self._assign[rows] = -1
+        self._free = sorted(set(self._free) | set(rows), reverse=True)
+        self._db.execute("DELETE FROM chunks WHERE name = ?", (name,))
+
+    def remove(self, name):
+        with self._lock:
+            self._remove(name)
+
+    def add(self, name, digest, text):
+        """Index text under name; a no-op when name is already indexed with the same digest."""
+        with self._lock:
+            if self.digest_of(name) == digest:
+                return 0
+            twin = next(iter(self._by_digest.get(digest, ())), None)
+            if twin is not None:
+                # Same content under another name: reuse its vectors instead of re-embedding.
+                twin_rows = self._by_name[twin][1]
+                vectors = np.array(self._matrix[twin_rows])
+                spans = [self._rows[r][2:] for r in twin_rows]
+        if twin is None:
+            spans = chunk_spans(text, self.chunk_tokens)
+            vectors = self.embedder.embed([text[start:stop] for start, stop in spans]) if spans else None
+        with self._lock:
+            self._remove(name)
+            if not spans:
+                self._by_name[name] = (digest, [])
+                self._by_digest.setdefault(digest, set()).add(name)
+                return 0
+            rows = self._allocate(len(spans))
+            self._matrix[rows] = vectors
+            labels = self._label(vectors) if self._centroids is not None else np.full(len(rows), -1)
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (int(row), name, digest, i, start, stop, int(label))
+                for i, (row, (start, stop), label) in enumerate(zip(rows, spans, labels))
+            ])
+            self._db.execute("COMMIT")
+            for i, (row, (start, stop)) in enumerate(zip(rows.tolist(), spans)):
+                self._rows[row] = (name, i, start, stop)
+            self._by_name[name] = (digest, rows.tolist())
+            self._by_digest.setdefault(digest, set()).add(name)
+            self._valid[rows] = True
+            self._assign[rows] = labels
+            if self._centroids is not None:
+                for row, label in zip(rows.tolist(), labels.tolist()):
+                    self._pending[label].append(row)
+            if self._relabel is not None:
+                self._relabel.update(rows.tolist())
+            self._maybe_train()
+            return len(rows)
+
+    def _label(self, vectors):
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _install_centroids(self, centroids):
+        self._centroids = centroids.astype(np.float32, copy=False)
+        live = np.flatnonzero(self._valid[:self._size])
+        labels = self._assign[live]
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+        self._lists = [live[order[bounds[c]:bounds[c + 1]]] for c in range(len(centroids))]
+        self._pending = [[] for _ in centroids]
+
+    def _maybe_train(self):
+        live = len(self._rows)
+        if (self.ivf and not self._training and live >= IVF_MIN_ROWS
+                and live >= 2 * max(self._trained_rows, IVF_MIN_ROWS // 2)):
+            self._training = True
+            self._relabel = set()
+            threading.Thread(target=self.train, name="vector-index-train", daemon=True).start()
+
+    def train(self):
+        """Fit the coarse partitions (spherical k-means over a sample) and re-partition every row."""
+        try:
+            with self._lock:
+                live = np.flatnonzero(self._valid[:self._size])
+                if self._relabel is None:
+                    self._relabel = set()
+            if not len(live):
+                return
+            rng = np.random.default_rng(0)
+            nlist = max(1, int(np.sqrt(len(live))))
+            sample = np.array(self._matrix[np.sort(rng.choice(live, min(len(live), nlist * IVF_SAMPLE_PER_LIST), replace=False))])
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+            for _ in range(KMEANS_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = ~sums.any(axis=1)
+                sums[empty] = centroids[empty]
+                centroids = _normalize(sums)
+            labels = np.concatenate([
+                np.argmax(self._matrix[live[i:i + ASSIGN_BLOCK]] @ centroids.T, axis=1)
+                for i in range(0, len(live), ASSIGN_BLOCK)
+            ]).astype(np.int32)
+            with self._lock:
+                # Rows written while training ran are re-labelled against the new centroids.
+                changed = np.asarray(sorted(self._relabel), dtype=np.int64)
+                keep = self._valid[live]
+                self._assign[live[keep]] = labels[keep]
+                self._centroids = centroids
+                changed = changed[self._valid[changed]] if len(changed) else changed
+                if len(changed):
+                    self._assign[changed] = self._label(np.array(self._matrix[changed]))
+                self._install_centroids(centroids)
+                np.save(self.root / "centroids.npy", centroids)
+                rows = np.flatnonzero(self._valid[:self._size])
+                self._db.execute("BEGIN")
+                self._db.executemany("UPDATE chunks SET list = ? WHERE row = ?",
+                                     zip(self._assign[rows].tolist(), rows.tolist()))
+                self._db.execute("COMMIT")
+                self._trained_rows = len(rows)
+        finally:
+            with self._lock:
+                self._training = False
+                self._relabel = None
+
+    def _candidates(self, query):
+        probe = np.argsort(-(self._centroids @ query))[:self.probes]
+        parts = []
+        for c in probe.tolist():
+            if self._pending[c]:
+                self._lists[c] = np.concatenate([self._lists[c], np.asarray(self._pending[c], dtype=np.int64)])
+                self._pending[c] = []
+            rows = self._lists[c]
+            current = rows[self._assign[rows] == c]
+            if len(current) < len(rows) // 2:
+                self._lists[c] = current
+            parts.append(current)
+        return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def search(self, query, k=10):
+        """Top k chunks for query as (name, chunk, start, stop, score), best first."""
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            if not self._rows:
+                return []
+            if self._centroids is not None:
+                rows = self._candidates(vector)
+                scores = self._matrix[rows] @ vector
+            else:
+                rows = None
+                scores = self._matrix[:self._size] @ vector
+                scores[~self._valid[:self._size]] = -np.inf
+            k = min(k, len(scores))
+            if not k:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results = []
+            for i in top.tolist():
+                if not np.isfinite(scores[i]):
+                    break
+                name, chunk, start, stop = self._rows[i if rows is None else int(rows[i])]
+                results.append((name, chunk, start, stop, float(scores[i])))
+            return results
+
+    def search_files(self, query, k=10):
+        """Best-matching chunk of each of the top k documents, as (name, chunk, start, stop, score)."""
+        best = {}
+        for hit in self.search(query, k * 4):
+            best.setdefault(hit[0], hit)
+            if len(best) == k:
+                break
+        return list(best.values())
+
+    def close(self):
+        with self._lock:
+            self._matrix.flush()
+            self._db.close()
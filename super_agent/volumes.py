@@ -0,0 +1,369 @@
+import io
+import os
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from super_agent.blobstore import BlobStore
+
+PART_SIZE = 8 * 1024 * 1024
+TRANSFER_WORKERS = 8
+PART_RETRIES = 3
+CACHE_BYTES = 1024 * 1024 * 1024
+READ_BUFFER = 256 * 1024
+# Blobs never change, but another replica may delete one: a cached manifest is trusted this long.
+MANIFEST_TTL = 60
+
+class LocalVolumeClient:
+    """Filesystem stand-in for a Volume: keys such as /Volumes/c/s/v/ab/cd.json live under root.
+
+    Same calls and semantics as DatabricksVolumeClient (whole-object writes that replace
+    atomically, ranged reads), so VolumeBlobStore can be run and tested without a workspace.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.root / key.lstrip("/")
+
+    def put(self, key, data):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".part-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key, offset=0, length=None):
+        with open(self._path(key), "rb") as f:
+            f.seek(offset)
+            return f.read() if length is None else f.read(length)
+
+    def exists(self, key):
+        return self._path(key).exists()
+
+    def delete(self, key):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+class DatabricksVolumeClient:
+    """Unity Catalog Volume objects over the Files API (/api/2.0/fs/files), on one pooled HTTP client."""
+
+    def __init__(self, host, token, max_connections=TRANSFER_WORKERS * 2, timeout=120.0, client=None):
+        import httpx
+        self.base = host.rstrip("/") + "/api/2.0/fs/files"
+        self.client = client or httpx.Client(
+            headers={"Authorization": f"Bearer {token}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            transport=httpx.HTTPTransport(retries=2),
+        )
+
+    def put(self, key, data):
+        response = self.client.put(self.base + key, params={"overwrite": "true"}, content=data,
+                                   headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+
+    def get(self, key, offset=0, length=None):
+        headers = {}
+        if offset or length is not None:
+            end = "" if length is None else offset + length - 1
+            headers["Range"] = f"bytes={offset}-{end}"
+        response = self.client.get(self.base + key, headers=headers)
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        response.raise_for_status()
+        return response.content
+
+    def exists(self, key):
+        response = self.client.head(self.base + key)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def delete(self, key):
+        response = self.client.delete(self.base + key)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def close(self):
+        self.client.close()
+
+class _RangeReader(io.RawIOBase):
+    """Seekable read-only file over a remote blob; every read is a ranged request."""
+
+    def __init__(self, store, digest, size):
+        self.store = store
+        self.digest = digest
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.size - self.pos)
+        if length <= 0:
+            return 0
+        data = self.store.read_range(self.digest, self.pos, length)
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+class VolumeBlobStore:
+    """Content-addressed blobs in a Databricks Volume (or any object store client), with a local read-through cache.
+
+    A blob is stored as fixed-size parts <prefix>/ab/<digest>.<n>, uploaded in parallel,
+    plus a manifest <prefix>/ab/<digest>.json written last, so a blob exists only once
+    all its parts do. Ranged reads fetch just the parts they cover; local_path() downloads
+    the parts in parallel into a size-bounded LRU cache shared by previews and extraction.
+    Every app replica pointed at the same Volume sees the same bytes.
+    """
+
+    def __init__(self, client, prefix, cache_dir, part_size=PART_SIZE, workers=TRANSFER_WORKERS,
+                 cache_bytes=CACHE_BYTES):
+        self.client = client
+        self.prefix = "/" + prefix.strip("/")
+        self.cache = BlobStore(cache_dir)
+        self.part_size = part_size
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self.counters = {"uploaded_bytes": 0, "downloaded_bytes": 0, "cache_hits": 0, "cache_misses": 0}
+        self._manifests = {}
+        self._cached = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+        for path in sorted(self.cache.root.glob("??/*"), key=lambda p: p.stat().st_atime):
+            self._cached[path.parent.name + path.name] = path.stat().st_size
+
+    def _key(self, digest, suffix):
+        return f"{self.prefix}/{digest[:2]}/{digest}.{suffix}"
+
+    def path_for(self, digest):
+        return self._key(digest, "json")[:-len(".json")]
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="volume-transfer")
+            return self._pool
+
+    def _map(self, func, items):
+        return list(self._get_pool().map(func, items))
+
+    def _iter_parts(self, digest, parts):
+        """The blob's parts in order, fetched in parallel with at most `workers` of them in memory."""
+        pool, pending, next_part = self._get_pool(), deque(), 0
+        try:
+            while next_part < parts or pending:
+                while next_part < parts and len(pending) < self.workers:
+                    pending.append(pool.submit(self.client.get, self._key(digest, next_part)))
+                    next_part += 1
+                data = pending.popleft().result()
+                self._count("downloaded_bytes", len(data))
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "cached_blobs": len(self._cached), "cached_bytes": sum(self._cached.values())}
+
+    def manifest(self, digest, max_age=None):
+        """{"size", "part_size", "parts"} of a stored blob, or None; re-read once the cached one is max_age
+        (default MANIFEST_TTL) seconds old."""
+        max_age = MANIFEST_TTL if max_age is None else max_age
+        with self._lock:
+            cached = self._manifests.get(digest)
+            if cached is not None and time.monotonic() - cached[1] < max_age:
+                return cached[0]
+        try:
+            manifest = json.loads(self.client.get(self._key(digest, "json")))
+        except FileNotFoundError:
+            with self._lock:
+                self._manifests.pop(digest, None)
+            return None
+        with self._lock:
+            self._manifests[digest] = (manifest, time.monotonic())
+        return manifest
+
+    def exists(self, digest):
+        return self.manifest(digest) is not None
+
+    def _upload_part(self, path, digest, number):
+        with open(path, "rb") as f:
+            f.seek(number * self.part_size)
+            data = f.read(self.part_size)
+        for attempt in range(PART_RETRIES):
+            try:
+                self.client.put(self._key(digest, number), data)
+                break
+            except Exception:
+                if attempt + 1 == PART_RETRIES:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+        self._count("uploaded_bytes", len(data))
+
+    def put(self, stream):
+        """Store a binary stream; returns (digest, size, path, written).
+
+        The bytes are staged in the local cache (where reads of a fresh upload then find
+        them) and uploaded as parts in parallel unless the Volume already has the blob.
+        """
+        digest, size, local, _ = self.cache.put(stream)
+        self._remember(digest, size)
+        if self.manifest(digest, max_age=0) is not None:
+            return digest, size, self.path_for(digest), False
+        parts = max(1, -(-size // self.part_size))
+        try:
+            self._map(lambda n: self._upload_part(local, digest, n), range(parts))
+        except BaseException:
+            for n in range(parts):
+                self.client.delete(self._key(digest, n))
+            raise
+        manifest = {"size": size, "part_size": self.part_size, "parts": parts}
+        self.client.put(self._key(digest, "json"), json.dumps(manifest).encode())
+        with self._lock:
+            self._manifests[digest] = (manifest, time.monotonic())
+        return digest, size, self.path_for(digest), True
+
+    def _remember(self, digest, size):
+        evict = []
+        with self._lock:
+            self._cached[digest] = size
+            self._cached.move_to_end(digest)
+            total = sum(self._cached.values())
+            while total > self.cache_bytes and len(self._cached) > 1:
+                old, old_size = self._cached.popitem(last=False)
+                evict.append(old)
+                total -= old_size
+        for old in evict:
+            self.cache.delete(old)
+
+    def _cached_path(self, digest):
+        path = self.cache.path_for(digest)
+        with self._lock:
+            if digest not in self._cached or not path.exists():
+                self.counters["cache_misses"] += 1
+                return None
+            self._cached.move_to_end(digest)
+            self.counters["cache_hits"] += 1
+        return path
+
+    def read_range(self, digest, offset, length):
+        """Up to length bytes from offset: from the cache if present, else only the covering parts."""
+        path = self._cached_path(digest)
+        if path is not None:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        manifest = self.manifest(digest)
+        if manifest is None:
+            raise FileNotFoundError(digest)
+        end = min(offset + length, manifest["size"])
+        if end <= offset:
+            return b""
+        part_size = manifest["part_size"]
+        spans = [
+            (n, max(offset, n * part_size) - n * part_size, min(end, (n + 1) * part_size) - max(offset, n * part_size))
+            for n in range(offset // part_size, (end - 1) // part_size + 1)
+        ]
+        fetch = lambda span: self.client.get(self._key(digest, span[0]), span[1], span[2])
+        chunks = [fetch(spans[0])] if len(spans) == 1 else self._map(fetch, spans)
+        data = b"".join(chunks)
+        self._count("downloaded_bytes", len(data))
+        return data
+
+    def open(self, digest):
+        """Seekable binary file of a blob; a remote one is read in ranged requests of READ_BUFFER bytes."""
+        path = self._cached_path(digest)
+        if path is not None:
+            return open(path, "rb")
+        manifest = self.manifest(digest)
+        if manifest is None:
+            raise FileNotFoundError(digest)
+        return io.BufferedReader(_RangeReader(self, digest, manifest["size"]), READ_BUFFER)
+
+    def local_path(self, digest):
+        """Local file with the blob's bytes, downloaded (parts in parallel) into the cache on first use.
+
+        Parts are written to the cache's temporary file as they arrive, so memory use is
+        bounded by `workers` parts whatever the blob's size.
+        """
+        path = self._cached_path(digest)
+        if path is not None:
+            return path
+        manifest = self.manifest(digest)
+        if manifest is None:
+            raise FileNotFoundError(digest)
+        got, size, path, _ = self.cache.put(_PartsStream(self._iter_parts(digest, manifest["parts"])))
+        if got != digest:
+            self.cache.delete(got)
+            raise IOError(f"blob {digest} is corrupt in the volume (got {got})")
+        self._remember(digest, size)
+        return path
+
+    def delete(self, digest):
+        manifest = self.manifest(digest)
+        with self._lock:
+            self._manifests.pop(digest, None)
+            self._cached.pop(digest, None)
+        self.cache.delete(digest)
+        if manifest is not None:
+            # Manifest first: a half-deleted blob must not look complete.
+            self.client.delete(self._key(digest, "json"))
+            for n in range(manifest["parts"]):
+                self.client.delete(self._key(digest, n))
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        if hasattr(self.client, "close"):
+            self.client.close()
+
+class _PartsStream(io.RawIOBase):
+    """Non-seekable stream over downloaded parts, so BlobStore.put hashes while it writes."""
+
+    def __init__(self, parts):
+        self.parts = iter(parts)
+        self.current = b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.current:
+            self.current = next(self.parts, None)
+            if self.current is None:
+                return b""
+        if size is None or size < 0:
+            size = len(self.current)
+        data, self.current = self.current[:size], self.current[size:]
+        return data
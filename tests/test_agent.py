@@ -0,0 +1,146 @@
+import io
+import time
+import threading
+from functools import partial
+
+import pytest
+
+from super_agent import agent
+from super_agent.stub_llm import StubLLMServer
+
+@pytest.fixture(params=["json", "sqlite"])
+def drive(request, tmp_path, monkeypatch):
+    """The agent module over a fresh drive in tmp_path, with the given metadata backend."""
+    monkeypatch.setenv("DRIVE_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setenv("DRIVE_METADATA_BACKEND", request.param)
+    monkeypatch.setenv("DRIVE_STORAGE_BACKEND", "local")
+    for name in ("_store", "_blobs", "_texts", "_thumbnails", "_llm", "_tables", "_extractor", "_summaries",
+                 "_search_index", "_folder_index", "_vector_index"):
+        monkeypatch.setattr(agent, name, None)
+    yield agent
+    if agent._extractor is not None:
+        agent._extractor.shutdown()
+    agent.get_metadata_store().store.close()
+
+class BlockingStream(io.BytesIO):
+    """Bytes that are only handed out once release is set."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reading, self.release = threading.Event(), threading.Event()
+
+    def read(self, size=-1):
+        self.reading.set()
+        assert self.release.wait(5)
+        return super().read(size)
+
+def test_upload_transfers_bytes_outside_locks(drive):
+    drive.upload_file("old.bin", io.BytesIO(b"old"))
+    stream = BlockingStream(b"x" * 100_000)
+    uploads = [(name, stream if name == "big.bin" else io.BytesIO(name.encode()), "My Drive")
+               for name in ("big.bin", "small.bin")]
+    thread = threading.Thread(target=drive.upload_batch, args=(uploads,))
+    thread.start()
+    assert stream.reading.wait(5)
+    # Metadata writes and deletes proceed while the upload is still reading its stream.
+    start = time.monotonic()
+    assert drive.create_folder("Reports")[0]
+    drive.delete_file("old.bin")
+    assert drive.apply_batch([("move", "Reports", "My Drive"), ("rename", "Reports", "Reports 2024")])[0]
+    assert time.monotonic() - start < 1
+    assert drive.get_metadata_store().get_file("big.bin") is None
+    stream.release.set()
+    thread.join()
+    store = drive.get_metadata_store()
+    assert store.get_file("big.bin")["size"] == 100_000 and store.get_file("small.bin")["size"] == 9
+
+def test_upload_restores_blob_deleted_while_storing(drive, monkeypatch):
+    drive.upload_file("a.bin", io.BytesIO(b"shared bytes"))
+    put = drive._put_upload
+
+    def put_then_delete(stream):
+        blob = put(stream)  # deduplicated against a.bin's blob
+        drive.delete_file("a.bin")  # ...which loses its last reference and is dropped
+        return blob
+    monkeypatch.setattr(drive, "_put_upload", put_then_delete)
+    record = drive.upload_file("b.bin", io.BytesIO(b"shared bytes"))
+    with drive.get_blob_store().open(record["digest"]) as f:
+        assert f.read() == b"shared bytes"
+    assert drive.get_metadata_store().blob_refs(record["digest"]) == 1
+
+REPLY = "Executive summary: the lakehouse migration is on track and the pipeline grew 20% this quarter."
+
+def summarizing_agent(drive, monkeypatch, stub):
+    """A SuperAgent over stub that summarizes review.pdf, whose text is already extracted."""
+    openai = pytest.importorskip("openai")
+    monkeypatch.setattr(drive, "extract_in_background", lambda *args, **kwargs: None)
+    record = drive.upload_file("review.pdf", io.BytesIO(b"%PDF-1.4 review"))
+    drive.get_text_cache().put(record["digest"], "Quarterly pipeline review of the lakehouse migration.")
+    llm = openai.OpenAI(base_url=stub.base_url, api_key="test", max_retries=0)
+    bot = drive.SuperAgent(llm=llm)
+    bot.register_tool("summarize_file", partial(drive.summarize_file_tool, llm=llm))
+    return bot
+
+def test_streamed_summary_arrives_incrementally_and_is_cached(drive, monkeypatch):
+    with StubLLMServer(reply=lambda messages: REPLY, chunk_chars=8, chunk_delay=0.05) as stub:
+        bot = summarizing_agent(drive, monkeypatch, stub)
+        deltas, arrivals = [], []
+        for delta in bot.ask("summarize review.pdf", stream=True):
+            deltas.append(delta)
+            arrivals.append(time.monotonic())
+    assert deltas[0] == "**review.pdf**\n\n" and "".join(deltas[1:]) == REPLY
+    # One delta per streamed chunk, each handed over as it arrives rather than all at the end.
+    assert len(deltas) == 1 + -(-len(REPLY) // 8)
+    assert arrivals[-1] - arrivals[1] >= 0.05 * (len(deltas) - 3)
+    assert stub.requests == 1 and drive.get_summary_cache().stats()["entries"] == 1
+    # The stub is gone: the second summary can only come from the cache.
+    assert list(bot.ask("summarize review.pdf", stream=True)) == [f"**review.pdf**\n\n{REPLY}"]
+
+def test_interrupted_stream_is_not_cached(drive, monkeypatch):
+    with StubLLMServer(reply=lambda messages: REPLY, chunk_chars=8, drop_after=3) as stub:
+        bot = summarizing_agent(drive, monkeypatch, stub)
+        deltas = list(bot.ask("summarize review.pdf", stream=True))
+        assert "".join(deltas[1:4]) == REPLY[:24] and "summarization failed" in deltas[-1]
+
+        # A reader that stops early (the user navigated away) leaves no entry either.
+        stub.drop_after = None
+        stream = bot.ask("summarize review.pdf", stream=True)
+        assert next(stream) == "**review.pdf**\n\n" and next(stream) == REPLY[:8]
+        stream.close()
+    assert stub.requests == 2
+    assert drive.get_summary_cache().stats()["entries"] == 0
+
+def drive_state(drive):
+    """The metadata as cached and as re-read from disk, plus the search index's view of it."""
+    store = drive.get_metadata_store()
+    cached = store.load()
+    store.invalidate()
+    assert store.load() == cached
+    index = drive.get_search_index()
+    return cached, {folder: sorted(name for name, _ in index.search("bin", folder=folder))
+                    for folder in ("Projects", "Archive")}
+
+@pytest.mark.parametrize("operations, error", [
+    ([("move", "a.bin", "Archive"), ("rename", "b.bin", "c.bin"), ("rename", "c.bin", "a.bin")],
+     "operation 3 (rename 'c.bin'): 'a.bin' already exists"),
+    ([("create_folder", "Q1", "Projects"), ("move", "a.bin", "Q1"), ("move", "Projects", "Q1")],
+     "operation 3 (move 'Projects'): Cannot move 'Projects' into its own subtree"),
+    ([("delete", "b.bin"), ("rename", "Archive", "Old"), ("move", "a.bin", "Archive")],
+     "operation 3 (move 'a.bin'): destination folder 'Archive' doesn't exist"),
+])
+def test_conflicting_batch_changes_nothing(drive, operations, error):
+    for name, parent in (("Projects", "My Drive"), ("Archive", "My Drive")):
+        drive.create_folder(name, parent)
+    drive.upload_file("a.bin", io.BytesIO(b"a"), "Projects")
+    drive.upload_file("b.bin", io.BytesIO(b"b"), "Archive")
+    before = drive_state(drive)
+    assert before[1] == {"Projects": ["a.bin"], "Archive": ["b.bin"]}
+
+    ok, msg = drive.apply_batch(operations)
+    assert not ok and msg == f"Nothing was changed: {error}."
+    assert drive_state(drive) == before
+    assert drive.get_blob_store().exists(drive.get_metadata_store().get_file("b.bin")["digest"])
+
+    ok, msg = drive.apply_batch(operations[:-1])
+    assert ok and msg.startswith("Done: ")
+    assert drive_state(drive) != before
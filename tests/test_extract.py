@@ -0,0 +1,54 @@
+import os
+import sys
+import socket
+import subprocess
+from pathlib import Path
+
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+
+# Runs the app the way `streamlit run` does (its code executed in a module installed as
+# __main__), then extracts an upload in the worker pool, whose spawned workers re-run
+# that __main__ script as __mp_main__.
+RUNNER = """
+import io, sys, types
+sys.path.insert(0, {repo!r})
+
+if __name__ == "__main__":
+    app = types.ModuleType("__main__")
+    app.__file__ = {app!r}
+    sys.modules["__main__"] = app
+    exec(compile(open(app.__file__).read(), app.__file__, "exec"), app.__dict__)
+
+    from super_agent import agent
+    record = agent.upload_file("notes.txt", io.BytesIO(b"quarterly pipeline review"))
+    agent.get_extraction_service().wait(record["digest"], timeout=60)
+    status = agent.extraction_status("notes.txt")
+    print("STATUS", status["status"], status["error"])
+    agent.get_extraction_service().shutdown()
+"""
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_extraction_from_app_script_with_side_effects(tmp_path):
+    pytest.importorskip("streamlit")
+    runner = tmp_path / "run_app.py"
+    runner.write_text(RUNNER.format(repo=str(REPO), app=str(REPO / "google_drive_prototype.py")))
+    env = dict(
+        os.environ,
+        DRIVE_STORAGE_PATH=str(tmp_path / "drive"),
+        # Bound by the app process; a worker re-running the app's initialization would fail on it.
+        DRIVE_METRICS_PORT=str(_free_port()),
+        DATABRICKS_TOKEN="test",
+        DATABRICKS_BASE_URL="http://127.0.0.1:9/v1",
+        DRIVE_EXTRACT_WORKERS="1",
+    )
+    result = subprocess.run([sys.executable, str(runner)], cwd=tmp_path, env=env, capture_output=True, text=True,
+                            timeout=180)
+    assert result.returncode == 0, result.stderr
+    assert "STATUS done None" in result.stdout, result.stderr
+    assert "Address already in use" not in result.stderr
@@ -0,0 +1,111 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from super_agent.stub_llm import StubLLMServer
+from super_agent.llm_transport import LLMTransport, CircuitBreaker, CircuitOpenError, CLOSED, OPEN
+
+MESSAGES = [{"role": "user", "content": "Summarize the quarterly pipeline review"}]
+
+@pytest.fixture
+def stub():
+    with StubLLMServer() as server:
+        yield server
+
+@pytest.fixture
+def make_transport(stub):
+    transports = []
+
+    def make(**kwargs):
+        kwargs.setdefault("backoff_base", 0.01)
+        transport = LLMTransport("test", stub.base_url, **kwargs)
+        transports.append(transport)
+        return transport
+    yield make
+    for transport in transports:
+        transport.close()
+
+def ask(transport, messages=MESSAGES, **kwargs):
+    response = transport.chat.completions.create(model="stub", messages=messages, **kwargs)
+    return response.choices[0].message.content
+
+def test_retries_honour_retry_after(stub, make_transport):
+    stub.fail_first, stub.error_status, stub.retry_after = 2, 429, 0.3
+    transport = make_transport()
+    start = time.monotonic()
+    assert ask(transport).startswith("Stub summary")
+    assert time.monotonic() - start >= 0.6
+    assert stub.requests == 3
+    assert transport.stats()["retries"] == 2 and transport.stats()["breaker"] == CLOSED
+
+def test_gives_up_after_max_retries(stub, make_transport):
+    stub.fail_first = 100
+    transport = make_transport(max_retries=2)
+    with pytest.raises(openai.InternalServerError):
+        ask(transport)
+    assert stub.requests == 3
+
+def test_client_errors_are_not_retried(stub, make_transport):
+    stub.fail_first, stub.error_status = 1, 400
+    transport = make_transport()
+    with pytest.raises(openai.BadRequestError):
+        ask(transport)
+    assert stub.requests == 1
+    assert transport.breaker.state == CLOSED
+
+def test_deadline_covers_all_attempts(stub, make_transport):
+    stub.delay = 1.0
+    transport = make_transport()
+    start = time.monotonic()
+    with pytest.raises(openai.OpenAIError):
+        ask(transport, timeout=0.3)
+    assert time.monotonic() - start < 0.9
+
+def test_breaker_opens_then_probes(stub, make_transport):
+    stub.error_rate = 1.0
+    transport = make_transport(max_retries=0, breaker=CircuitBreaker(failures=3, reset_timeout=0.3))
+    for _ in range(3):
+        with pytest.raises(openai.InternalServerError):
+            ask(transport)
+    assert transport.breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        ask(transport)
+    assert stub.requests == 3  # failed fast, without calling the endpoint
+
+    stub.error_rate = 0.0
+    time.sleep(0.35)
+    assert ask(transport).startswith("Stub summary")
+    assert transport.breaker.state == CLOSED
+    assert transport.stats()["breaker_opened"] == 1
+
+def test_identical_calls_in_flight_share_one_request(stub, make_transport):
+    stub.delay = 0.3
+    transport = make_transport()
+    with ThreadPoolExecutor(5) as pool:
+        answers = list(pool.map(lambda _: ask(transport), range(5)))
+    assert len(set(answers)) == 1
+    assert stub.requests == 1
+    assert transport.stats()["coalesced"] == 4
+
+    # Different prompts are separate requests.
+    ask(transport, [{"role": "user", "content": "another question"}])
+    assert stub.requests == 2
+
+def test_slow_call_is_hedged(stub, make_transport):
+    stub.slow_fraction, stub.slow_delay = 1.0, 2.0
+
+    def only_first_slow():
+        while not stub.requests:
+            time.sleep(0.005)
+        stub.slow_fraction = 0.0
+    threading.Thread(target=only_first_slow, daemon=True).start()
+    transport = make_transport(hedge_after=0.2)
+    start = time.monotonic()
+    assert ask(transport).startswith("Stub summary")
+    assert time.monotonic() - start < 1.0
+    assert stub.requests == 2
+    assert transport.stats()["hedges"] == 1
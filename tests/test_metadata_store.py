@@ -0,0 +1,211 @@
+import copy
+import time
+import threading
+from collections import Counter
+
+import pytest
+
+from super_agent.metadata_store import (
+    ROOT_FOLDER, SORT_KEYS, MetadataStore, JsonMetadataStore, SqliteMetadataStore,
+    import_json_metadata, open_metadata_store, meta_rebuild_stats,
+)
+
+def record(parent, size, modified, digest):
+    return {"parent": parent, "path": f"/blobs/{digest}-{modified}", "size": size, "created": "2024-01-01T00:00:00",
+            "modified": modified, "digest": digest}
+
+def populate(store):
+    store.add_folder("Projects", ROOT_FOLDER)
+    store.add_folder("Archive", ROOT_FOLDER)
+    store.add_folder("Q1", "Projects")
+    store.put_file("plan.pdf", record("Projects", 300, "2024-03-01", "d1"))
+    store.put_file("sales.csv", record("Q1", 120, "2024-02-01", "d2"))
+    store.put_file("notes.txt", record(ROOT_FOLDER, 40, "2024-01-15", "d3"))
+    store.put_file("copy of plan.pdf", record("Q1", 300, "2024-03-02", "d1"))
+
+def snapshot(store):
+    """Everything a caller can observe through the store interface, in comparable form."""
+    def page_items(page):
+        items, total, cursor = page
+        return [(k, name, r if k == "file" else r["parent"]) for k, name, r in items], total, cursor
+
+    folders = sorted(store.load()["folders"])
+    view = {"files": {}, "folders": {}}
+    for folder in folders:
+        subfolders, files = store.subtree(folder)
+        view["folders"][folder] = {
+            "children": [(k, name) for k, name, _ in store.list_children(folder)],
+            "stats": store.folder_stats(folder),
+            "size": store.subtree_size(folder),
+            "subtree": (sorted(subfolders), sorted(files, key=lambda item: item[0])),
+            "pages": [page_items(store.list_page(folder, sort, descending, limit=2))
+                      for sort in SORT_KEYS for descending in (False, True)],
+            "query": page_items(store.list_page(folder, query="PLAN")),
+        }
+    for name, r in store.load()["files"].items():
+        view["files"][name] = (store.get_file(name), store.find_file_by_path(r["path"]), store.blob_refs(r["digest"]))
+    view["recent"] = store.recent_files(3)
+    return view
+
+STEPS = [
+    lambda s: s.move_file("sales.csv", "Archive"),
+    lambda s: s.rename_file("plan.pdf", "plan.docx"),
+    lambda s: s.rename_folder("Q1", "Q1 2024"),
+    lambda s: s.move_folder("Q1 2024", "Archive"),
+    lambda s: s.put_file("notes.txt", record(ROOT_FOLDER, 64, "2024-04-01", "d4")),
+    lambda s: s.remove_file("plan.docx"),
+    lambda s: s.add_folder("Q2", "Projects"),
+    lambda s: s.remove_subtree("Archive"),
+]
+
+@pytest.fixture
+def stores(tmp_path):
+    json_store, sqlite_store = JsonMetadataStore(tmp_path / "metadata.json"), SqliteMetadataStore(tmp_path / "metadata.db")
+    yield json_store, sqlite_store
+    sqlite_store.close()
+
+def test_metadata_store_is_abstract():
+    with pytest.raises(TypeError):
+        MetadataStore()
+
+def test_json_and_sqlite_stores_agree(stores):
+    json_store, sqlite_store = stores
+    for store in stores:
+        populate(store)
+    assert snapshot(json_store) == snapshot(sqlite_store)
+    for i, step in enumerate(STEPS):
+        assert step(json_store) == step(sqlite_store), f"step {i}"
+        assert snapshot(json_store) == snapshot(sqlite_store), f"after step {i}"
+    with pytest.raises(ValueError):
+        json_store.move_folder("Projects", "Q2")
+    with pytest.raises(ValueError):
+        sqlite_store.move_folder("Projects", "Q2")
+    assert snapshot(json_store) == snapshot(sqlite_store)
+
+def test_import_preserves_json_tree(tmp_path):
+    json_store = JsonMetadataStore(tmp_path / "metadata.json")
+    populate(json_store)
+    for step in STEPS[:3]:
+        step(json_store)
+    expected = snapshot(json_store)
+
+    store = SqliteMetadataStore(tmp_path / "imported.db")
+    assert import_json_metadata(json_store.path, store) == (4, 4)
+    assert snapshot(store) == expected
+    store.close()
+
+    # The SQLite backend imports an existing metadata.json the first time it starts, and only then.
+    store = open_metadata_store(tmp_path, "sqlite")
+    assert snapshot(store) == expected
+    store.remove_file("notes.txt")
+    store.close()
+    store = open_metadata_store(tmp_path, "sqlite")
+    assert store.get_file("notes.txt") is None
+    store.close()
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_batch_does_not_block_or_leak_to_readers(tmp_path, backend):
+    from super_agent.agent import MetadataCache
+
+    cache = MetadataCache(open_metadata_store(tmp_path, backend))
+    populate(cache)
+    in_batch, release = threading.Event(), threading.Event()
+
+    def writer():
+        with cache.batch():
+            cache.move_file("sales.csv", "Archive")
+            cache.add_folder("Q2", "Projects")
+            in_batch.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    assert in_batch.wait(5)
+    # Readers neither wait for the open batch nor see its uncommitted changes.
+    start = time.monotonic()
+    assert cache.get_file("sales.csv")["parent"] == "Q1"
+    assert "Q2" not in cache.load()["folders"] and cache.folder_stats("Archive")["files"] == 0
+    assert time.monotonic() - start < 1
+    release.set()
+    thread.join()
+    assert cache.get_file("sales.csv")["parent"] == "Archive"
+    assert cache.load()["folders"]["Q2"]["parent"] == "Projects"
+    assert cache.load()["files"]["sales.csv"]["parent"] == "Archive"
+    cache.store.close()
+
+def deep_tree(store):
+    for name, parent in (("A", ROOT_FOLDER), ("B", "A"), ("C", "B"), ("D", ROOT_FOLDER), ("E", "D")):
+        store.add_folder(name, parent)
+    for i, folder in enumerate(("A", "B", "C", "C", "D", "E", ROOT_FOLDER)):
+        store.put_file(f"file{i}.{('pdf', 'csv', 'txt')[i % 3]}", record(folder, 100 * (i + 1), f"2024-01-0{i + 1}", f"d{i}"))
+
+TREE_STEPS = [
+    lambda s: s.move_folder("B", "E"),
+    lambda s: s.rename_folder("D", "D2"),
+    lambda s: s.move_file("file0.pdf", "C"),
+    lambda s: s.rename_file("file3.pdf", "file3.xlsx"),
+    lambda s: s.move_folder("A", "C"),
+    lambda s: s.rename_folder("C", "C2"),
+    lambda s: s.remove_subtree("A"),
+    lambda s: s.move_folder("E", ROOT_FOLDER),
+    lambda s: s.remove_subtree("B"),
+]
+
+def recomputed_subtree(meta, folder):
+    """(folders, files) under folder, found by following every node's parent pointer."""
+    def under(parent):
+        while parent is not None:
+            if parent == folder:
+                return True
+            parent = meta["folders"][parent]["parent"]
+        return False
+    folders = sorted(name for name in meta["folders"] if name == folder or under(meta["folders"][name]["parent"]))
+    files = sorted(name for name, r in meta["files"].items() if under(r["parent"]))
+    return folders, files
+
+def check_subtrees(store):
+    meta = store.load()
+    for folder in meta["folders"]:
+        folders, files = store.subtree(folder)
+        assert (sorted(folders), sorted(name for name, _ in files)) == recomputed_subtree(meta, folder), folder
+    if isinstance(store, SqliteMetadataStore):
+        # Every materialized path is the chain of folder names down from the root.
+        def apath(name):
+            parent = meta["folders"][name]["parent"]
+            return (apath(parent) if parent else "") + name + "\x1f"
+        rows = store._db().execute("SELECT kind, name, parent, apath FROM nodes").fetchall()
+        for row in rows:
+            expected = apath(row["name"] if row["kind"] == "folder" else row["parent"])
+            assert row["apath"] == expected, row["name"]
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_subtrees_match_recomputation(tmp_path, backend):
+    store = open_metadata_store(tmp_path, backend)
+    deep_tree(store)
+    check_subtrees(store)
+    for step in TREE_STEPS:
+        step(store)
+        check_subtrees(store)
+    assert set(store.load()["folders"]) == {ROOT_FOLDER, "D2", "E"}
+    store.close()
+
+def check_aggregates(store):
+    meta = store.load()
+    expected = meta_rebuild_stats(copy.deepcopy(meta))
+    for folder, f in expected["folders"].items():
+        assert store.folder_stats(folder) == f["stats"], folder
+        assert store.subtree_size(folder) == {k: f["stats"][k] for k in ("size", "files", "folders")}, folder
+    refs = Counter(r["digest"] for r in meta["files"].values())
+    assert {digest: store.blob_refs(digest) for digest in refs} == refs
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_aggregates_match_recomputation(tmp_path, backend):
+    store = open_metadata_store(tmp_path, backend)
+    deep_tree(store)
+    store.put_file("copy.pdf", record("E", 100, "2024-02-01", "d0"))
+    check_aggregates(store)
+    for step in TREE_STEPS:
+        step(store)
+        check_aggregates(store)
+    assert store.folder_stats(ROOT_FOLDER)["types"] == {".pdf": 2, ".csv": 1, ".txt": 1}
+    store.close()
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from super_agent import metrics
+from super_agent.agent import SuperAgent
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    enabled = metrics.enabled()
+    metrics.set_enabled(True)
+    metrics.reset()
+    yield
+    metrics.reset()
+    metrics.set_enabled(enabled)
+
+def tool_timing(name):
+    timings = [t for t in metrics.snapshot()["timings"] if t["name"] == "tool" and t["labels"] == {"tool": name}]
+    assert len(timings) <= 1
+    return timings[0] if timings else None
+
+def test_streamed_tool_is_one_sample_timed_to_the_end():
+    seen = []
+
+    def streaming_tool(text):
+        time.sleep(0.02)  # work before the first item counts too
+
+        def deltas():
+            for word in text.split():
+                seen.append(metrics.current_tool())
+                time.sleep(0.02)
+                yield word
+        return deltas()
+
+    agent = SuperAgent(llm=object())
+    agent.register_tool("stream", streaming_tool)
+    result = agent.tools["stream"]["func"]("a b c")
+    assert tool_timing("stream") is None  # nothing recorded until the stream is consumed
+    assert list(result) == ["a", "b", "c"]
+
+    timing = tool_timing("stream")
+    assert timing["count"] == 1
+    assert timing["p50"] >= 0.08
+    # LLM calls made while the stream is iterated are attributed to the tool.
+    assert seen == ["stream"] * 3 and metrics.current_tool() == ""
+
+def test_plain_and_failing_tools_are_one_sample_each():
+    def failing(_):
+        raise RuntimeError("boom")
+
+    agent = SuperAgent(llm=object())
+    agent.register_tool("echo", lambda text: text)
+    agent.register_tool("failing", failing)
+    assert agent.tools["echo"]["func"]("hi") == "hi"
+    with pytest.raises(RuntimeError):
+        agent.tools["failing"]["func"]("hi")
+
+    assert tool_timing("echo")["count"] == 1
+    assert tool_timing("failing")["count"] == 1
+    errors = [c for c in metrics.snapshot()["counters"] if c["name"] == "errors"]
+    assert errors == [{"name": "errors", "labels": {"op": "tool"}, "value": 1}]
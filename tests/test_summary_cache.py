@@ -0,0 +1,30 @@
+import time
+
+from super_agent.summary_cache import SummaryCache
+
+def keys(cache):
+    return sorted(row[0] for row in cache._db.execute("SELECT key FROM summaries"))
+
+def test_evicts_least_recently_used_within_budget(tmp_path):
+    cache = SummaryCache(tmp_path / "summaries.db", max_bytes=1000, memory_entries=2)
+    for i in range(5):
+        cache.put(f"k{i}", f"d{i}", "x" * 300)
+        time.sleep(0.01)
+    assert keys(cache) == ["k2", "k3", "k4"]
+    assert cache.stats()["bytes"] == 900 and cache.stats()["entries"] == 3
+
+    # A memory hit (k4) and a disk hit (k2) both count as uses when the next put evicts.
+    assert cache.get("k4") == cache.get("k2") == "x" * 300
+    assert cache.stats()["memory_hits"] == 1 and cache.stats()["disk_hits"] == 1
+    cache.put("k5", "d5", "y" * 300)
+    assert keys(cache) == ["k2", "k4", "k5"]
+
+    # Replacing an entry and dropping a digest keep the running totals exact.
+    cache.put("k5", "d5", "z" * 100)
+    cache.invalidate_digest("d2")
+    assert cache.stats()["bytes"] == 400 and cache.stats()["entries"] == 2
+    assert cache.get("k2") is None
+
+    reopened = SummaryCache(tmp_path / "summaries.db")
+    assert reopened.stats()["bytes"] == 400 and reopened.stats()["entries"] == 2
+    assert reopened.get("k5") == "z" * 100
@@ -0,0 +1,111 @@
+import time
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from super_agent import vector_index
+from super_agent.vector_index import HashingEmbedder, VectorIndex
+
+WORDS = ("spark cluster delta lake pipeline streaming notebook workspace catalog lineage model serving endpoint "
+         "warehouse query dashboard migration forecast revenue schema partition connector checkpoint").split()
+
+def document(topic, rng, sentences=30):
+    """Text about one topic word, padded with shared vocabulary."""
+    return " ".join(f"{topic} {' '.join(rng.choice(WORDS) for _ in range(8))}." for _ in range(sentences))
+
+def top_name(index, query):
+    hits = index.search_files(query, k=1)
+    return hits[0][0] if hits else None
+
+def test_add_search_remove_reopen(tmp_path):
+    rng = random.Random(0)
+    embedder = HashingEmbedder(256)
+    index = VectorIndex(tmp_path, embedder, chunk_tokens=50)
+    texts = {f"{topic}.txt": document(topic, rng) for topic in ("kafka", "mlflow", "photon", "zorder")}
+    for name, text in texts.items():
+        assert index.add(name, "digest-" + name, text) > 1
+    assert index.add("kafka.txt", "digest-kafka.txt", texts["kafka.txt"]) == 0  # same digest: no-op
+    rows = len(index)
+    for name in texts:
+        assert top_name(index, name[:-4] + " ingestion") == name
+
+    name, chunk, start, stop, score = index.search("mlflow experiments", k=1)[0]
+    assert name == "mlflow.txt" and "mlflow" in texts[name][start:stop] and 0 < score <= 1
+
+    # Same content under another name reuses the stored vectors.
+    index.add("copy of photon.txt", "digest-photon.txt", "")
+    assert {hit[0] for hit in index.search_files("photon", k=2)} == {"photon.txt", "copy of photon.txt"}
+
+    kafka_rows = len(index._by_name["kafka.txt"][1])
+    assert len(index) == rows + len(index._by_name["photon.txt"][1])
+    index.remove("kafka.txt")
+    index.remove("copy of photon.txt")
+    assert "kafka.txt" not in index and len(index) == rows - kafka_rows
+    assert all(hit[0] != "kafka.txt" for hit in index.search("kafka", k=50))
+    size = index._size
+    index.add("etl.txt", "digest-etl.txt", document("etl", rng))
+    assert index._size == size  # freed rows are reused before the matrix grows
+    results = {query: index.search(query, k=5) for query in ("mlflow", "photon", "zorder", "etl")}
+    names = sorted(index.names())
+    index.close()
+
+    reopened = VectorIndex(tmp_path, embedder, chunk_tokens=50)
+    assert sorted(reopened.names()) == names
+    assert reopened.digest_of("etl.txt") == "digest-etl.txt"
+    for query, expected in results.items():
+        assert reopened.search(query, k=5) == expected
+    reopened.close()
+
+    # Vectors of another embedder are not comparable: the index starts over.
+    other = VectorIndex(tmp_path, HashingEmbedder(128), chunk_tokens=50)
+    assert len(other) == 0 and other.search("mlflow") == []
+    other.close()
+
+def test_ivf_partitions(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "IVF_MIN_ROWS", 200)
+    rng = random.Random(1)
+    embedder = HashingEmbedder(1024)
+    topics = [f"topic{i}" for i in range(40)]
+    texts = {f"{topic}.txt": document(topic, rng, sentences=8) for topic in topics}
+    index = VectorIndex(tmp_path / "ivf", embedder, ivf=True, chunk_tokens=20)
+    flat = VectorIndex(tmp_path / "flat", embedder, chunk_tokens=20)
+    for name, text in texts.items():
+        index.add(name, "digest-" + name, text)
+        flat.add(name, "digest-" + name, text)
+    assert len(index) >= 200
+    deadline = time.time() + 30
+    while (index._centroids is None or index._training) and time.time() < deadline:
+        time.sleep(0.05)
+    assert index._centroids is not None, "training did not run"
+    nlist = len(index._centroids)
+    assert nlist > 1
+    assert (index.root / "centroids.npy").exists()
+
+    # Probing every partition is exact; probing a few still finds a distinctive document.
+    index.probes = nlist
+    for topic in topics[:10]:
+        expected = flat.search(topic, k=5)
+        got = index.search(topic, k=5)
+        assert [hit[:4] for hit in got] == [hit[:4] for hit in expected]
+        assert [hit[4] for hit in got] == pytest.approx([hit[4] for hit in expected])
+    flat.close()
+    index.probes = 2
+    assert sum(top_name(index, topic) == f"{topic}.txt" for topic in topics) >= len(topics) * 0.8
+
+    # Rows added and removed after training are placed in (and dropped from) partitions.
+    index.probes = nlist
+    index.add("fresh.txt", "digest-fresh", document("freshdoc", rng, sentences=8))
+    assert top_name(index, "freshdoc") == "fresh.txt"
+    index.remove("topic3.txt")
+    assert all(hit[0] != "topic3.txt" for hit in index.search("topic3", k=50))
+    expected = index.search("topic7", k=5)
+    index.close()
+
+    reopened = VectorIndex(tmp_path / "ivf", embedder, ivf=True, chunk_tokens=20)
+    assert reopened._centroids is not None and len(reopened._centroids) == nlist
+    reopened.probes = nlist
+    assert reopened.search("topic7", k=5) == expected
+    assert top_name(reopened, "freshdoc") == "fresh.txt"
+    reopened.close()
@@ -0,0 +1,120 @@
+import io
+import random
+import threading
+
+import pytest
+
+from super_agent import volumes
+from super_agent.volumes import LocalVolumeClient, VolumeBlobStore
+
+PART = 1000
+
+def volume_files(client):
+    return sorted(str(p.relative_to(client.root)) for p in client.root.rglob("*") if p.is_file())
+
+@pytest.fixture
+def volume(tmp_path):
+    """A Volume and a factory of app replicas (each with its own local cache) sharing it."""
+    client = LocalVolumeClient(tmp_path / "volume")
+    stores = []
+
+    def replica(name, **kwargs):
+        kwargs.setdefault("part_size", PART)
+        kwargs.setdefault("workers", 2)
+        store = VolumeBlobStore(client, "/Volumes/main/drive/blobs", tmp_path / f"cache-{name}", **kwargs)
+        stores.append(store)
+        return store
+    yield client, replica
+    for store in stores:
+        store.close()
+
+def test_put_dedups_and_reads_ranges_remotely(volume):
+    client, replica = volume
+    data = random.Random(0).randbytes(3500)
+    writer = replica("a")
+    digest, size, path, written = writer.put(io.BytesIO(data))
+    assert (size, written) == (3500, True)
+    assert len([f for f in volume_files(client) if f.startswith("Volumes/main/drive/blobs/")]) == 5  # 4 parts + manifest
+    assert writer.put(io.BytesIO(data))[3] is False
+    assert writer.stats()["uploaded_bytes"] == 3500
+
+    # Another replica has nothing cached: ranged reads fetch only the parts they cover.
+    reader = replica("b")
+    assert reader.exists(digest)
+    assert reader.read_range(digest, 900, 1200) == data[900:2100]
+    assert reader.stats()["downloaded_bytes"] == 1200
+    assert reader.read_range(digest, 3400, 500) == data[3400:]
+    with reader.open(digest) as f:
+        f.seek(2990)
+        assert f.read(20) == data[2990:3010]
+        f.seek(-10, io.SEEK_END)
+        assert f.read() == data[-10:]
+    assert reader.stats()["cached_blobs"] == 0
+
+def test_local_path_streams_parts_into_bounded_cache(volume, monkeypatch):
+    client, replica = volume
+    blobs = [random.Random(i).randbytes(n) for i, n in enumerate((9500, 3000))]
+    digests = [replica("writer").put(io.BytesIO(data))[0] for data in blobs]
+
+    # Parts are fetched in order, with no more than `workers` of them ahead of the file being written.
+    in_flight, most = [0], [0]
+    get, lock = client.get, threading.Lock()
+
+    def counting_get(key, *args):
+        if not key.endswith(".json"):
+            with lock:
+                in_flight[0] += 1
+                most[0] = max(most[0], in_flight[0])
+        return get(key, *args)
+    monkeypatch.setattr(client, "get", counting_get)
+    consumed = volumes._PartsStream.read
+
+    def read(self, size=-1):
+        data = consumed(self, size)
+        if not self.current:
+            with lock:
+                in_flight[0] -= 1
+        return data
+    monkeypatch.setattr(volumes._PartsStream, "read", read)
+
+    store = replica("reader", cache_bytes=10_000)
+    path = store.local_path(digests[0])
+    assert path.read_bytes() == blobs[0]
+    assert most[0] <= 3  # the part being written plus `workers` downloads
+    assert store.local_path(digests[0]) == path and store.stats()["cache_hits"] == 1
+
+    # Caching the second blob evicts the first, which is downloaded again when needed.
+    assert store.local_path(digests[1]).read_bytes() == blobs[1]
+    assert not path.exists() and store.stats()["cached_blobs"] == 1
+    assert store.local_path(digests[0]).read_bytes() == blobs[0]
+    assert store.stats()["cached_bytes"] == 9500
+
+def test_delete_is_seen_by_other_replicas(volume, monkeypatch):
+    client, replica = volume
+    data = b"quarterly pipeline review" * 100
+    a, b = replica("a"), replica("b")
+    digest = a.put(io.BytesIO(data))[0]
+    assert b.exists(digest) and b.local_path(digest).read_bytes() == data
+
+    a.delete(digest)
+    assert not a.exists(digest)
+    assert not [f for f in volume_files(client) if digest in f]
+    # b's manifest is cached; an upload re-checks the Volume, and exists() does once it expires.
+    assert b.put(io.BytesIO(data))[3] is True
+    assert a.read_range(digest, 0, 25) == data[:25]
+    a.delete(digest)
+    monkeypatch.setattr(volumes, "MANIFEST_TTL", 0)
+    assert not b.exists(digest)
+
+def test_empty_blob(volume):
+    client, replica = volume
+    digest, size, _, written = replica("a").put(io.BytesIO(b""))
+    assert (size, written) == (0, True)
+    reader = replica("b")
+    assert reader.exists(digest)
+    assert reader.read_range(digest, 0, 10) == b""
+    with reader.open(digest) as f:
+        assert f.read() == b""
+    assert reader.local_path(digest).read_bytes() == b""
+    reader.delete(digest)
+    assert not reader.exists(digest) and not volume_files(client)